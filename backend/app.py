@@ -7,6 +7,15 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
+from models import db
+from utils.auth_tokens import token_denylist
+from utils.audit_sink import audit_sink
+from utils.audit_history import register_audit_history
+from utils.usage_counters import register_usage_counters
+from utils.zone_index import register_zone_assignment
+from utils.pickup_changes import register_pickup_change_hooks
+from utils.slot_capacity import register_slot_capacity_hooks
+from utils.upcoming_pickups import upcoming_pickups_cache
 import os
 from dotenv import load_dotenv
 
@@ -21,11 +30,22 @@ def create_app():
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
     app.config['JWT_ACCESS_TOKEN_EXPIRES'] = int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 86400))
+    app.config['TOKEN_DENYLIST_REFRESH_SECONDS'] = int(os.getenv('TOKEN_DENYLIST_REFRESH_SECONDS', 30))
+    app.config['ENTITLEMENTS_CACHE_SECONDS'] = int(os.getenv('ENTITLEMENTS_CACHE_SECONDS', 60))
+    app.config['PICKUP_CALENDAR_CACHE_SECONDS'] = int(os.getenv('PICKUP_CALENDAR_CACHE_SECONDS', 30))
+    app.config['UPCOMING_PICKUPS_CACHE_SECONDS'] = int(os.getenv('UPCOMING_PICKUPS_CACHE_SECONDS', 60))
+    app.config['REDIS_URL'] = os.getenv('REDIS_URL')
     
     # Database configuration
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///waste_management.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Audit writer configuration
+    app.config['AUDIT_SINK_BATCH_SIZE'] = int(os.getenv('AUDIT_SINK_BATCH_SIZE', 500))
+    app.config['AUDIT_SINK_FLUSH_MS'] = int(os.getenv('AUDIT_SINK_FLUSH_MS', 50))
+    app.config['AUDIT_SINK_QUEUE_SIZE'] = int(os.getenv('AUDIT_SINK_QUEUE_SIZE', 10000))
+    app.config['AUDIT_ARCHIVE_DIR'] = os.getenv('AUDIT_ARCHIVE_DIR', 'archive/audit_logs')
+    
     # Email configuration
     app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
@@ -38,6 +58,15 @@ def create_app():
     CORS(app, origins=os.getenv('CORS_ORIGINS', 'http://localhost:3000,http://localhost:5173').split(','))
     jwt = JWTManager(app)
     mail = Mail(app)
+    db.init_app(app)
+    token_denylist.init_app(app, jwt)
+    audit_sink.init_app(app)
+    register_audit_history()
+    register_usage_counters()
+    register_zone_assignment()
+    register_pickup_change_hooks()
+    register_slot_capacity_hooks()
+    upcoming_pickups_cache.init_app(app)
     
     # Import and register blueprints
     from routes.auth import auth_bp
@@ -0,0 +1,55 @@
+"""
+Route Planner Benchmark
+Times plan_route on random stops scattered over a zone-sized area and
+reports the improvement over the nearest-neighbour starting tour
+
+Usage: python benchmarks/route_planner_benchmark.py [--runs 5] [--sizes 50,200,...]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.route_planner import plan_route
+
+DEFAULT_SIZES = (50, 200, 500, 1000, 2000)
+
+# Roughly 20km x 20km around a city centre
+CENTER = (40.7128, -74.0060)
+SPREAD_DEGREES = 0.18
+
+def random_stops(count, rng):
+    return [
+        (index, CENTER[0] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES) / 2,
+         CENTER[1] + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES) / 2)
+        for index in range(count)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)))
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'stops':>6} {'median ms':>10} {'max ms':>8} {'nn km':>9} {'2-opt km':>9} {'saved':>6}")
+
+    for size in map(int, args.sizes.split(',')):
+        timings, initial, final = [], [], []
+        for _ in range(args.runs):
+            plan = plan_route(random_stops(size, rng), depot=CENTER)
+            timings.append(plan['solve_ms'])
+            initial.append(plan['initial_distance_km'])
+            final.append(plan['distance_km'])
+
+        saved = 1 - statistics.mean(final) / statistics.mean(initial)
+        print(f"{size:>6} {statistics.median(timings):>10.1f} {max(timings):>8.1f} "
+              f"{statistics.mean(initial):>9.1f} {statistics.mean(final):>9.1f} {saved:>6.1%}")
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,7 @@ Creates the PostgreSQL database and tables for the Waste Management SaaS Platfor
 
 import psycopg2
 import os
+from datetime import date
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -71,6 +72,26 @@ def run_schema():
         print(f"❌ Error running schema: {e}")
         raise
 
+def create_audit_log_partitions(months_ahead=3):
+    """Create monthly audit_logs partitions for the current and upcoming months"""
+    try:
+        conn = psycopg2.connect(get_database_url())
+        conn.autocommit = True
+        cursor = conn.cursor()
+        
+        month = date.today().replace(day=1)
+        for _ in range(months_ahead + 1):
+            cursor.execute("SELECT create_audit_logs_partition(%s)", (month,))
+            print(f"  ✅ {cursor.fetchone()[0]}")
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        
+        cursor.close()
+        conn.close()
+        
+    except Exception as e:
+        print(f"❌ Error creating audit log partitions: {e}")
+        raise
+
 def verify_tables():
     """Verify that all tables were created"""
     try:
@@ -89,9 +110,9 @@ def verify_tables():
         table_names = [table[0] for table in tables]
         
         expected_tables = [
-            'organizations', 'subscription_tiers', 'subscriptions', 'users',
-            'zones', 'customers', 'pickups', 'invoices', 'payments',
-            'notifications', 'audit_logs', 'complaints'
+            'organizations', 'subscription_tiers', 'subscriptions', 'organization_usage', 'users',
+            'token_revocations', 'zones', 'customers', 'customer_imports', 'pickups', 'zone_slot_reservations', 'invoices', 'payments',
+            'notifications', 'audit_logs', 'audit_activity_rollups', 'platform_stats_daily', 'complaints'
         ]
         
         print("\n📋 Database Tables:")
@@ -157,16 +178,20 @@ def main():
         print("\n2️⃣ Running database schema...")
         run_schema()
         
-        # Step 3: Verify tables
-        print("\n3️⃣ Verifying tables...")
+        # Step 3: Create audit log partitions
+        print("\n3️⃣ Creating audit log partitions...")
+        create_audit_log_partitions()
+        
+        # Step 4: Verify tables
+        print("\n4️⃣ Verifying tables...")
         if verify_tables():
             print("✅ All tables created successfully")
         else:
             print("❌ Some tables are missing")
             return False
         
-        # Step 4: Insert initial data
-        print("\n4️⃣ Inserting initial data...")
+        # Step 5: Insert initial data
+        print("\n5️⃣ Inserting initial data...")
         insert_initial_data()
         
         print("\n" + "=" * 50)
@@ -88,6 +88,15 @@ CREATE TABLE subscriptions (
     INDEX idx_subscriptions_status (status)
 );
 
+-- Organization Usage (counters kept in step with customers, regional managers and zones)
+CREATE TABLE organization_usage (
+    organization_id UUID PRIMARY KEY REFERENCES organizations(id) ON DELETE CASCADE,
+    customers INTEGER NOT NULL DEFAULT 0,
+    managers INTEGER NOT NULL DEFAULT 0,
+    zones INTEGER NOT NULL DEFAULT 0,
+    reconciled_at TIMESTAMP WITH TIME ZONE
+);
+
 -- =====================================================
 -- USER MANAGEMENT TABLES
 -- =====================================================
@@ -107,6 +116,7 @@ CREATE TABLE users (
     -- Role & Permissions
     role VARCHAR(20) NOT NULL CHECK (role IN ('super_admin', 'business_manager', 'regional_manager', 'customer', 'staff')),
     permissions JSONB DEFAULT '{}',
+    permissions_version INTEGER NOT NULL DEFAULT 1,
     
     -- Status & Security
     is_active BOOLEAN DEFAULT true,
@@ -124,6 +134,24 @@ CREATE TABLE users (
     INDEX idx_users_role (role)
 );
 
+-- Token Revocations (logout & user deactivation denylist)
+CREATE TABLE token_revocations (
+    id SERIAL PRIMARY KEY,
+    jti VARCHAR(36),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    
+    -- Tokens issued with a lower permissions version are revoked
+    permissions_version INTEGER,
+    
+    -- Metadata
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    
+    -- Indexes
+    INDEX idx_token_revocations_jti (jti),
+    INDEX idx_token_revocations_created_at (created_at)
+);
+
 -- =====================================================
 -- ZONE & TERRITORY MANAGEMENT
 -- =====================================================
@@ -140,6 +168,12 @@ CREATE TABLE zones (
     center_lat DECIMAL(10, 8),
     center_lng DECIMAL(11, 8),
     
+    -- Booking Slots (no capacity limit when slot_capacity is null)
+    slot_capacity INTEGER CHECK (slot_capacity >= 0),
+    slot_minutes INTEGER NOT NULL DEFAULT 60 CHECK (slot_minutes > 0),
+    service_start_time TIME NOT NULL DEFAULT '07:00',
+    service_end_time TIME NOT NULL DEFAULT '19:00',
+    
     -- Manager Assignment
     regional_manager_id UUID REFERENCES users(id),
     
@@ -172,6 +206,8 @@ CREATE TABLE customers (
     
     -- Address Info
     address TEXT NOT NULL,
+    latitude DECIMAL(10, 8),
+    longitude DECIMAL(11, 8),
     house_type VARCHAR(50),
     number_of_flats INTEGER DEFAULT 1,
     number_of_occupants INTEGER DEFAULT 1,
@@ -193,6 +229,9 @@ CREATE TABLE customers (
     INDEX idx_customers_email (email)
 );
 
+-- Case-insensitive email lookups per organization (bulk import duplicate checks)
+CREATE INDEX idx_customers_organization_email_lower ON customers (organization_id, lower(email));
+
 -- =====================================================
 -- PICKUP & SERVICE MANAGEMENT
 -- =====================================================
@@ -208,6 +247,8 @@ CREATE TABLE pickups (
     scheduled_date DATE NOT NULL,
     scheduled_time TIME NOT NULL,
     pickup_type VARCHAR(20) DEFAULT 'regular' CHECK (pickup_type IN ('regular', 'special', 'emergency')),
+    is_recurring BOOLEAN NOT NULL DEFAULT false, -- generated from customers.pickup_frequency
+    slot_reserved BOOLEAN NOT NULL DEFAULT false, -- holds a zone_slot_reservations unit
     
     -- Status & Tracking
     status VARCHAR(20) DEFAULT 'scheduled' CHECK (status IN ('scheduled', 'in_progress', 'completed', 'cancelled', 'missed')),
@@ -223,7 +264,55 @@ CREATE TABLE pickups (
     INDEX idx_pickups_organization (organization_id),
     INDEX idx_pickups_customer (customer_id),
     INDEX idx_pickups_zone (zone_id),
-    INDEX idx_pickups_scheduled_date (scheduled_date)
+    INDEX idx_pickups_scheduled_date (scheduled_date),
+    INDEX idx_pickups_organization_updated (organization_id, updated_at) -- delta sync
+);
+
+-- Recurring pickup materialization is idempotent: one generated pickup per customer per day
+CREATE UNIQUE INDEX uq_pickups_recurring_customer_date ON pickups (customer_id, scheduled_date) WHERE is_recurring;
+
+-- Covering index for the zone/day calendar aggregation (index-only scans)
+CREATE INDEX idx_pickups_calendar ON pickups (organization_id, scheduled_date, zone_id, status) INCLUDE (pickup_type);
+
+-- Open pickups only, for the missed-pickup sweep
+CREATE INDEX idx_pickups_open_schedule ON pickups (scheduled_date, scheduled_time) WHERE status = 'scheduled';
+
+-- Customer Imports (bulk onboarding jobs with progress and row-level errors)
+CREATE TABLE customer_imports (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    organization_id UUID NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    created_by UUID REFERENCES users(id),
+    
+    -- Upload
+    file_format VARCHAR(10) NOT NULL CHECK (file_format IN ('csv', 'ndjson')),
+    
+    -- Progress
+    status VARCHAR(20) NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    total_rows INTEGER,
+    processed_rows INTEGER NOT NULL DEFAULT 0,
+    imported_rows INTEGER NOT NULL DEFAULT 0,
+    failed_rows INTEGER NOT NULL DEFAULT 0,
+    
+    -- First errors and any fatal error
+    errors JSONB,
+    error_message TEXT,
+    
+    -- Metadata
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    
+    -- Indexes
+    INDEX idx_customer_imports_organization (organization_id)
+);
+
+-- Zone Slot Reservations (booked pickups per zone time slot, checked against zones.slot_capacity)
+CREATE TABLE zone_slot_reservations (
+    zone_id UUID NOT NULL REFERENCES zones(id) ON DELETE CASCADE,
+    slot_date DATE NOT NULL,
+    slot_time TIME NOT NULL,
+    reserved INTEGER NOT NULL DEFAULT 0 CHECK (reserved >= 0),
+    PRIMARY KEY (zone_id, slot_date, slot_time)
 );
 
 -- =====================================================
@@ -322,9 +411,9 @@ CREATE TABLE notifications (
 -- AUDIT & COMPLIANCE
 -- =====================================================
 
--- Audit Logs
+-- Audit Logs (range-partitioned by month on created_at)
 CREATE TABLE audit_logs (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     organization_id UUID NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
     user_id UUID REFERENCES users(id),
     
@@ -340,13 +429,96 @@ CREATE TABLE audit_logs (
     user_agent TEXT,
     
     -- Metadata
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
     
-    -- Indexes
-    INDEX idx_audit_logs_organization (organization_id),
-    INDEX idx_audit_logs_user (user_id),
-    INDEX idx_audit_logs_action (action),
-    INDEX idx_audit_logs_created_at (created_at)
+    -- The partition key must be part of the primary key
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Indexes (created on every partition)
+-- Keyset pagination walks (created_at, id) newest first, per organization and per user
+CREATE INDEX idx_audit_logs_organization ON audit_logs (organization_id, created_at DESC, id DESC);
+CREATE INDEX idx_audit_logs_user ON audit_logs (organization_id, user_id, created_at DESC, id DESC);
+CREATE INDEX idx_audit_logs_action ON audit_logs (action);
+CREATE INDEX idx_audit_logs_created_at ON audit_logs (created_at DESC, id DESC);
+
+-- Catches rows outside the pre-created monthly partitions
+CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT;
+
+-- Create the monthly partition containing month_start (idempotent)
+CREATE OR REPLACE FUNCTION create_audit_logs_partition(month_start DATE)
+RETURNS TEXT AS $$
+DECLARE
+    partition_start DATE := date_trunc('month', month_start)::DATE;
+    partition_end DATE := (date_trunc('month', month_start) + INTERVAL '1 month')::DATE;
+    partition_name TEXT := 'audit_logs_' || to_char(month_start, 'YYYY_MM');
+BEGIN
+    EXECUTE format(
+        'CREATE TABLE IF NOT EXISTS %I PARTITION OF audit_logs FOR VALUES FROM (%L) TO (%L)',
+        partition_name, partition_start, partition_end
+    );
+    RETURN partition_name;
+END;
+$$ language 'plpgsql';
+
+-- Monthly partitions whose whole range ends on or before cutoff
+CREATE OR REPLACE FUNCTION expired_audit_logs_partitions(cutoff DATE)
+RETURNS TABLE (partition_name TEXT, partition_start DATE) AS $$
+BEGIN
+    RETURN QUERY
+    SELECT child.relname::TEXT, to_date(substring(child.relname FROM 12), 'YYYY_MM')
+    FROM pg_inherits
+    JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+    JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+    WHERE parent.relname = 'audit_logs'
+      AND child.relname ~ '^audit_logs_[0-9]{4}_[0-9]{2}$'
+      AND to_date(substring(child.relname FROM 12), 'YYYY_MM') + INTERVAL '1 month' <= cutoff
+    ORDER BY 2;
+END;
+$$ language 'plpgsql';
+
+-- Detach and drop one monthly partition
+CREATE OR REPLACE FUNCTION drop_audit_logs_partition(partition_name TEXT)
+RETURNS VOID AS $$
+BEGIN
+    EXECUTE format('ALTER TABLE audit_logs DETACH PARTITION %I', partition_name);
+    EXECUTE format('DROP TABLE %I', partition_name);
+END;
+$$ language 'plpgsql';
+
+-- Audit Activity Rollups (hourly counts maintained by the audit writers)
+CREATE TABLE audit_activity_rollups (
+    organization_id UUID NOT NULL REFERENCES organizations(id) ON DELETE CASCADE,
+    hour TIMESTAMP WITH TIME ZONE NOT NULL,
+    action VARCHAR(100) NOT NULL,
+    user_id VARCHAR(36) NOT NULL DEFAULT '', -- '' when no user performed the action
+    count INTEGER NOT NULL DEFAULT 0,
+    
+    PRIMARY KEY (organization_id, hour, action, user_id)
+);
+
+-- Platform Stats (one row per day; today's row is refreshed through the day)
+CREATE TABLE platform_stats_daily (
+    stat_date DATE PRIMARY KEY,
+    
+    -- Organizations
+    organizations_total INTEGER NOT NULL DEFAULT 0,
+    organizations_active INTEGER NOT NULL DEFAULT 0,
+    organizations_trial INTEGER NOT NULL DEFAULT 0,
+    organizations_suspended INTEGER NOT NULL DEFAULT 0,
+    
+    -- Users
+    users_total INTEGER NOT NULL DEFAULT 0,
+    users_business_managers INTEGER NOT NULL DEFAULT 0,
+    users_regional_managers INTEGER NOT NULL DEFAULT 0,
+    users_customers INTEGER NOT NULL DEFAULT 0,
+    
+    -- Subscriptions
+    subscriptions_total INTEGER NOT NULL DEFAULT 0,
+    subscriptions_active INTEGER NOT NULL DEFAULT 0,
+    subscriptions_trial INTEGER NOT NULL DEFAULT 0,
+    
+    computed_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- =====================================================
@@ -4,7 +4,7 @@ Multi-tenant architecture with organization-based data isolation
 """
 
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from datetime import datetime, time
 import uuid
 
 db = SQLAlchemy()
@@ -97,6 +97,18 @@ class Subscription(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class OrganizationUsage(db.Model):
+    """Per-organization usage counters maintained on flush for O(1) limit checks"""
+    __tablename__ = 'organization_usage'
+    
+    organization_id = db.Column(db.String(36), db.ForeignKey('organizations.id'), primary_key=True)
+    customers = db.Column(db.Integer, nullable=False, default=0)
+    managers = db.Column(db.Integer, nullable=False, default=0)
+    zones = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Last reconciliation against the source tables
+    reconciled_at = db.Column(db.DateTime)
+
 class User(db.Model):
     """All users in the system"""
     __tablename__ = 'users'
@@ -114,6 +126,7 @@ class User(db.Model):
     # Role & Permissions
     role = db.Column(db.String(20), nullable=False)
     permissions = db.Column(db.JSON, default={})
+    permissions_version = db.Column(db.Integer, default=1, nullable=False)
     
     # Status & Security
     is_active = db.Column(db.Boolean, default=True)
@@ -125,6 +138,21 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class TokenRevocation(db.Model):
+    """Revoked access tokens (single tokens or all tokens of a user)"""
+    __tablename__ = 'token_revocations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), index=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id'))
+    
+    # Tokens issued with a lower permissions version are revoked
+    permissions_version = db.Column(db.Integer)
+    
+    # Metadata
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
 class Zone(db.Model):
     """Geographic areas managed by Regional Managers"""
     __tablename__ = 'zones'
@@ -139,6 +167,12 @@ class Zone(db.Model):
     center_lat = db.Column(db.Numeric(10, 8))
     center_lng = db.Column(db.Numeric(11, 8))
     
+    # Booking Slots (no capacity limit when slot_capacity is null)
+    slot_capacity = db.Column(db.Integer)
+    slot_minutes = db.Column(db.Integer, nullable=False, default=60)
+    service_start_time = db.Column(db.Time, nullable=False, default=time(7, 0))
+    service_end_time = db.Column(db.Time, nullable=False, default=time(19, 0))
+    
     # Manager Assignment
     regional_manager_id = db.Column(db.String(36), db.ForeignKey('users.id'))
     
@@ -169,6 +203,8 @@ class Customer(db.Model):
     
     # Address Info
     address = db.Column(db.Text, nullable=False)
+    latitude = db.Column(db.Numeric(10, 8))
+    longitude = db.Column(db.Numeric(11, 8))
     house_type = db.Column(db.String(50))
     number_of_flats = db.Column(db.Integer, default=1)
     number_of_occupants = db.Column(db.Integer, default=1)
@@ -190,6 +226,11 @@ class Customer(db.Model):
     payments = db.relationship('Payment', backref='customer', lazy=True)
     notifications = db.relationship('Notification', backref='customer', lazy=True)
     complaints = db.relationship('Complaint', backref='customer', lazy=True)
+    
+    __table_args__ = (
+        # Case-insensitive email lookups per organization (bulk import duplicate checks)
+        db.Index('idx_customers_organization_email_lower', 'organization_id', db.func.lower(email)),
+    )
 
 class Pickup(db.Model):
     """Waste pickup scheduling and tracking"""
@@ -204,6 +245,10 @@ class Pickup(db.Model):
     scheduled_date = db.Column(db.Date, nullable=False)
     scheduled_time = db.Column(db.Time, nullable=False)
     pickup_type = db.Column(db.String(20), default='regular')
+    # Generated from the customer's pickup_frequency (at most one per customer per day)
+    is_recurring = db.Column(db.Boolean, nullable=False, default=False)
+    # Holds one unit of its zone slot's capacity (released on cancellation)
+    slot_reserved = db.Column(db.Boolean, nullable=False, default=False)
     
     # Status & Tracking
     status = db.Column(db.String(20), default='scheduled')
@@ -214,6 +259,64 @@ class Pickup(db.Model):
     created_by = db.Column(db.String(36), db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index(
+            'uq_pickups_recurring_customer_date', 'customer_id', 'scheduled_date',
+            unique=True,
+            postgresql_where=db.text('is_recurring'),
+            sqlite_where=db.text('is_recurring')
+        ),
+        # Delta sync reads changes per organization in (updated_at, id) order
+        db.Index('idx_pickups_organization_updated', 'organization_id', 'updated_at'),
+        # Covers the calendar GROUP BY without touching the table
+        db.Index(
+            'idx_pickups_calendar', 'organization_id', 'scheduled_date', 'zone_id', 'status',
+            postgresql_include=['pickup_type']
+        ),
+        # Only still-scheduled pickups, so the missed-pickup sweep never scans history
+        db.Index(
+            'idx_pickups_open_schedule', 'scheduled_date', 'scheduled_time',
+            postgresql_where=db.text("status = 'scheduled'"),
+            sqlite_where=db.text("status = 'scheduled'")
+        ),
+    )
+
+class ZoneSlotReservation(db.Model):
+    """Booked pickups per zone time slot, checked against Zone.slot_capacity"""
+    __tablename__ = 'zone_slot_reservations'
+    
+    zone_id = db.Column(db.String(36), db.ForeignKey('zones.id'), primary_key=True)
+    slot_date = db.Column(db.Date, primary_key=True)
+    slot_time = db.Column(db.Time, primary_key=True)
+    reserved = db.Column(db.Integer, nullable=False, default=0)
+
+class CustomerImport(db.Model):
+    """Bulk customer import job with progress and a row-level error report"""
+    __tablename__ = 'customer_imports'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    organization_id = db.Column(db.String(36), db.ForeignKey('organizations.id'), nullable=False, index=True)
+    created_by = db.Column(db.String(36), db.ForeignKey('users.id'))
+    
+    # Upload
+    file_format = db.Column(db.String(10), nullable=False)
+    
+    # Progress
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    total_rows = db.Column(db.Integer)
+    processed_rows = db.Column(db.Integer, nullable=False, default=0)
+    imported_rows = db.Column(db.Integer, nullable=False, default=0)
+    failed_rows = db.Column(db.Integer, nullable=False, default=0)
+    
+    # First errors ([{'row', 'field', 'error'}]) and any fatal error
+    errors = db.Column(db.JSON)
+    error_message = db.Column(db.Text)
+    
+    # Metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
 
 class Invoice(db.Model):
     """Customer billing invoices"""
@@ -304,8 +407,45 @@ class AuditLog(db.Model):
     ip_address = db.Column(db.String(45))
     user_agent = db.Column(db.Text)
     
-    # Metadata
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Metadata (partition key on PostgreSQL)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+class AuditActivityRollup(db.Model):
+    """Hourly audit activity counts per organization, action and user"""
+    __tablename__ = 'audit_activity_rollups'
+    
+    organization_id = db.Column(db.String(36), db.ForeignKey('organizations.id'), primary_key=True)
+    hour = db.Column(db.DateTime, primary_key=True)
+    action = db.Column(db.String(100), primary_key=True)
+    # Empty string for actions without a user (part of the primary key)
+    user_id = db.Column(db.String(36), primary_key=True, default='')
+    
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class PlatformStatsDaily(db.Model):
+    """Daily platform-wide totals; today's row is the current stats snapshot"""
+    __tablename__ = 'platform_stats_daily'
+    
+    stat_date = db.Column(db.Date, primary_key=True)
+    
+    # Organizations
+    organizations_total = db.Column(db.Integer, nullable=False, default=0)
+    organizations_active = db.Column(db.Integer, nullable=False, default=0)
+    organizations_trial = db.Column(db.Integer, nullable=False, default=0)
+    organizations_suspended = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Users
+    users_total = db.Column(db.Integer, nullable=False, default=0)
+    users_business_managers = db.Column(db.Integer, nullable=False, default=0)
+    users_regional_managers = db.Column(db.Integer, nullable=False, default=0)
+    users_customers = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Subscriptions
+    subscriptions_total = db.Column(db.Integer, nullable=False, default=0)
+    subscriptions_active = db.Column(db.Integer, nullable=False, default=0)
+    subscriptions_trial = db.Column(db.Integer, nullable=False, default=0)
+    
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
 class Complaint(db.Model):
     """Customer complaints and support tickets"""
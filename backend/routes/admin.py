@@ -4,56 +4,120 @@ Handles super admin operations
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Organization, User, Subscription, SubscriptionTier, AuditLog
+from flask_jwt_extended import jwt_required
+from models import db, Organization, OrganizationUsage, User, Subscription, SubscriptionTier, AuditLog
 from utils.decorators import audit_log, super_admin_required
-from utils.limits import get_usage_stats
+from utils.principal import get_current_principal
+from utils.limits import get_usage_stats, get_usage_stats_batch, usage_count_column
+from utils.auth_tokens import token_denylist
+from utils.entitlements import invalidate_entitlements
+from utils.platform_stats import get_platform_stats, get_platform_stats_history
+from utils.organization_lifecycle import bulk_set_organization_status, validate_target, STATUS_ACTIONS
+from utils.pagination import get_page_args, keyset_paginate, InvalidCursor
 import uuid
 from datetime import datetime, timedelta
 
 admin_bp = Blueprint('admin', __name__)
 
+USAGE_COUNTERS = ('customers', 'managers', 'zones')
+
+ORGANIZATION_INCLUDES = ('subscription', 'usage')
+
+def _organization_sort_column(sort):
+    if sort in USAGE_COUNTERS:
+        # The same counts include=usage reports, live for unreconciled organizations
+        return usage_count_column(sort)
+    return {'created_at': Organization.created_at, 'name': Organization.name}.get(sort)
+
+def _subscriptions_by_organization(organization_ids):
+    """Latest subscription status and tier for each organization, in one query"""
+    rows = db.session.query(
+        Subscription.organization_id,
+        Subscription.status,
+        SubscriptionTier.id,
+        SubscriptionTier.name
+    ).join(
+        SubscriptionTier, SubscriptionTier.id == Subscription.tier_id
+    ).filter(
+        Subscription.organization_id.in_(organization_ids)
+    ).order_by(Subscription.created_at).all()
+    
+    return {
+        organization_id: {'status': status, 'tier_id': tier_id, 'tier_name': tier_name}
+        for organization_id, status, tier_id, tier_name in rows
+    }
+
 @admin_bp.route('/organizations', methods=['GET'])
 @jwt_required()
 @super_admin_required
 def list_all_organizations():
     """List all organizations (Super Admin only)"""
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 20, type=int)
+        cursor, limit, include_total = get_page_args(default_limit=20)
         status = request.args.get('status')
+        sort = request.args.get('sort', 'created_at')
+        descending = request.args.get('order', 'desc').lower() != 'asc'
+        include = {name for name in request.args.get('include', '').split(',') if name}
+        
+        sort_column = _organization_sort_column(sort)
+        if sort_column is None:
+            return jsonify({'error': f"sort must be one of: created_at, name, {', '.join(USAGE_COUNTERS)}"}), 400
+        if include - set(ORGANIZATION_INCLUDES):
+            return jsonify({'error': f"include must be a subset of: {', '.join(ORGANIZATION_INCLUDES)}"}), 400
         
-        query = Organization.query
+        query = db.session.query(Organization, sort_column).outerjoin(
+            OrganizationUsage, OrganizationUsage.organization_id == Organization.id
+        )
         
         if status:
-            query = query.filter_by(status=status)
+            query = query.filter(Organization.status == status)
+        
+        # Usage filters, e.g. ?min_customers=100&max_zones=5
+        for counter in USAGE_COUNTERS:
+            minimum = request.args.get(f'min_{counter}', type=int)
+            maximum = request.args.get(f'max_{counter}', type=int)
+            if minimum is not None:
+                query = query.filter(usage_count_column(counter) >= minimum)
+            if maximum is not None:
+                query = query.filter(usage_count_column(counter) <= maximum)
         
-        organizations = query.order_by(Organization.created_at.desc()).paginate(
-            page=page, per_page=limit, error_out=False
+        rows, pagination = keyset_paginate(
+            query, sort_column, Organization.id,
+            cursor=cursor, limit=limit, include_total=include_total,
+            descending=descending, key=lambda row: (row[1], row[0].id)
         )
+        organizations = [org for org, _ in rows]
+        organization_ids = [org.id for org in organizations]
         
-        return jsonify({
-            'data': [
-                {
-                    'id': org.id,
-                    'name': org.name,
-                    'slug': org.slug,
-                    'email': org.email,
-                    'phone': org.phone,
-                    'status': org.status,
-                    'created_at': org.created_at.isoformat(),
-                    'updated_at': org.updated_at.isoformat()
-                }
-                for org in organizations.items
-            ],
-            'pagination': {
-                'page': page,
-                'limit': limit,
-                'total': organizations.total,
-                'pages': organizations.pages
+        # Batched lookups for the whole page instead of per-row details calls
+        subscriptions = _subscriptions_by_organization(organization_ids) if 'subscription' in include else {}
+        usage = get_usage_stats_batch(organization_ids) if 'usage' in include else {}
+        
+        data = []
+        for org in organizations:
+            item = {
+                'id': org.id,
+                'name': org.name,
+                'slug': org.slug,
+                'email': org.email,
+                'phone': org.phone,
+                'status': org.status,
+                'created_at': org.created_at.isoformat(),
+                'updated_at': org.updated_at.isoformat()
             }
+            if 'subscription' in include:
+                item['subscription'] = subscriptions.get(org.id)
+            if 'usage' in include:
+                item['usage'] = usage.get(org.id)
+            data.append(item)
+        
+        return jsonify({
+            'data': data,
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -71,6 +135,7 @@ def suspend_organization(org_id):
         
         org.status = 'suspended'
         db.session.commit()
+        invalidate_entitlements(org.id)
         
         return jsonify({
             'message': 'Organization suspended successfully',
@@ -99,6 +164,7 @@ def activate_organization(org_id):
         
         org.status = 'active'
         db.session.commit()
+        invalidate_entitlements(org.id)
         
         return jsonify({
             'message': 'Organization activated successfully',
@@ -113,6 +179,45 @@ def activate_organization(org_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/organizations/bulk-status', methods=['PUT'])
+@jwt_required()
+@super_admin_required
+def bulk_update_organization_status():
+    """Suspend or activate many organizations at once (Super Admin only)"""
+    try:
+        principal = get_current_principal()
+        data = request.get_json() or {}
+        
+        status = data.get('status')
+        if status not in STATUS_ACTIONS:
+            return jsonify({'error': f"status must be one of: {', '.join(STATUS_ACTIONS)}"}), 400
+        
+        organization_ids = data.get('organization_ids')
+        filters = data.get('filter')
+        error = validate_target(organization_ids, filters)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        results = bulk_set_organization_status(
+            status,
+            organization_ids=organization_ids,
+            filters=filters,
+            actor_id=principal.user_id
+        )
+        
+        return jsonify({
+            'message': 'Organization statuses updated',
+            'data': results,
+            'summary': {
+                outcome: sum(1 for result in results if result['result'] == outcome)
+                for outcome in ('updated', 'unchanged', 'not_found')
+            }
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/organizations/<org_id>/details', methods=['GET'])
 @jwt_required()
 @super_admin_required
@@ -160,14 +265,42 @@ def get_organization_details(org_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_bp.route('/users/<user_id>/deactivate', methods=['PUT'])
+@jwt_required()
+@super_admin_required
+@audit_log('user_deactivation', 'user')
+def deactivate_user(user_id):
+    """Deactivate a user and revoke their tokens (Super Admin only)"""
+    try:
+        user = User.query.get(user_id)
+        
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        
+        user.is_active = False
+        token_denylist.revoke_user_tokens(user)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'User deactivated successfully',
+            'data': {
+                'id': user.id,
+                'email': user.email,
+                'is_active': user.is_active
+            }
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @admin_bp.route('/audit-logs', methods=['GET'])
 @jwt_required()
 @super_admin_required
 def get_all_audit_logs():
     """Get all audit logs (Super Admin only)"""
     try:
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 50, type=int)
+        cursor, limit, include_total = get_page_args()
         action = request.args.get('action')
         resource_type = request.args.get('resource_type')
         
@@ -178,8 +311,9 @@ def get_all_audit_logs():
         if resource_type:
             query = query.filter_by(resource_type=resource_type)
         
-        logs = query.order_by(AuditLog.created_at.desc()).paginate(
-            page=page, per_page=limit, error_out=False
+        logs, pagination = keyset_paginate(
+            query, AuditLog.created_at, AuditLog.id,
+            cursor=cursor, limit=limit, include_total=include_total
         )
         
         return jsonify({
@@ -196,62 +330,71 @@ def get_all_audit_logs():
                     'ip_address': log.ip_address,
                     'created_at': log.created_at.isoformat()
                 }
-                for log in logs.items
+                for log in logs
             ],
-            'pagination': {
-                'page': page,
-                'limit': limit,
-                'total': logs.total,
-                'pages': logs.pages
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _platform_stats_payload(stats):
+    return {
+        'organizations': {
+            'total': stats['organizations_total'],
+            'active': stats['organizations_active'],
+            'trial': stats['organizations_trial'],
+            'suspended': stats['organizations_suspended']
+        },
+        'users': {
+            'total': stats['users_total'],
+            'business_managers': stats['users_business_managers'],
+            'regional_managers': stats['users_regional_managers'],
+            'customers': stats['users_customers']
+        },
+        'subscriptions': {
+            'total': stats['subscriptions_total'],
+            'active': stats['subscriptions_active'],
+            'trial': stats['subscriptions_trial']
+        }
+    }
+
 @admin_bp.route('/stats', methods=['GET'])
 @jwt_required()
 @super_admin_required
 def get_admin_stats():
     """Get admin dashboard statistics"""
     try:
-        # Get total organizations
-        total_organizations = Organization.query.count()
-        active_organizations = Organization.query.filter_by(status='active').count()
-        trial_organizations = Organization.query.filter_by(status='trial').count()
-        suspended_organizations = Organization.query.filter_by(status='suspended').count()
-        
-        # Get total users
-        total_users = User.query.count()
-        business_managers = User.query.filter_by(role='business_manager').count()
-        regional_managers = User.query.filter_by(role='regional_manager').count()
-        customers = User.query.filter_by(role='customer').count()
-        
-        # Get total subscriptions
-        total_subscriptions = Subscription.query.count()
-        active_subscriptions = Subscription.query.filter_by(status='active').count()
-        trial_subscriptions = Subscription.query.filter_by(status='trial').count()
+        # Served from the periodically refreshed snapshot
+        snapshot = get_platform_stats()
         
         return jsonify({
-            'data': {
-                'organizations': {
-                    'total': total_organizations,
-                    'active': active_organizations,
-                    'trial': trial_organizations,
-                    'suspended': suspended_organizations
-                },
-                'users': {
-                    'total': total_users,
-                    'business_managers': business_managers,
-                    'regional_managers': regional_managers,
-                    'customers': customers
-                },
-                'subscriptions': {
-                    'total': total_subscriptions,
-                    'active': active_subscriptions,
-                    'trial': trial_subscriptions
+            'data': _platform_stats_payload(snapshot['stats']),
+            'generated_at': snapshot['computed_at'].isoformat(),
+            'age_seconds': int((datetime.utcnow() - snapshot['computed_at']).total_seconds())
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@admin_bp.route('/stats/history', methods=['GET'])
+@jwt_required()
+@super_admin_required
+def get_admin_stats_history():
+    """Get daily admin dashboard statistics for trend charts"""
+    try:
+        days = min(max(request.args.get('days', 30, type=int), 1), 365)
+        
+        return jsonify({
+            'data': [
+                {
+                    'date': snapshot['stat_date'].isoformat(),
+                    **_platform_stats_payload(snapshot['stats'])
                 }
-            }
+                for snapshot in get_platform_stats_history(days)
+            ]
         }), 200
         
     except Exception as e:
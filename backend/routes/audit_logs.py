@@ -3,35 +3,51 @@ Audit Logs Routes
 Handles audit trail and compliance reporting
 """
 
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, AuditLog, Organization, User
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required
+from models import AuditLog, Organization, User
 from utils.decorators import audit_log, business_manager_required
+from utils.principal import get_current_principal
+from utils.audit_archive import query_archive
+from utils.audit_rollups import get_activity_summary
+from utils.audit_export import stream_audit_export, EXPORT_FORMATS
+from utils.pagination import get_page_args, keyset_paginate, InvalidCursor
 from datetime import datetime, timedelta
 
 audit_logs_bp = Blueprint('audit_logs', __name__)
 
+def _date_range(start_date, end_date):
+    """
+    start_date/end_date query values as filter arguments. A date-only
+    end_date covers that whole day (before the next midnight); a full
+    timestamp is an inclusive end.
+    """
+    filters = {'start': datetime.fromisoformat(start_date) if start_date else None}
+    if end_date and len(end_date) == 10:
+        filters['before'] = datetime.fromisoformat(end_date) + timedelta(days=1)
+    elif end_date:
+        filters['end'] = datetime.fromisoformat(end_date)
+    return filters
+
 @audit_logs_bp.route('/', methods=['GET'])
 @jwt_required()
 @business_manager_required
 def get_audit_logs():
     """Get audit logs for organization"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or not user.organization_id:
+        if not principal or not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 50, type=int)
+        cursor, limit, include_total = get_page_args()
         action = request.args.get('action')
         resource_type = request.args.get('resource_type')
         user_id_filter = request.args.get('user_id')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        query = AuditLog.query.filter_by(organization_id=user.organization_id)
+        query = AuditLog.query.filter_by(organization_id=principal.organization_id)
         
         # Apply filters
         if action:
@@ -40,15 +56,17 @@ def get_audit_logs():
             query = query.filter_by(resource_type=resource_type)
         if user_id_filter:
             query = query.filter_by(user_id=user_id_filter)
-        if start_date:
-            start_datetime = datetime.fromisoformat(start_date)
-            query = query.filter(AuditLog.created_at >= start_datetime)
-        if end_date:
-            end_datetime = datetime.fromisoformat(end_date)
-            query = query.filter(AuditLog.created_at <= end_datetime)
-        
-        logs = query.order_by(AuditLog.created_at.desc()).paginate(
-            page=page, per_page=limit, error_out=False
+        date_range = _date_range(start_date, end_date)
+        if date_range['start']:
+            query = query.filter(AuditLog.created_at >= date_range['start'])
+        if date_range.get('end'):
+            query = query.filter(AuditLog.created_at <= date_range['end'])
+        if date_range.get('before'):
+            query = query.filter(AuditLog.created_at < date_range['before'])
+        
+        logs, pagination = keyset_paginate(
+            query, AuditLog.created_at, AuditLog.id,
+            cursor=cursor, limit=limit, include_total=include_total
         )
         
         return jsonify({
@@ -65,34 +83,110 @@ def get_audit_logs():
                     'user_agent': log.user_agent,
                     'created_at': log.created_at.isoformat()
                 }
-                for log in logs.items
+                for log in logs
             ],
+            'pagination': pagination
+        }), 200
+        
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@audit_logs_bp.route('/archive', methods=['GET'])
+@jwt_required()
+@business_manager_required
+def get_archived_audit_logs():
+    """Query archived (cold storage) audit logs for organization"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal or not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        limit = min(request.args.get('limit', 100, type=int), 1000)
+        fields = request.args.get('fields')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        logs = query_archive(
+            principal.organization_id,
+            **_date_range(start_date, end_date),
+            action=request.args.get('action'),
+            resource_type=request.args.get('resource_type'),
+            user_id=request.args.get('user_id'),
+            columns=fields.split(',') if fields else None,
+            limit=limit
+        )
+        
+        return jsonify({
+            'data': logs,
             'pagination': {
-                'page': page,
                 'limit': limit,
-                'total': logs.total,
-                'pages': logs.pages
+                'count': len(logs)
             }
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@audit_logs_bp.route('/export', methods=['GET'])
+@jwt_required()
+@business_manager_required
+@audit_log('audit_log_export', 'audit_log')
+def export_audit_logs():
+    """Stream audit logs for organization as NDJSON or CSV"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal or not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+        
+        compress = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        
+        chunks = stream_audit_export(
+            principal.organization_id,
+            export_format=export_format,
+            compress=compress,
+            **_date_range(start_date, end_date),
+            action=request.args.get('action'),
+            resource_type=request.args.get('resource_type'),
+            user_id=request.args.get('user_id')
+        )
+        
+        filename = f"audit_logs_{datetime.utcnow().strftime('%Y%m%d%H%M%S')}.{export_format}"
+        if compress:
+            filename += '.gz'
+        
+        return Response(
+            stream_with_context(chunks),
+            mimetype='application/gzip' if compress else EXPORT_FORMATS[export_format],
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @audit_logs_bp.route('/<log_id>', methods=['GET'])
 @jwt_required()
 @business_manager_required
 def get_audit_log_detail(log_id):
     """Get detailed audit log information"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or not user.organization_id:
+        if not principal or not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
         log = AuditLog.query.filter_by(
             id=log_id,
-            organization_id=user.organization_id
+            organization_id=principal.organization_id
         ).first()
         
         if not log:
@@ -135,49 +229,20 @@ def get_audit_log_detail(log_id):
 def get_audit_summary():
     """Get audit log summary statistics"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or not user.organization_id:
+        if not principal or not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
-        # Get date range (last 30 days)
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=30)
-        
-        # Get total logs in period
-        total_logs = AuditLog.query.filter(
-            AuditLog.organization_id == user.organization_id,
-            AuditLog.created_at >= start_date,
-            AuditLog.created_at <= end_date
-        ).count()
-        
-        # Get logs by action
-        action_counts = db.session.query(
-            AuditLog.action,
-            db.func.count(AuditLog.id)
-        ).filter(
-            AuditLog.organization_id == user.organization_id,
-            AuditLog.created_at >= start_date,
-            AuditLog.created_at <= end_date
-        ).group_by(AuditLog.action).all()
-        
-        # Get logs by user
-        user_counts = db.session.query(
-            AuditLog.user_id,
-            User.first_name,
-            User.last_name,
-            db.func.count(AuditLog.id)
-        ).join(User, AuditLog.user_id == User.id).filter(
-            AuditLog.organization_id == user.organization_id,
-            AuditLog.created_at >= start_date,
-            AuditLog.created_at <= end_date
-        ).group_by(AuditLog.user_id, User.first_name, User.last_name).all()
+        # Counts come from the hourly rollups; window is configurable
+        days = min(max(request.args.get('days', 30, type=int), 1), 365)
+        summary = get_activity_summary(principal.organization_id, days=days)
+        end_date = summary['end_date']
         
         # Get recent activity (last 7 days)
         recent_start = end_date - timedelta(days=7)
         recent_logs = AuditLog.query.filter(
-            AuditLog.organization_id == user.organization_id,
+            AuditLog.organization_id == principal.organization_id,
             AuditLog.created_at >= recent_start,
             AuditLog.created_at <= end_date
         ).order_by(AuditLog.created_at.desc()).limit(10).all()
@@ -185,14 +250,14 @@ def get_audit_summary():
         return jsonify({
             'data': {
                 'summary': {
-                    'total_logs': total_logs,
-                    'period': '30 days',
-                    'start_date': start_date.isoformat(),
+                    'total_logs': summary['total_logs'],
+                    'period': f'{days} days',
+                    'start_date': summary['start_date'].isoformat(),
                     'end_date': end_date.isoformat()
                 },
                 'by_action': [
                     {'action': action, 'count': count}
-                    for action, count in action_counts
+                    for action, count in summary['by_action']
                 ],
                 'by_user': [
                     {
@@ -200,7 +265,7 @@ def get_audit_summary():
                         'name': f"{first_name} {last_name}",
                         'count': count
                     }
-                    for user_id, first_name, last_name, count in user_counts
+                    for user_id, first_name, last_name, count in summary['by_user']
                 ],
                 'recent_activity': [
                     {
@@ -223,29 +288,29 @@ def get_audit_summary():
 def get_user_activity(user_id):
     """Get audit logs for a specific user"""
     try:
-        current_user_id = get_jwt_identity()
-        current_user = User.query.get(current_user_id)
+        principal = get_current_principal()
         
-        if not current_user or not current_user.organization_id:
+        if not principal or not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
         # Verify the requested user belongs to the same organization
         target_user = User.query.filter_by(
             id=user_id,
-            organization_id=current_user.organization_id
+            organization_id=principal.organization_id
         ).first()
         
         if not target_user:
             return jsonify({'error': 'User not found in organization'}), 404
         
-        page = request.args.get('page', 1, type=int)
-        limit = request.args.get('limit', 50, type=int)
+        cursor, limit, include_total = get_page_args()
         
-        logs = AuditLog.query.filter_by(
-            organization_id=current_user.organization_id,
+        query = AuditLog.query.filter_by(
+            organization_id=principal.organization_id,
             user_id=user_id
-        ).order_by(AuditLog.created_at.desc()).paginate(
-            page=page, per_page=limit, error_out=False
+        )
+        logs, pagination = keyset_paginate(
+            query, AuditLog.created_at, AuditLog.id,
+            cursor=cursor, limit=limit, include_total=include_total
         )
         
         return jsonify({
@@ -260,15 +325,12 @@ def get_user_activity(user_id):
                     'ip_address': log.ip_address,
                     'created_at': log.created_at.isoformat()
                 }
-                for log in logs.items
+                for log in logs
             ],
-            'pagination': {
-                'page': page,
-                'limit': limit,
-                'total': logs.total,
-                'pages': logs.pages
-            }
+            'pagination': pagination
         }), 200
         
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
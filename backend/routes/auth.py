@@ -4,10 +4,12 @@ Handles user registration, login, and token management
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, User, Organization
 from utils.decorators import audit_log
+from utils.principal import get_current_principal
+from utils.auth_tokens import create_user_access_token, token_denylist
 import uuid
 
 auth_bp = Blueprint('auth', __name__)
@@ -45,7 +47,7 @@ def register():
         db.session.commit()
         
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_access_token(user)
         
         return jsonify({
             'message': 'User registered successfully',
@@ -85,7 +87,7 @@ def login():
         db.session.commit()
         
         # Create access token
-        access_token = create_access_token(identity=user.id)
+        access_token = create_user_access_token(user)
         
         return jsonify({
             'message': 'Login successful',
@@ -106,8 +108,8 @@ def login():
 def verify_token():
     """Verify JWT token"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
+        user = principal.user if principal else None
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -131,8 +133,11 @@ def verify_token():
 def logout():
     """User logout"""
     try:
-        # In a real implementation, you might want to blacklist the token
+        token_denylist.revoke_token(get_jwt())
+        db.session.commit()
+        
         return jsonify({'message': 'Logout successful'}), 200
         
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -4,9 +4,10 @@ Handles end user (customer) operations
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import db, Customer, Organization, User, Notification
 from utils.decorators import audit_log, regional_manager_required
+from utils.principal import get_current_principal
 import uuid
 from datetime import datetime
 
@@ -17,13 +18,12 @@ customers_bp = Blueprint('customers', __name__)
 def get_customer_profile():
     """Get current customer profile"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or user.role != 'customer':
+        if not principal or principal.role != 'customer':
             return jsonify({'error': 'Customer access required'}), 403
         
-        customer = Customer.query.filter_by(organization_id=user.organization_id).first()
+        customer = Customer.query.filter_by(organization_id=principal.organization_id).first()
         if not customer:
             return jsonify({'error': 'Customer profile not found'}), 404
         
@@ -35,6 +35,8 @@ def get_customer_profile():
                 'email': customer.email,
                 'phone': customer.phone,
                 'address': customer.address,
+                'latitude': float(customer.latitude) if customer.latitude is not None else None,
+                'longitude': float(customer.longitude) if customer.longitude is not None else None,
                 'house_type': customer.house_type,
                 'number_of_flats': customer.number_of_flats,
                 'number_of_occupants': customer.number_of_occupants,
@@ -56,13 +58,12 @@ def get_customer_profile():
 def update_customer_profile():
     """Update customer profile"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or user.role != 'customer':
+        if not principal or principal.role != 'customer':
             return jsonify({'error': 'Customer access required'}), 403
         
-        customer = Customer.query.filter_by(organization_id=user.organization_id).first()
+        customer = Customer.query.filter_by(organization_id=principal.organization_id).first()
         if not customer:
             return jsonify({'error': 'Customer profile not found'}), 404
         
@@ -77,6 +78,10 @@ def update_customer_profile():
             customer.phone = data['phone']
         if 'address' in data:
             customer.address = data['address']
+        if 'latitude' in data:
+            customer.latitude = data['latitude']
+        if 'longitude' in data:
+            customer.longitude = data['longitude']
         if 'house_type' in data:
             customer.house_type = data['house_type']
         if 'number_of_flats' in data:
@@ -107,18 +112,17 @@ def update_customer_profile():
 def get_notifications():
     """Get customer notifications"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or user.role != 'customer':
+        if not principal or principal.role != 'customer':
             return jsonify({'error': 'Customer access required'}), 403
         
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 20, type=int)
         
         notifications = Notification.query.filter_by(
-            organization_id=user.organization_id,
-            customer_id=user.id
+            organization_id=principal.organization_id,
+            customer_id=principal.user_id
         ).order_by(Notification.created_at.desc()).paginate(
             page=page, per_page=limit, error_out=False
         )
@@ -154,16 +158,15 @@ def get_notifications():
 def mark_notification_read(notification_id):
     """Mark notification as read"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or user.role != 'customer':
+        if not principal or principal.role != 'customer':
             return jsonify({'error': 'Customer access required'}), 403
         
         notification = Notification.query.filter_by(
             id=notification_id,
-            organization_id=user.organization_id,
-            customer_id=user.id
+            organization_id=principal.organization_id,
+            customer_id=principal.user_id
         ).first()
         
         if not notification:
@@ -4,11 +4,16 @@ Handles organization creation, management, and settings
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import db, Organization, User, Subscription, SubscriptionTier
+from flask_jwt_extended import jwt_required
+from models import db, Organization, User, Subscription, SubscriptionTier, Zone, CustomerImport
 from utils.decorators import audit_log, super_admin_required, business_manager_required
+from utils.principal import get_current_principal
+from utils.entitlements import invalidate_entitlements
+from utils.zone_index import assign_customer_zones
+from utils.slot_capacity import rebuild_zone_reservations
+from utils.customer_import import IMPORT_FORMATS, start_import, serialize_import
 import uuid
-from datetime import datetime, timedelta
+from datetime import datetime, date, timedelta
 
 organizations_bp = Blueprint('organizations', __name__)
 
@@ -91,13 +96,12 @@ def register_manager():
 def get_my_organization():
     """Get current user's organization details"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or not user.organization_id:
+        if not principal or not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
-        org = Organization.query.get(user.organization_id)
+        org = Organization.query.get(principal.organization_id)
         if not org:
             return jsonify({'error': 'Organization not found'}), 404
         
@@ -155,13 +159,12 @@ def get_my_organization():
 def update_organization():
     """Update organization details"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user.organization_id:
+        if not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
-        org = Organization.query.get(user.organization_id)
+        org = Organization.query.get(principal.organization_id)
         if not org:
             return jsonify({'error': 'Organization not found'}), 404
         
@@ -213,13 +216,12 @@ def update_organization():
 def update_organization_features():
     """Update organization features and dashboard layout"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user.organization_id:
+        if not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
-        org = Organization.query.get(user.organization_id)
+        org = Organization.query.get(principal.organization_id)
         if not org:
             return jsonify({'error': 'Organization not found'}), 404
         
@@ -232,6 +234,7 @@ def update_organization_features():
             org.dashboard_layout = data['dashboard_layout']
         
         db.session.commit()
+        invalidate_entitlements(org.id)
         
         return jsonify({
             'message': 'Organization features updated successfully',
@@ -244,3 +247,148 @@ def update_organization_features():
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+@organizations_bp.route('/zones/assign-customers', methods=['POST'])
+@jwt_required()
+@business_manager_required
+@audit_log('customer_zone_assignment', 'customer')
+def assign_zones_to_customers():
+    """Assign customers to zones from their coordinates and the zone polygons"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        
+        summary = assign_customer_zones(
+            principal.organization_id,
+            only_unassigned=bool(data.get('only_unassigned', True))
+        )
+        
+        return jsonify({
+            'message': 'Customer zones assigned successfully',
+            'data': summary
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@organizations_bp.route('/zones/<zone_id>/capacity', methods=['PUT'])
+@jwt_required()
+@business_manager_required
+@audit_log('zone_capacity_update', 'zone')
+def update_zone_capacity(zone_id):
+    """Configure a zone's booking slots and per-slot capacity"""
+    try:
+        principal = get_current_principal()
+        
+        zone = Zone.query.filter_by(id=zone_id, organization_id=principal.organization_id).first()
+        if not zone:
+            return jsonify({'error': 'Zone not found'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        previous_layout = (zone.slot_capacity, zone.slot_minutes, zone.service_start_time, zone.service_end_time)
+        
+        if 'slot_capacity' in data:
+            if data['slot_capacity'] is not None and (not isinstance(data['slot_capacity'], int) or data['slot_capacity'] < 0):
+                return jsonify({'error': 'slot_capacity must be a non-negative integer or null'}), 400
+            zone.slot_capacity = data['slot_capacity']
+        if 'slot_minutes' in data:
+            if not isinstance(data['slot_minutes'], int) or not 5 <= data['slot_minutes'] <= 720:
+                return jsonify({'error': 'slot_minutes must be between 5 and 720'}), 400
+            zone.slot_minutes = data['slot_minutes']
+        try:
+            if data.get('service_start_time'):
+                zone.service_start_time = datetime.strptime(data['service_start_time'], '%H:%M').time()
+            if data.get('service_end_time'):
+                zone.service_end_time = datetime.strptime(data['service_end_time'], '%H:%M').time()
+        except ValueError:
+            return jsonify({'error': 'Service times must be HH:MM'}), 400
+        
+        if zone.service_end_time <= zone.service_start_time:
+            return jsonify({'error': 'service_end_time must be after service_start_time'}), 400
+        
+        # Pickups booked while capacity was off, or under the old slot
+        # boundaries, are counted into the new slots
+        if zone.slot_capacity is not None and (
+                previous_layout[0] is None
+                or previous_layout[1:] != (zone.slot_minutes, zone.service_start_time, zone.service_end_time)):
+            rebuild_zone_reservations(zone, date.today())
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Zone capacity updated successfully',
+            'data': {
+                'id': zone.id,
+                'slot_capacity': zone.slot_capacity,
+                'slot_minutes': zone.slot_minutes,
+                'service_start_time': zone.service_start_time.strftime('%H:%M'),
+                'service_end_time': zone.service_end_time.strftime('%H:%M')
+            }
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@organizations_bp.route('/customers/import', methods=['POST'])
+@jwt_required()
+@business_manager_required
+@audit_log('customer_import', 'customer')
+def import_customers():
+    """Start a bulk customer import from a CSV or NDJSON upload"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        upload = request.files.get('file')
+        file_format = request.args.get('format')
+        if not file_format:
+            content_type = (upload.mimetype if upload else request.mimetype) or ''
+            filename = (upload.filename if upload else '') or ''
+            if 'ndjson' in content_type or filename.endswith(('.ndjson', '.jsonl')):
+                file_format = 'ndjson'
+            else:
+                file_format = 'csv'
+        if file_format not in IMPORT_FORMATS:
+            return jsonify({'error': f"format must be one of: {', '.join(IMPORT_FORMATS)}"}), 400
+        
+        # Read the body as a stream so large files never sit in memory
+        job = start_import(
+            principal.organization_id,
+            upload.stream if upload else request.stream,
+            file_format,
+            created_by=principal.user_id
+        )
+        
+        return jsonify({
+            'message': 'Customer import started',
+            'data': serialize_import(job, include_errors=False)
+        }), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@organizations_bp.route('/customers/import/<import_id>', methods=['GET'])
+@jwt_required()
+@business_manager_required
+def get_customer_import(import_id):
+    """Progress and row-level errors of a customer import"""
+    try:
+        principal = get_current_principal()
+        
+        job = CustomerImport.query.filter_by(id=import_id, organization_id=principal.organization_id).first()
+        if not job:
+            return jsonify({'error': 'Import not found'}), 404
+        
+        return jsonify({'data': serialize_import(job)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
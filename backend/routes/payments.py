@@ -4,9 +4,10 @@ Handles payment processing and transaction history
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import db, Payment, Customer, Organization, User, Invoice
 from utils.decorators import audit_log
+from utils.principal import get_current_principal
 import uuid
 from datetime import datetime
 
@@ -17,20 +18,19 @@ payments_bp = Blueprint('payments', __name__)
 def get_transactions():
     """Get payment transactions"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user:
+        if not principal:
             return jsonify({'error': 'User not found'}), 404
         
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 20, type=int)
         status = request.args.get('status')
         
-        query = Payment.query.filter_by(organization_id=user.organization_id)
+        query = Payment.query.filter_by(organization_id=principal.organization_id)
         
-        if user.role == 'customer':
-            query = query.filter_by(customer_id=user.id)
+        if principal.role == 'customer':
+            query = query.filter_by(customer_id=principal.user_id)
         
         if status:
             query = query.filter_by(status=status)
@@ -72,10 +72,9 @@ def get_transactions():
 def make_payment():
     """Process a payment"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user:
+        if not principal:
             return jsonify({'error': 'User not found'}), 404
         
         data = request.get_json()
@@ -89,8 +88,8 @@ def make_payment():
         # Create payment
         payment = Payment(
             id=str(uuid.uuid4()),
-            organization_id=user.organization_id,
-            customer_id=user.id if user.role == 'customer' else None,
+            organization_id=principal.organization_id,
+            customer_id=principal.user_id if principal.role == 'customer' else None,
             invoice_id=data.get('invoice_id'),
             amount=data['amount'],
             currency=data.get('currency', 'NGN'),
@@ -130,12 +129,11 @@ def make_payment():
 def update_payment_status(payment_id):
     """Update payment status"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
         payment = Payment.query.filter_by(
             id=payment_id,
-            organization_id=user.organization_id
+            organization_id=principal.organization_id
         ).first()
         
         if not payment:
@@ -4,30 +4,53 @@ Handles waste pickup scheduling and tracking
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import db, Pickup, Customer, Organization, User, Zone
 from utils.decorators import audit_log, regional_manager_required
+from utils.principal import get_current_principal
+from utils.route_planner import plan_route
+from utils.pickup_status import apply_pickup_status_updates, MAX_BATCH_ITEMS
+from utils.pickup_sync import sync_pickups, DEFAULT_SYNC_LIMIT, MAX_SYNC_LIMIT
+from utils.pagination import InvalidCursor
+from utils.pickup_calendar import get_pickup_calendar, MAX_RANGE_DAYS
+from utils.upcoming_pickups import upcoming_pickups_cache
+from utils.slot_capacity import find_free_slots, reserve_slot, release_slots, SlotFullError
+from utils.recurring_pickups import (
+    materialize_pickups,
+    DEFAULT_HORIZON_DAYS,
+    MAX_HORIZON_DAYS,
+    DEFAULT_PICKUP_TIME
+)
 import uuid
-from datetime import datetime, date, time
+from datetime import datetime, date, time, timedelta
 
 pickups_bp = Blueprint('pickups', __name__)
 
+def _slot_full_response(error, zone, slot_date, slot_time):
+    """409 for a full zone slot, with the next slots that still have room"""
+    return jsonify({
+        'error': str(error),
+        'next_available': [
+            {'date': slot['date'].isoformat(), 'time': slot['time'].strftime('%H:%M')}
+            for slot in find_free_slots(zone, slot_date, slot_time)
+        ]
+    }), 409
+
 @pickups_bp.route('/schedule', methods=['GET'])
 @jwt_required()
 def get_pickups():
     """Get pickup schedule"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user:
+        if not principal:
             return jsonify({'error': 'User not found'}), 404
         
         page = request.args.get('page', 1, type=int)
         limit = request.args.get('limit', 20, type=int)
         status = request.args.get('status')
         
-        query = Pickup.query.filter_by(organization_id=user.organization_id)
+        query = Pickup.query.filter_by(organization_id=principal.organization_id)
         
         if status:
             query = query.filter_by(status=status)
@@ -70,8 +93,7 @@ def get_pickups():
 def create_pickup():
     """Create new pickup schedule"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
         data = request.get_json()
         
@@ -84,25 +106,43 @@ def create_pickup():
         # Check if customer exists
         customer = Customer.query.filter_by(
             id=data['customer_id'],
-            organization_id=user.organization_id
+            organization_id=principal.organization_id
         ).first()
         
         if not customer:
             return jsonify({'error': 'Customer not found'}), 404
         
+        zone = None
+        if data.get('zone_id'):
+            zone = Zone.query.filter_by(id=data['zone_id'], organization_id=principal.organization_id).first()
+            if not zone:
+                return jsonify({'error': 'Zone not found'}), 404
+        
         # Create pickup
         pickup = Pickup(
             id=str(uuid.uuid4()),
-            organization_id=user.organization_id,
+            organization_id=principal.organization_id,
             customer_id=data['customer_id'],
             zone_id=data.get('zone_id'),
             scheduled_date=datetime.strptime(data['scheduled_date'], '%Y-%m-%d').date(),
             scheduled_time=datetime.strptime(data['pickup_time'], '%H:%M').time(),
             pickup_type=data.get('pickup_type', 'regular'),
             notes=data.get('notes'),
-            created_by=user_id
+            created_by=principal.user_id
         )
         
+        # Take a unit of the zone slot's capacity in the same transaction
+        if zone and zone.slot_capacity is not None:
+            try:
+                reserve_slot(zone, pickup.scheduled_date, pickup.scheduled_time)
+            except SlotFullError as e:
+                db.session.rollback()
+                return _slot_full_response(e, zone, pickup.scheduled_date, pickup.scheduled_time)
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e)}), 400
+            pickup.slot_reserved = True
+        
         db.session.add(pickup)
         db.session.commit()
         
@@ -120,39 +160,272 @@ def create_pickup():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@pickups_bp.route('/upcoming', methods=['GET'])
+@pickups_bp.route('/materialize', methods=['POST'])
 @jwt_required()
-def get_upcoming_pickups():
-    """Get upcoming pickups"""
+@regional_manager_required
+@audit_log('pickup_materialization', 'pickup')
+def materialize_recurring_pickups():
+    """Generate upcoming pickups from customers' pickup frequencies"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
+        if not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
         
-        today = date.today()
+        data = request.get_json(silent=True) or {}
+        
+        try:
+            horizon_days = int(data.get('horizon_days', DEFAULT_HORIZON_DAYS))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'horizon_days must be an integer'}), 400
+        if not 1 <= horizon_days <= MAX_HORIZON_DAYS:
+            return jsonify({'error': f'horizon_days must be between 1 and {MAX_HORIZON_DAYS}'}), 400
+        
+        zone_id = data.get('zone_id')
+        if zone_id and not Zone.query.filter_by(id=zone_id, organization_id=principal.organization_id).first():
+            return jsonify({'error': 'Zone not found'}), 404
+        
+        pickup_time = DEFAULT_PICKUP_TIME
+        if data.get('pickup_time'):
+            try:
+                pickup_time = datetime.strptime(data['pickup_time'], '%H:%M').time()
+            except (TypeError, ValueError):
+                return jsonify({'error': 'pickup_time must be HH:MM'}), 400
+        
+        summary = materialize_pickups(
+            principal.organization_id,
+            zone_id=zone_id,
+            horizon_days=horizon_days,
+            pickup_time=pickup_time,
+            created_by=principal.user_id
+        )
+        
+        return jsonify({
+            'message': 'Recurring pickups generated successfully',
+            'data': summary
+        }), 200
         
-        pickups = Pickup.query.filter(
-            Pickup.organization_id == user.organization_id,
-            Pickup.scheduled_date >= today,
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@pickups_bp.route('/route', methods=['GET'])
+@jwt_required()
+@regional_manager_required
+def get_pickup_route():
+    """Plan the visiting order for a zone's open pickups on a date"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        zone_id = request.args.get('zone_id')
+        if not zone_id:
+            return jsonify({'error': 'zone_id is required'}), 400
+        
+        route_date = date.today()
+        if request.args.get('date'):
+            try:
+                route_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return jsonify({'error': 'date must be YYYY-MM-DD'}), 400
+        
+        zone = Zone.query.filter_by(id=zone_id, organization_id=principal.organization_id).first()
+        if not zone:
+            return jsonify({'error': 'Zone not found'}), 404
+        
+        rows = db.session.query(
+            Pickup.id,
+            Pickup.customer_id,
+            Pickup.scheduled_time,
+            Pickup.status,
+            Customer.first_name,
+            Customer.last_name,
+            Customer.address,
+            Customer.latitude,
+            Customer.longitude
+        ).join(Customer, Customer.id == Pickup.customer_id).filter(
+            Pickup.organization_id == principal.organization_id,
+            Pickup.zone_id == zone.id,
+            Pickup.scheduled_date == route_date,
             Pickup.status.in_(['scheduled', 'in_progress'])
-        ).order_by(Pickup.scheduled_date.asc(), Pickup.scheduled_time.asc()).limit(10).all()
+        ).order_by(Pickup.scheduled_time.asc(), Pickup.id.asc()).all()
+        
+        located = [row for row in rows if row.latitude is not None and row.longitude is not None]
+        unlocated = [row for row in rows if row.latitude is None or row.longitude is None]
+        
+        depot = None
+        if zone.center_lat is not None and zone.center_lng is not None:
+            depot = (zone.center_lat, zone.center_lng)
+        
+        plan = plan_route([(row.id, row.latitude, row.longitude) for row in located], depot=depot)
+        by_id = {row.id: row for row in located}
+        
+        def stop(row, sequence):
+            return {
+                'sequence': sequence,
+                'pickup_id': row.id,
+                'customer_id': row.customer_id,
+                'customer_name': f"{row.first_name} {row.last_name}",
+                'address': row.address,
+                'latitude': float(row.latitude) if row.latitude is not None else None,
+                'longitude': float(row.longitude) if row.longitude is not None else None,
+                'scheduled_time': row.scheduled_time.isoformat(),
+                'status': row.status
+            }
         
         return jsonify({
-            'data': [
-                {
-                    'id': pickup.id,
-                    'customer_id': pickup.customer_id,
-                    'zone_id': pickup.zone_id,
-                    'scheduled_date': pickup.scheduled_date.isoformat(),
-                    'scheduled_time': pickup.scheduled_time.isoformat(),
-                    'pickup_type': pickup.pickup_type,
-                    'status': pickup.status,
-                    'notes': pickup.notes
-                }
-                for pickup in pickups
+            'data': {
+                'zone_id': zone.id,
+                'date': route_date.isoformat(),
+                'depot': {'latitude': float(depot[0]), 'longitude': float(depot[1])} if depot else None,
+                'stops': [stop(by_id[pickup_id], index + 1) for index, pickup_id in enumerate(plan['order'])],
+                # No coordinates yet: listed by scheduled time, not routed
+                'unlocated': [stop(row, None) for row in unlocated],
+                'distance_km': plan['distance_km'],
+                'initial_distance_km': plan['initial_distance_km'],
+                'solve_ms': plan['solve_ms']
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pickups_bp.route('/sync', methods=['GET'])
+@jwt_required()
+def sync_pickup_changes():
+    """Pickups created or changed since the client's sync cursor"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal or not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        if principal.role == 'customer':
+            return jsonify({'error': 'Staff access required'}), 403
+        
+        zone_ids = None
+        if request.args.get('zone_id'):
+            zone = Zone.query.filter_by(id=request.args['zone_id'], organization_id=principal.organization_id).first()
+            if not zone:
+                return jsonify({'error': 'Zone not found'}), 404
+            zone_ids = [zone.id]
+        elif principal.role == 'regional_manager':
+            # Regional managers sync the zones they manage
+            zone_ids = [
+                zone_id for zone_id, in db.session.query(Zone.id).filter_by(
+                    organization_id=principal.organization_id,
+                    regional_manager_id=principal.user_id
+                )
             ]
+        
+        limit = min(max(request.args.get('limit', DEFAULT_SYNC_LIMIT, type=int), 1), MAX_SYNC_LIMIT)
+        
+        return jsonify(sync_pickups(
+            principal.organization_id,
+            zone_ids=zone_ids,
+            cursor=request.args.get('cursor'),
+            limit=limit
+        )), 200
+        
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pickups_bp.route('/calendar', methods=['GET'])
+@jwt_required()
+@regional_manager_required
+def get_pickup_calendar_counts():
+    """Pickup counts by day, zone, status and type over a date range"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        try:
+            start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else date.today()
+            end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else start + timedelta(days=6)
+        except ValueError:
+            return jsonify({'error': 'start and end must be YYYY-MM-DD'}), 400
+        
+        if end < start:
+            return jsonify({'error': 'end must not be before start'}), 400
+        if (end - start).days + 1 > MAX_RANGE_DAYS:
+            return jsonify({'error': f'Date range may span at most {MAX_RANGE_DAYS} days'}), 400
+        
+        zone_id = request.args.get('zone_id')
+        
+        return jsonify({
+            'data': {
+                'start': start.isoformat(),
+                'end': end.isoformat(),
+                'zone_id': zone_id,
+                'days': get_pickup_calendar(principal.organization_id, start, end, zone_id)
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pickups_bp.route('/slots', methods=['GET'])
+@jwt_required()
+@regional_manager_required
+def get_free_slots():
+    """Next free booking slots in a zone"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        zone = Zone.query.filter_by(id=request.args.get('zone_id'), organization_id=principal.organization_id).first()
+        if not zone:
+            return jsonify({'error': 'Zone not found'}), 404
+        
+        try:
+            start_date = datetime.strptime(request.args['date'], '%Y-%m-%d').date() if request.args.get('date') else date.today()
+            start_time = datetime.strptime(request.args['time'], '%H:%M').time() if request.args.get('time') else None
+        except ValueError:
+            return jsonify({'error': 'date must be YYYY-MM-DD and time HH:MM'}), 400
+        
+        count = min(max(request.args.get('count', 5, type=int), 1), 50)
+        
+        slots = find_free_slots(zone, start_date, start_time, count=count)
+        
+        return jsonify({
+            'data': {
+                'zone_id': zone.id,
+                'slot_minutes': zone.slot_minutes,
+                'slot_capacity': zone.slot_capacity,
+                'slots': [
+                    {
+                        'date': slot['date'].isoformat(),
+                        'time': slot['time'].strftime('%H:%M'),
+                        'available': slot['available']
+                    }
+                    for slot in slots
+                ]
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@pickups_bp.route('/upcoming', methods=['GET'])
+@jwt_required()
+def get_upcoming_pickups():
+    """Get upcoming pickups"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal:
+            return jsonify({'error': 'User not found'}), 404
+        
+        return jsonify({
+            'data': upcoming_pickups_cache.get(principal.organization_id)
         }), 200
         
     except Exception as e:
@@ -165,12 +438,11 @@ def get_upcoming_pickups():
 def update_pickup_status(pickup_id):
     """Update pickup status"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
         pickup = Pickup.query.filter_by(
             id=pickup_id,
-            organization_id=user.organization_id
+            organization_id=principal.organization_id
         ).first()
         
         if not pickup:
@@ -182,6 +454,22 @@ def update_pickup_status(pickup_id):
         if not new_status:
             return jsonify({'error': 'Status is required'}), 400
         
+        # Cancelling gives the zone slot back; leaving cancelled takes it again
+        if new_status == 'cancelled' and pickup.slot_reserved and pickup.zone:
+            release_slots([(pickup.zone, pickup.scheduled_date, pickup.scheduled_time)])
+            pickup.slot_reserved = False
+        elif (pickup.status == 'cancelled' and new_status != 'cancelled' and not pickup.slot_reserved
+                and pickup.zone and pickup.zone.slot_capacity is not None):
+            try:
+                reserve_slot(pickup.zone, pickup.scheduled_date, pickup.scheduled_time)
+            except SlotFullError as e:
+                db.session.rollback()
+                return _slot_full_response(e, pickup.zone, pickup.scheduled_date, pickup.scheduled_time)
+            except ValueError as e:
+                db.session.rollback()
+                return jsonify({'error': str(e)}), 400
+            pickup.slot_reserved = True
+        
         pickup.status = new_status
         
         if new_status == 'completed':
@@ -201,3 +489,41 @@ def update_pickup_status(pickup_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
+
+@pickups_bp.route('/status/batch', methods=['POST'])
+@jwt_required()
+@regional_manager_required
+@audit_log('pickup_status_update', 'pickup')
+def update_pickup_statuses():
+    """Update the status of many pickups in one transaction"""
+    try:
+        principal = get_current_principal()
+        
+        if not principal.organization_id:
+            return jsonify({'error': 'User not associated with any organization'}), 404
+        
+        data = request.get_json(silent=True) or {}
+        items = data.get('items')
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'error': 'items must be a non-empty list'}), 400
+        if len(items) > MAX_BATCH_ITEMS:
+            return jsonify({'error': f'At most {MAX_BATCH_ITEMS} items per request'}), 400
+        
+        results = apply_pickup_status_updates(principal.organization_id, items, actor_id=principal.user_id)
+        
+        summary = {}
+        for result in results:
+            summary[result['result']] = summary.get(result['result'], 0) + 1
+        
+        return jsonify({
+            'message': 'Pickup statuses processed',
+            'data': {
+                'results': results,
+                'summary': summary
+            }
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -4,9 +4,11 @@ Handles subscription tiers, billing, and usage limits
 """
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required
 from models import db, Subscription, SubscriptionTier, Organization, User
 from utils.decorators import audit_log, super_admin_required, business_manager_required
+from utils.principal import get_current_principal
+from utils.entitlements import invalidate_entitlements
 from utils.limits import get_usage_stats, check_customer_limit, check_manager_limit
 import uuid
 
@@ -80,13 +82,12 @@ def create_subscription_tier():
 def get_my_subscription():
     """Get current user's subscription details"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user.organization_id:
+        if not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
-        subscription = Subscription.query.filter_by(organization_id=user.organization_id).first()
+        subscription = Subscription.query.filter_by(organization_id=principal.organization_id).first()
         if not subscription:
             return jsonify({'error': 'No subscription found'}), 404
         
@@ -95,7 +96,7 @@ def get_my_subscription():
             return jsonify({'error': 'Subscription tier not found'}), 404
         
         # Get usage statistics
-        usage_stats = get_usage_stats(user.organization_id)
+        usage_stats = get_usage_stats(principal.organization_id)
         
         return jsonify({
             'data': {
@@ -134,10 +135,9 @@ def get_my_subscription():
 def upgrade_subscription():
     """Upgrade organization subscription"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user.organization_id:
+        if not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
         data = request.get_json()
@@ -152,7 +152,7 @@ def upgrade_subscription():
             return jsonify({'error': 'Subscription tier not found'}), 404
         
         # Get current subscription
-        subscription = Subscription.query.filter_by(organization_id=user.organization_id).first()
+        subscription = Subscription.query.filter_by(organization_id=principal.organization_id).first()
         if not subscription:
             return jsonify({'error': 'No subscription found'}), 404
         
@@ -163,6 +163,7 @@ def upgrade_subscription():
         subscription.next_billing_date = db.func.now() + db.func.interval('1 month')
         
         db.session.commit()
+        invalidate_entitlements(principal.organization_id)
         
         return jsonify({
             'message': 'Subscription upgraded successfully',
@@ -182,18 +183,17 @@ def upgrade_subscription():
 def check_subscription_limits():
     """Check if organization has hit subscription limits"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user.organization_id:
+        if not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
         # Get usage statistics
-        usage_stats = get_usage_stats(user.organization_id)
+        usage_stats = get_usage_stats(principal.organization_id)
         
         # Check limits
-        customer_limit_hit = check_customer_limit(user.organization_id)
-        manager_limit_hit = check_manager_limit(user.organization_id)
+        customer_limit_hit = check_customer_limit(principal.organization_id)
+        manager_limit_hit = check_manager_limit(principal.organization_id)
         
         return jsonify({
             'data': {
@@ -213,10 +213,9 @@ def check_subscription_limits():
 def get_invoices():
     """Get organization invoices"""
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user.organization_id:
+        if not principal.organization_id:
             return jsonify({'error': 'User not associated with any organization'}), 404
         
         page = request.args.get('page', 1, type=int)
@@ -8,6 +8,14 @@ from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
 from datetime import datetime, timedelta
 from models import db, Organization, Subscription, User
+from sqlalchemy import text
+from utils.audit_archive import archive_audit_logs, archive_audit_logs_month, audit_logs_source
+from utils.usage_counters import reconcile_usage_counters
+from utils.entitlements import invalidate_entitlements
+from utils.platform_stats import refresh_platform_stats
+from utils.recurring_pickups import materialize_all_organizations
+from utils.missed_pickups import mark_missed_pickups
+from utils.audit_rollups import backfill_rollups, rollups_need_backfill
 from utils.email_service import (
     send_trial_expiry_reminder_email,
     send_trial_expired_email,
@@ -23,6 +31,10 @@ logger = logging.getLogger(__name__)
 
 scheduler = BackgroundScheduler()
 
+AUDIT_LOG_RETENTION_DAYS = 90
+AUDIT_LOG_PARTITIONS_AHEAD = 3
+AUDIT_LOG_DELETE_CHUNK_SIZE = 10000
+
 def check_trial_expiry():
     """Check for trials expiring in 3 days and send reminders"""
     try:
@@ -107,6 +119,8 @@ def expire_trials():
                     logger.info(f"Sent trial expired email to {manager.email} for {org.name}")
         
         db.session.commit()
+        for subscription in expired_trials:
+            invalidate_entitlements(subscription.organization_id)
         logger.info(f"Processed {len(expired_trials)} expired trials")
         
     except Exception as e:
@@ -161,30 +175,165 @@ def generate_monthly_invoices():
     except Exception as e:
         logger.error(f"Error generating monthly invoices: {e}")
 
+def _month_starts(count):
+    """First day of the current month and the following count - 1 months"""
+    month = datetime.utcnow().date().replace(day=1)
+    months = []
+    for _ in range(count):
+        months.append(month)
+        month = (month + timedelta(days=32)).replace(day=1)
+    return months
+
+def create_audit_log_partitions(months_ahead=AUDIT_LOG_PARTITIONS_AHEAD):
+    """Pre-create monthly audit_logs partitions so inserts never land in the default partition"""
+    try:
+        if db.engine.dialect.name != 'postgresql':
+            return
+        
+        for month in _month_starts(months_ahead + 1):
+            db.session.execute(text("SELECT create_audit_logs_partition(:month)"), {'month': month})
+        
+        db.session.commit()
+        logger.info(f"Ensured audit log partitions for the next {months_ahead} months")
+        
+    except Exception as e:
+        logger.error(f"Error creating audit log partitions: {e}")
+        db.session.rollback()
+
+def _delete_audit_logs_before(table, cutoff_date):
+    """Delete rows older than cutoff in chunks, committing each chunk"""
+    total = 0
+    while True:
+        result = db.session.execute(text(f"""
+            DELETE FROM {table} WHERE id IN (
+                SELECT id FROM {table} WHERE created_at < :cutoff LIMIT :chunk_size
+            )
+        """), {'cutoff': cutoff_date, 'chunk_size': AUDIT_LOG_DELETE_CHUNK_SIZE})
+        db.session.commit()
+        total += result.rowcount
+        if result.rowcount < AUDIT_LOG_DELETE_CHUNK_SIZE:
+            return total
+
 def cleanup_old_logs():
-    """Clean up audit logs older than 90 days"""
+    """Archive, then drop, audit log partitions older than the retention window"""
     try:
         logger.info("Cleaning up old audit logs...")
         
-        # Get logs older than 90 days
-        cutoff_date = datetime.utcnow() - timedelta(days=90)
+        cutoff_date = datetime.utcnow() - timedelta(days=AUDIT_LOG_RETENTION_DAYS)
+        run_tag = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+        
+        if db.engine.dialect.name != 'postgresql':
+            archived = archive_audit_logs(None, cutoff_date, f'rows-{run_tag}')
+            deleted = _delete_audit_logs_before('audit_logs', cutoff_date)
+            logger.info(f"Archived {archived} and cleaned up {deleted} old audit logs")
+            return
         
-        from models import AuditLog
-        old_logs = AuditLog.query.filter(
-            AuditLog.created_at < cutoff_date
+        # Whole months past retention are archived, then detached and dropped
+        expired = db.session.execute(
+            text("SELECT partition_name, partition_start FROM expired_audit_logs_partitions(:cutoff)"),
+            {'cutoff': cutoff_date.date()}
         ).all()
         
-        # Delete old logs
-        for log in old_logs:
-            db.session.delete(log)
+        dropped = 0
+        for partition_name, partition_start in expired:
+            try:
+                archived = archive_audit_logs_month(partition_start, partition_name)
+            except Exception as e:
+                logger.error(f"Error archiving {partition_name}, keeping partition: {e}")
+                db.session.rollback()
+                continue
+            
+            db.session.execute(text("SELECT drop_audit_logs_partition(:name)"), {'name': partition_name})
+            db.session.commit()
+            dropped += 1
+            logger.info(f"Archived {archived} rows and dropped audit log partition {partition_name}")
         
-        db.session.commit()
-        logger.info(f"Cleaned up {len(old_logs)} old audit logs")
+        # Rows that fell into the default partition are archived and deleted in chunks
+        archive_audit_logs(None, cutoff_date, f'default-{run_tag}', audit_logs_source('audit_logs_default'))
+        deleted = _delete_audit_logs_before('audit_logs_default', cutoff_date)
+        logger.info(f"Dropped {dropped} audit log partitions and {deleted} default-partition rows")
         
     except Exception as e:
         logger.error(f"Error cleaning up old logs: {e}")
         db.session.rollback()
 
+def purge_expired_token_revocations():
+    """Delete token revocations whose tokens have already expired"""
+    try:
+        from models import TokenRevocation
+        deleted = TokenRevocation.query.filter(
+            TokenRevocation.expires_at < datetime.utcnow()
+        ).delete(synchronize_session=False)
+        
+        db.session.commit()
+        logger.info(f"Purged {deleted} expired token revocations")
+        
+    except Exception as e:
+        logger.error(f"Error purging token revocations: {e}")
+        db.session.rollback()
+
+def reconcile_usage():
+    """Recount organization usage counters and repair any drift"""
+    try:
+        drifted = reconcile_usage_counters()
+        logger.info(f"Reconciled usage counters; repaired {drifted} organizations")
+        
+    except Exception as e:
+        logger.error(f"Error reconciling usage counters: {e}")
+
+def refresh_admin_stats():
+    """Refresh the platform stats snapshot and today's daily stats row"""
+    try:
+        refresh_platform_stats()
+        logger.info("Refreshed platform stats snapshot")
+        
+    except Exception as e:
+        logger.error(f"Error refreshing platform stats: {e}")
+        db.session.rollback()
+
+def materialize_recurring_pickups():
+    """Generate the next weeks of recurring pickups for all organizations"""
+    try:
+        logger.info("Materializing recurring pickups...")
+        totals = materialize_all_organizations()
+        logger.info(
+            f"Materialized {totals['created']} pickups for {totals['customers']} customers "
+            f"across {totals['organizations']} organizations ({totals['skipped']} already scheduled, "
+            f"{totals['slot_full']} without a free slot)"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error materializing recurring pickups: {e}")
+        db.session.rollback()
+
+def detect_missed_pickups():
+    """Mark overdue scheduled pickups as missed and notify customers and managers"""
+    try:
+        summary = mark_missed_pickups()
+        logger.info(
+            f"Marked {summary['missed']} pickups missed across {summary['organizations']} organizations; "
+            f"queued {summary['customer_notifications']} customer and "
+            f"{summary['manager_notifications']} manager notifications"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error detecting missed pickups: {e}")
+        db.session.rollback()
+
+def backfill_audit_rollups():
+    """Fill hourly audit rollups for logs written before the rollups were maintained"""
+    try:
+        if not rollups_need_backfill():
+            logger.info("Audit rollups already cover all audit logs")
+            return
+        
+        written = backfill_rollups()
+        logger.info(f"Backfilled {written} audit rollup rows")
+        
+    except Exception as e:
+        logger.error(f"Error backfilling audit rollups: {e}")
+        db.session.rollback()
+
 def start_scheduler():
     """Start the background scheduler"""
     try:
@@ -221,6 +370,64 @@ def start_scheduler():
             replace_existing=True
         )
         
+        scheduler.add_job(
+            create_audit_log_partitions,
+            trigger=CronTrigger(day=1, hour=2, minute=0),  # 1st of month at 2 AM
+            id='create_audit_log_partitions',
+            name='Create Audit Log Partitions',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            purge_expired_token_revocations,
+            trigger=CronTrigger(hour=4, minute=0),  # Daily at 4 AM
+            id='purge_expired_token_revocations',
+            name='Purge Expired Token Revocations',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            reconcile_usage,
+            trigger=CronTrigger(hour=1, minute=30),  # Daily at 1:30 AM
+            id='reconcile_usage',
+            name='Reconcile Usage Counters',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            refresh_admin_stats,
+            trigger=CronTrigger(minute='*/5'),  # Every 5 minutes
+            id='refresh_admin_stats',
+            name='Refresh Platform Stats',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            materialize_recurring_pickups,
+            trigger=CronTrigger(hour=5, minute=0),  # Daily at 5 AM
+            id='materialize_recurring_pickups',
+            name='Materialize Recurring Pickups',
+            replace_existing=True
+        )
+        
+        scheduler.add_job(
+            detect_missed_pickups,
+            trigger=CronTrigger(minute='*/15'),  # Every 15 minutes
+            id='detect_missed_pickups',
+            name='Detect Missed Pickups',
+            replace_existing=True
+        )
+        
+        # Once, after the hour in progress at startup has finished
+        next_hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        scheduler.add_job(
+            backfill_audit_rollups,
+            trigger=DateTrigger(run_date=next_hour + timedelta(minutes=5), timezone='UTC'),
+            id='backfill_audit_rollups',
+            name='Backfill Audit Rollups',
+            replace_existing=True
+        )
+        
         # Start scheduler
         scheduler.start()
         logger.info("Background scheduler started successfully")
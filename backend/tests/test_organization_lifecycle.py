@@ -0,0 +1,26 @@
+import pytest
+
+from utils.organization_lifecycle import validate_target
+
+@pytest.mark.parametrize('organization_ids, filters', [
+    (None, {'status': None}),
+    (None, {'status': ''}),
+    (None, {}),
+    (None, {'plan': 'active'}),
+    (None, {'subscription_status': 'unknown'}),
+    ('org-1', None),
+    ([], None),
+    ([1, 2], None),
+    (None, None),
+    (['org-1'], {'status': 'active'}),
+])
+def test_rejects_selections_that_could_widen(organization_ids, filters):
+    assert validate_target(organization_ids, filters)
+
+@pytest.mark.parametrize('organization_ids, filters', [
+    (['org-1', 'org-2'], None),
+    (None, {'status': 'trial'}),
+    (None, {'status': 'active', 'subscription_status': 'expired'}),
+])
+def test_accepts_explicit_selections(organization_ids, filters):
+    assert validate_target(organization_ids, filters) is None
@@ -0,0 +1,34 @@
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from utils.pagination import encode_cursor, decode_cursor
+from utils.pickup_sync import next_sync_position, SYNC_SAFETY_LAG
+
+Row = namedtuple('Row', 'updated_at id')
+
+NOW = datetime(2026, 10, 17, 12, 0, 0)
+
+def test_aware_updated_at_on_last_page():
+    # timestamptz columns come back aware on PostgreSQL
+    row = Row(NOW.replace(tzinfo=timezone.utc) - timedelta(minutes=5), 'p1')
+
+    position = next_sync_position(None, row, False, NOW)
+
+    assert position == (NOW - timedelta(minutes=5), 'p1')
+    assert position[0].tzinfo is None
+
+def test_aware_updated_at_is_held_back_to_the_horizon():
+    row = Row(datetime(2026, 10, 17, 14, 0, 0, tzinfo=timezone(timedelta(hours=2))), 'p1')
+
+    position = next_sync_position(None, row, False, NOW)
+
+    assert position == (NOW - SYNC_SAFETY_LAG, '')
+
+def test_aware_cursor_round_trip():
+    aware = NOW.replace(tzinfo=timezone.utc) - timedelta(minutes=1)
+    cursor = encode_cursor(*next_sync_position(None, Row(aware, 'p1'), True, NOW))
+
+    sort_value, row_id = decode_cursor(cursor)
+    later = Row(NOW.replace(tzinfo=timezone.utc) - timedelta(seconds=30), 'p2')
+
+    assert next_sync_position((sort_value, row_id), later, False, NOW) == (NOW - timedelta(seconds=30), 'p2')
@@ -0,0 +1,46 @@
+from datetime import date, datetime, time, timedelta
+import uuid
+
+from models import db, Organization, Customer, Pickup
+from utils.recurring_pickups import materialize_pickups, pickup_dates
+
+def test_dates_follow_the_anchor_not_the_window():
+    anchor = date(2026, 1, 1)
+
+    assert pickup_dates('weekly', anchor, date(2026, 1, 3), date(2026, 1, 20)) == [
+        date(2026, 1, 8), date(2026, 1, 15)
+    ]
+    assert pickup_dates('monthly', date(2026, 1, 31), date(2026, 2, 1), date(2026, 3, 31)) == [
+        date(2026, 2, 28), date(2026, 3, 31)
+    ]
+
+def _daily_customer():
+    organization = Organization(id=str(uuid.uuid4()), name='Org', slug='org', email='org@example.com', status='active')
+    db.session.add(organization)
+    db.session.flush()
+    customer = Customer(
+        organization_id=organization.id, email='a@example.com', password_hash='x', first_name='A',
+        last_name='B', phone='1', address='Street 1', monthly_fee=10, pickup_frequency='daily',
+        service_start_date=date.today() - timedelta(days=30)
+    )
+    db.session.add(customer)
+    db.session.commit()
+    return customer
+
+def test_occurrences_already_past_are_left_out(app):
+    customer = _daily_customer()
+    today = datetime.utcnow().date()
+
+    summary = materialize_pickups(customer.organization_id, horizon_days=3, pickup_time=time(0, 0))
+
+    dates = sorted(pickup.scheduled_date for pickup in Pickup.query)
+    assert summary['created'] == 2
+    assert dates == [today + timedelta(days=1), today + timedelta(days=2)]
+
+def test_later_today_is_still_created(app):
+    customer = _daily_customer()
+    today = datetime.utcnow().date()
+
+    materialize_pickups(customer.organization_id, horizon_days=1, pickup_time=time(23, 59, 59, 999999))
+
+    assert [pickup.scheduled_date for pickup in Pickup.query] == [today]
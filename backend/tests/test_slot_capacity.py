@@ -0,0 +1,126 @@
+from datetime import date, time, timedelta
+import uuid
+
+import pytest
+
+from models import db, Organization, Customer, Zone, Pickup, ZoneSlotReservation
+from utils.pickup_status import apply_pickup_status_updates
+from utils.recurring_pickups import materialize_pickups
+from utils.slot_capacity import FenwickTree, SlotFullError, find_free_slots, reserve_slot, release_slots
+
+SLOT_DATE = date.today() + timedelta(days=3)
+
+def test_empty_tree():
+    tree = FenwickTree([])
+
+    assert tree.prefix(0) == 0
+    assert tree.find(1) is None
+
+def test_find_past_the_total():
+    tree = FenwickTree([1, 0, 1, 1])
+
+    assert tree.find(3) == 3
+    assert tree.find(4) is None
+    assert FenwickTree([0, 0, 0]).find(1) is None
+
+def test_find_and_prefix_reach_the_last_slot():
+    values = [1, 0, 1, 0, 0, 1, 1]
+    tree = FenwickTree(values)
+
+    assert [tree.prefix(count) for count in range(len(values) + 1)] == [0, 1, 1, 2, 2, 2, 3, 4]
+    assert [tree.find(k) for k in range(1, 5)] == [0, 2, 5, 6]
+    assert FenwickTree([0] * 8 + [1]).find(1) == 8
+
+@pytest.fixture
+def zone(app):
+    organization = Organization(id=str(uuid.uuid4()), name='Org', slug='org', email='org@example.com', status='active')
+    db.session.add(organization)
+    db.session.flush()
+    zone = Zone(
+        organization_id=organization.id, name='North', slot_capacity=1, slot_minutes=60,
+        service_start_time=time(8, 0), service_end_time=time(11, 0)
+    )
+    db.session.add(zone)
+    db.session.commit()
+    return zone
+
+def _customer(zone, email, frequency='weekly'):
+    customer = Customer(
+        organization_id=zone.organization_id, zone_id=zone.id, email=email, password_hash='x',
+        first_name='A', last_name='B', phone='1', address='Street 1', monthly_fee=10,
+        pickup_frequency=frequency
+    )
+    db.session.add(customer)
+    db.session.commit()
+    return customer
+
+def _pickup(zone, customer, slot_time):
+    reserve_slot(zone, SLOT_DATE, slot_time)
+    pickup = Pickup(
+        organization_id=zone.organization_id, customer_id=customer.id, zone_id=zone.id,
+        scheduled_date=SLOT_DATE, scheduled_time=slot_time, slot_reserved=True
+    )
+    db.session.add(pickup)
+    db.session.commit()
+    return pickup
+
+def _reserved(zone, slot_time):
+    return db.session.get(ZoneSlotReservation, (zone.id, SLOT_DATE, slot_time)).reserved
+
+def test_full_slot_raises_and_search_skips_it(zone):
+    customer = _customer(zone, 'a@example.com')
+    _pickup(zone, customer, time(8, 15))
+
+    with pytest.raises(SlotFullError):
+        reserve_slot(zone, SLOT_DATE, time(8, 45))
+    db.session.rollback()
+
+    slots = find_free_slots(zone, SLOT_DATE, time(8, 0), count=3)
+    assert [(slot['date'], slot['time']) for slot in slots] == [
+        (SLOT_DATE, time(9, 0)), (SLOT_DATE, time(10, 0)), (SLOT_DATE + timedelta(days=1), time(8, 0))
+    ]
+
+def test_reserve_outside_service_hours(zone):
+    with pytest.raises(ValueError):
+        reserve_slot(zone, SLOT_DATE, time(11, 0))
+
+def test_cancel_releases_and_restore_reserves(zone):
+    first = _pickup(zone, _customer(zone, 'a@example.com'), time(9, 0))
+    second_customer = _customer(zone, 'b@example.com')
+
+    results = apply_pickup_status_updates(zone.organization_id, [{'pickup_id': first.id, 'status': 'cancelled'}])
+    assert results[0]['result'] == 'updated'
+    assert _reserved(zone, time(9, 0)) == 0
+
+    second = _pickup(zone, second_customer, time(9, 30))
+    results = apply_pickup_status_updates(zone.organization_id, [{'pickup_id': first.id, 'status': 'scheduled'}])
+    assert results[0]['result'] == 'slot_full'
+    assert db.session.get(Pickup, first.id).status == 'cancelled'
+
+    apply_pickup_status_updates(zone.organization_id, [{'pickup_id': second.id, 'status': 'cancelled'}])
+    results = apply_pickup_status_updates(zone.organization_id, [{'pickup_id': first.id, 'status': 'scheduled'}])
+    assert results[0]['result'] == 'updated'
+    assert _reserved(zone, time(9, 0)) == 1
+    assert db.session.get(Pickup, first.id).slot_reserved
+
+def test_release_clamps_a_drifted_counter(zone):
+    pickup = _pickup(zone, _customer(zone, 'a@example.com'), time(10, 0))
+
+    release_slots([(zone, SLOT_DATE, pickup.scheduled_time)] * 2)
+    db.session.commit()
+
+    assert _reserved(zone, time(10, 0)) == 0
+
+def test_generated_pickups_take_their_slots(zone):
+    customers = [_customer(zone, f'{name}@example.com', 'daily') for name in ('a', 'b')]
+
+    summary = materialize_pickups(zone.organization_id, horizon_days=1, pickup_time=time(8, 0), start=SLOT_DATE)
+
+    assert summary['created'] == 1
+    assert summary['slot_full'] == 1
+    assert _reserved(zone, time(8, 0)) == 1
+    assert Pickup.query.filter_by(slot_reserved=True).count() == 1
+    assert find_free_slots(zone, SLOT_DATE, count=1)[0]['time'] == time(9, 0)
+    with pytest.raises(SlotFullError):
+        reserve_slot(zone, SLOT_DATE, time(8, 0))
+    assert {pickup.customer_id for pickup in Pickup.query} < {customer.id for customer in customers}
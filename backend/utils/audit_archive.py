@@ -0,0 +1,227 @@
+"""
+Audit Log Archive
+Exports aged audit logs to compressed Parquet files (one directory per
+organization and month) and queries them back for compliance
+"""
+
+from flask import current_app
+from sqlalchemy import select, table, column
+from models import db, AuditLog
+from datetime import datetime, timezone
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+ARCHIVE_COLUMNS = (
+    'id', 'organization_id', 'user_id', 'action', 'resource_type', 'resource_id',
+    'old_values', 'new_values', 'ip_address', 'user_agent', 'created_at'
+)
+
+JSON_COLUMNS = ('old_values', 'new_values')
+
+WRITE_BATCH_SIZE = 10000
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError('pyarrow is required for audit log archiving')
+
+def _archive_schema():
+    return pa.schema([
+        (name, pa.timestamp('us') if name == 'created_at' else pa.string())
+        for name in ARCHIVE_COLUMNS
+    ])
+
+def get_archive_root():
+    """Directory holding archived audit logs"""
+    return current_app.config.get('AUDIT_ARCHIVE_DIR', 'archive/audit_logs')
+
+def _month_key(created_at):
+    return created_at.strftime('%Y-%m')
+
+def _month_dir(root, organization_id, month):
+    return os.path.join(root, f'organization_id={organization_id}', f'month={month}')
+
+def _next_month(month_start):
+    if month_start.month == 12:
+        return month_start.replace(year=month_start.year + 1, month=1)
+    return month_start.replace(month=month_start.month + 1)
+
+def _to_archive_row(row):
+    record = dict(zip(ARCHIVE_COLUMNS, row))
+    created_at = record['created_at']
+    if created_at.tzinfo is not None:
+        record['created_at'] = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    for name in JSON_COLUMNS:
+        if record[name] is not None:
+            record[name] = json.dumps(record[name])
+    for name in ('id', 'organization_id', 'user_id', 'resource_id', 'ip_address'):
+        if record[name] is not None:
+            record[name] = str(record[name])
+    return record
+
+class _PartWriter:
+    """Writes one organization/month file through a temp file"""
+
+    def __init__(self, root, organization_id, month, part_name, schema):
+        directory = _month_dir(root, organization_id, month)
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{part_name}.parquet')
+        self.tmp_path = self.path + '.tmp'
+        self.schema = schema
+        self.writer = pq.ParquetWriter(self.tmp_path, schema, compression='zstd')
+        self.buffer = []
+        self.rows = 0
+
+    def add(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= WRITE_BATCH_SIZE:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        if self.buffer:
+            self.writer.write_table(pa.Table.from_pylist(self.buffer, schema=self.schema))
+            self.rows += len(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        self._write_buffer()
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+def archive_audit_logs(start, end, part_name, source=None):
+    """
+    Export audit rows with start <= created_at < end to Parquet.
+    Files are named after part_name, so re-archiving the same source overwrites
+    its own files instead of duplicating rows. Returns the number of rows written.
+    """
+    _require_pyarrow()
+
+    root = get_archive_root()
+    schema = _archive_schema()
+    if source is None:
+        source = AuditLog.__table__
+    columns = [source.c[name] for name in ARCHIVE_COLUMNS]
+
+    query = select(*columns)
+    if start is not None:
+        query = query.where(source.c.created_at >= start)
+    query = query.where(source.c.created_at < end).order_by(
+        source.c.organization_id, source.c.created_at
+    )
+
+    writer = None
+    writer_key = None
+    total = 0
+    try:
+        result = db.session.execute(query.execution_options(yield_per=WRITE_BATCH_SIZE))
+        for row in result:
+            record = _to_archive_row(row)
+            key = (record['organization_id'], _month_key(record['created_at']))
+            if key != writer_key:
+                if writer:
+                    writer.close()
+                    total += writer.rows
+                writer = _PartWriter(root, key[0], key[1], part_name, schema)
+                writer_key = key
+            writer.add(record)
+        if writer:
+            writer.close()
+            total += writer.rows
+            writer = None
+    finally:
+        if writer:
+            writer.writer.close()
+            os.remove(writer.tmp_path)
+
+    return total
+
+def audit_logs_source(table_name):
+    """Lightweight table clause for reading a specific audit_logs partition"""
+    return table(table_name, *[column(name) for name in ARCHIVE_COLUMNS])
+
+def archive_audit_logs_month(month_start, part_name):
+    """Export one calendar month of audit logs"""
+    month_start = datetime(month_start.year, month_start.month, 1)
+    return archive_audit_logs(month_start, _next_month(month_start), part_name)
+
+def _archived_months(organization_id, start=None, end=None):
+    """Archived months for an organization in the range, newest first"""
+    org_dir = os.path.join(get_archive_root(), f'organization_id={organization_id}')
+    if not os.path.isdir(org_dir):
+        return []
+
+    months = []
+    for entry in os.listdir(org_dir):
+        if not entry.startswith('month='):
+            continue
+        month_start = datetime.strptime(entry[len('month='):], '%Y-%m')
+        if start and _next_month(month_start) <= start:
+            continue
+        if end and month_start > end:
+            continue
+        months.append((month_start, os.path.join(org_dir, entry)))
+
+    return sorted(months, reverse=True)
+
+def query_archive(organization_id, start=None, end=None, action=None, resource_type=None,
+                  user_id=None, columns=None, limit=100, before=None):
+    """
+    Query archived audit logs for an organization, newest first, created
+    from start up to end (inclusive) or before (exclusive).
+    Only the month directories inside the date range are opened, only the
+    requested columns are read, and older months are skipped once limit is met.
+    """
+    _require_pyarrow()
+
+    columns = [name for name in (columns or ARCHIVE_COLUMNS) if name in ARCHIVE_COLUMNS]
+    read_columns = list(dict.fromkeys(columns + ['created_at']))
+
+    filters = []
+    if action:
+        filters.append(('action', '=', action))
+    if resource_type:
+        filters.append(('resource_type', '=', resource_type))
+    if user_id:
+        filters.append(('user_id', '=', user_id))
+    if start:
+        filters.append(('created_at', '>=', start))
+    if end:
+        filters.append(('created_at', '<=', end))
+    if before:
+        filters.append(('created_at', '<', before))
+
+    tables = []
+    matched = 0
+    for _, month_dir in _archived_months(organization_id, start, end or before):
+        for filename in sorted(os.listdir(month_dir)):
+            if not filename.endswith('.parquet'):
+                continue
+            part = pq.read_table(
+                os.path.join(month_dir, filename),
+                columns=read_columns,
+                filters=filters or None
+            )
+            tables.append(part)
+            matched += part.num_rows
+        if matched >= limit:
+            break
+
+    if not tables:
+        return []
+
+    combined = pa.concat_tables(tables).sort_by([('created_at', 'descending')]).slice(0, limit)
+
+    records = []
+    for record in combined.to_pylist():
+        record['created_at'] = record['created_at'].isoformat()
+        for name in JSON_COLUMNS:
+            if record.get(name) is not None:
+                record[name] = json.loads(record[name])
+        records.append({name: record[name] for name in columns})
+    return records
@@ -0,0 +1,122 @@
+"""
+Audit History
+Captures old/new values of audited models at flush time and writes them
+to audit_logs in the same transaction as the business write
+"""
+
+from flask import g, request, has_request_context
+from sqlalchemy import event, inspect
+from models import db, Organization, Customer, Pickup, Payment
+from utils.audit_sink import insert_audit_rows
+from utils.principal import peek_current_principal
+from datetime import datetime, date, time
+from decimal import Decimal
+import uuid
+
+AUDITED_MODELS = {
+    Organization: 'organization',
+    Customer: 'customer',
+    Pickup: 'pickup',
+    Payment: 'payment'
+}
+
+EXCLUDED_FIELDS = {'password_hash', 'created_at', 'updated_at'}
+
+def _serialize(value):
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+def _column_keys(obj):
+    return [
+        attr.key for attr in inspect(obj).mapper.column_attrs
+        if attr.key not in EXCLUDED_FIELDS
+    ]
+
+def _snapshot(obj):
+    return {key: _serialize(getattr(obj, key)) for key in _column_keys(obj)}
+
+def _diff(obj):
+    state = inspect(obj)
+    old_values, new_values = {}, {}
+    for key in _column_keys(obj):
+        history = state.attrs[key].history
+        if not history.has_changes():
+            continue
+        old_values[key] = _serialize(history.deleted[0]) if history.deleted else None
+        new_values[key] = _serialize(history.added[0]) if history.added else None
+    return old_values, new_values
+
+def _action_for(resource_type, operation):
+    # Inside an @audit_log route, changes to its resource carry the route's action
+    route_action = g.get('_audit_action') if has_request_context() else None
+    if route_action and route_action[1] == resource_type:
+        return route_action[0]
+    return f"{resource_type}_{operation}"
+
+def _build_row(obj, resource_type, operation, old_values, new_values):
+    organization_id = obj.id if isinstance(obj, Organization) else obj.organization_id
+    principal = peek_current_principal()
+
+    row = {
+        'id': str(uuid.uuid4()),
+        'organization_id': organization_id,
+        'user_id': principal.user_id if principal else None,
+        'action': _action_for(resource_type, operation),
+        'resource_type': resource_type,
+        'resource_id': obj.id,
+        'old_values': old_values,
+        'new_values': new_values,
+        'ip_address': None,
+        'user_agent': None,
+        'created_at': datetime.utcnow()
+    }
+    if has_request_context():
+        row['ip_address'] = request.remote_addr
+        row['user_agent'] = request.headers.get('User-Agent')
+    return row
+
+def collect_audit_rows(session):
+    """Build audit rows for audited objects in the pending flush"""
+    rows = []
+
+    for obj in session.new:
+        resource_type = AUDITED_MODELS.get(type(obj))
+        if resource_type:
+            rows.append(_build_row(obj, resource_type, 'created', None, _snapshot(obj)))
+
+    for obj in session.dirty:
+        resource_type = AUDITED_MODELS.get(type(obj))
+        if resource_type and session.is_modified(obj, include_collections=False):
+            old_values, new_values = _diff(obj)
+            if new_values:
+                rows.append(_build_row(obj, resource_type, 'updated', old_values, new_values))
+
+    for obj in session.deleted:
+        resource_type = AUDITED_MODELS.get(type(obj))
+        if resource_type:
+            rows.append(_build_row(obj, resource_type, 'deleted', _snapshot(obj), None))
+
+    return rows
+
+def mark_audited(resource_types):
+    """Note, for the current request, resource types whose audit rows are already written"""
+    if has_request_context():
+        g._audited_resource_types = g.get('_audited_resource_types', set()) | set(resource_types)
+
+def _after_flush(session, flush_context):
+    rows = [row for row in collect_audit_rows(session) if row['organization_id']]
+    if not rows:
+        return
+
+    insert_audit_rows(session.connection(), rows)
+    mark_audited({row['resource_type'] for row in rows})
+
+def register_audit_history():
+    """Attach the flush-time audit listener to the application session"""
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
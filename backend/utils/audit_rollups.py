@@ -0,0 +1,137 @@
+"""
+Audit Activity Rollups
+Maintains hourly audit counts per (organization, hour, action, user) so
+dashboards don't scan raw audit_logs
+"""
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, AuditActivityRollup, AuditLog, User
+from utils.upserts import upsert_increment
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+BACKFILL_CHUNK = timedelta(days=1)
+
+def _hour(created_at):
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+def increment_rollups(connection, rows):
+    """Add audit rows to the hourly rollups on the same connection/transaction"""
+    counts = Counter(
+        (row['organization_id'], _hour(row['created_at']), row['action'], row['user_id'] or '')
+        for row in rows
+        if row.get('organization_id')
+    )
+    if not counts:
+        return
+
+    table = AuditActivityRollup.__table__
+    # Sorted so concurrent writers lock rollup rows in the same order
+    values = [
+        {'organization_id': org_id, 'hour': hour, 'action': action, 'user_id': user_id, 'count': count}
+        for (org_id, hour, action, user_id), count in sorted(counts.items())
+    ]
+
+    upsert_increment(
+        connection, table,
+        ('organization_id', 'hour', 'action', 'user_id'),
+        values,
+        ('count',)
+    )
+
+def _hour_expression(dialect):
+    if dialect == 'postgresql':
+        return func.date_trunc('hour', AuditLog.created_at)
+    # Same text format SQLAlchemy stores DateTime values in, so keys collide as upserts expect
+    return func.strftime('%Y-%m-%d %H:00:00.000000', AuditLog.created_at)
+
+def _backfill_chunk(connection, start, end):
+    """Recount [start, end) from audit_logs, overwriting those hours' rollups"""
+    hour = _hour_expression(connection.dialect.name)
+    user_id = func.coalesce(AuditLog.user_id, '')
+    counts = select(
+        AuditLog.organization_id, hour, AuditLog.action, user_id, func.count()
+    ).where(
+        AuditLog.organization_id.isnot(None),
+        AuditLog.created_at >= start,
+        AuditLog.created_at < end
+    ).group_by(AuditLog.organization_id, hour, AuditLog.action, user_id)
+
+    table = AuditActivityRollup.__table__
+    insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+    statement = insert(table).from_select(['organization_id', 'hour', 'action', 'user_id', 'count'], counts)
+    statement = statement.on_conflict_do_update(
+        index_elements=[table.c.organization_id, table.c.hour, table.c.action, table.c.user_id],
+        set_={'count': statement.excluded['count']}
+    )
+    return connection.execute(statement).rowcount
+
+def backfill_rollups(since=None, until=None):
+    """
+    Rebuild the rollups of complete hours in [since, until) from audit_logs,
+    one committed day at a time. Counts are overwritten rather than added,
+    so reruns are harmless; until defaults to the start of the current hour
+    because rows of the hour in progress may still be committing. since
+    defaults to the oldest audit log. Returns the rollup rows written.
+    """
+    until = _hour(until or datetime.utcnow())
+    if since is None:
+        since = db.session.scalar(select(func.min(AuditLog.created_at)))
+        if since is None:
+            return 0
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    start = _hour(since)
+
+    written = 0
+    while start < until:
+        end = min(start + BACKFILL_CHUNK, until)
+        with db.engine.begin() as connection:
+            written += _backfill_chunk(connection, start, end)
+        start = end
+    return written
+
+def rollups_need_backfill():
+    """True while audit logs exist from before the first rollup hour"""
+    oldest_log = db.session.scalar(select(func.min(AuditLog.created_at)))
+    if oldest_log is None:
+        return False
+    oldest_rollup = db.session.scalar(select(func.min(AuditActivityRollup.hour)))
+    return oldest_rollup is None or _hour(oldest_log) < oldest_rollup
+
+def get_activity_summary(organization_id, days=30, now=None):
+    """Totals, per-action and per-user counts over the last `days` days from the rollups"""
+    end_date = now or datetime.utcnow()
+    start_date = _hour(end_date - timedelta(days=days))
+
+    window = [
+        AuditActivityRollup.organization_id == organization_id,
+        AuditActivityRollup.hour >= start_date,
+        AuditActivityRollup.hour <= end_date
+    ]
+
+    action_counts = db.session.query(
+        AuditActivityRollup.action,
+        db.func.sum(AuditActivityRollup.count)
+    ).filter(*window).group_by(AuditActivityRollup.action).all()
+
+    user_counts = db.session.query(
+        AuditActivityRollup.user_id,
+        User.first_name,
+        User.last_name,
+        db.func.sum(AuditActivityRollup.count)
+    ).join(User, AuditActivityRollup.user_id == User.id).filter(*window).group_by(
+        AuditActivityRollup.user_id, User.first_name, User.last_name
+    ).all()
+
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'total_logs': sum(int(count) for _, count in action_counts),
+        'by_action': [(action, int(count)) for action, count in action_counts],
+        'by_user': [
+            (user_id, first_name, last_name, int(count))
+            for user_id, first_name, last_name, count in user_counts
+        ]
+    }
@@ -0,0 +1,140 @@
+"""
+Audit Sink
+Queues audit entries in memory and writes them to audit_logs in batches
+from a background thread
+"""
+
+from models import db, AuditLog
+from utils.audit_rollups import increment_rollups
+from datetime import datetime
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+AUDIT_COLUMNS = (
+    'id', 'organization_id', 'user_id', 'action', 'resource_type', 'resource_id',
+    'old_values', 'new_values', 'ip_address', 'user_agent', 'created_at'
+)
+
+def insert_audit_rows(connection, rows):
+    """Insert audit rows with a single multi-row INSERT and update the hourly rollups"""
+    if rows:
+        connection.execute(AuditLog.__table__.insert(), rows)
+        increment_rollups(connection, rows)
+
+class AuditSink:
+    """Batched, asynchronous writer for audit log entries"""
+
+    def __init__(self, batch_size=500, flush_interval=0.05, max_queue_size=10000, put_timeout=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.put_timeout = put_timeout
+        self.asynchronous = True
+        self.app = None
+        self._queue = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        """Configure the sink from app config and register shutdown flushing"""
+        self.app = app
+        self.batch_size = app.config.get('AUDIT_SINK_BATCH_SIZE', self.batch_size)
+        self.flush_interval = app.config.get('AUDIT_SINK_FLUSH_MS', self.flush_interval * 1000) / 1000.0
+        self.max_queue_size = app.config.get('AUDIT_SINK_QUEUE_SIZE', self.max_queue_size)
+        self.asynchronous = app.config.get('AUDIT_SINK_ASYNC', self.asynchronous)
+        self._queue = queue.Queue(maxsize=self.max_queue_size)
+        atexit.register(self.shutdown)
+
+    def _ensure_started(self):
+        # Started lazily so CLI scripts and pre-fork masters don't own a writer thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='audit-sink', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, entry):
+        """Queue one audit entry (a dict of audit_logs columns)"""
+        row = {column: entry.get(column) for column in AUDIT_COLUMNS}
+        row['id'] = row['id'] or str(uuid.uuid4())
+        row['created_at'] = row['created_at'] or datetime.utcnow()
+
+        if not self.asynchronous or self._stopping.is_set():
+            self._write([row])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            # Backpressure: the writer can't keep up, so this caller pays for its own write
+            logger.warning("Audit queue full; writing entry synchronously")
+            self._write([row])
+
+    def _run(self):
+        while not self._stopping.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+
+    def _collect_batch(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows):
+        """Insert rows with a single multi-row INSERT"""
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    insert_audit_rows(connection, rows)
+        except Exception as e:
+            logger.error(f"Error writing {len(rows)} audit entries: {e}")
+
+    def flush(self):
+        """Write everything currently queued"""
+        if self._queue is None:
+            return
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the writer thread and drain the queue"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+audit_sink = AuditSink()
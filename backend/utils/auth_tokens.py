@@ -0,0 +1,124 @@
+"""
+Access Tokens and Revocation
+Issues access tokens carrying role/tenant claims and keeps an in-memory
+denylist of revoked tokens that is refreshed from the database
+"""
+
+from flask import current_app
+from flask_jwt_extended import create_access_token
+from models import db, TokenRevocation
+from datetime import datetime, timedelta
+import threading
+import time
+
+def create_user_access_token(user):
+    """Create an access token with the claims needed to authorize without a DB lookup"""
+    return create_access_token(
+        identity=user.id,
+        additional_claims={
+            'role': user.role,
+            'org': user.organization_id,
+            'perms': user.permissions or {},
+            'pv': user.permissions_version or 1
+        }
+    )
+
+class TokenDenylist:
+    """Process-local view of token_revocations, refreshed periodically"""
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._revoked_jtis = {}
+        self._min_versions = {}
+        self._watermark = None
+        self._next_refresh = 0
+
+    def init_app(self, app, jwt):
+        """Register the denylist with the JWT manager"""
+        self.refresh_interval = app.config.get('TOKEN_DENYLIST_REFRESH_SECONDS', self.refresh_interval)
+
+        @jwt.token_in_blocklist_loader
+        def check_if_token_revoked(jwt_header, jwt_payload):
+            return self.is_revoked(jwt_payload)
+
+    def _apply(self, revocation):
+        if revocation.jti:
+            self._revoked_jtis[revocation.jti] = revocation.expires_at
+        if revocation.user_id and revocation.permissions_version:
+            current = self._min_versions.get(revocation.user_id, (0, None))
+            if revocation.permissions_version > current[0]:
+                self._min_versions[revocation.user_id] = (revocation.permissions_version, revocation.expires_at)
+
+    def _purge_expired(self):
+        now = datetime.utcnow()
+        self._revoked_jtis = {jti: exp for jti, exp in self._revoked_jtis.items() if exp > now}
+        self._min_versions = {uid: entry for uid, entry in self._min_versions.items() if entry[1] > now}
+
+    def refresh(self, force=False):
+        """Load revocations created since the last refresh"""
+        if not force and time.monotonic() < self._next_refresh:
+            return
+
+        with self._lock:
+            if not force and time.monotonic() < self._next_refresh:
+                return
+
+            query = TokenRevocation.query.filter(TokenRevocation.expires_at > datetime.utcnow())
+            if self._watermark:
+                # Overlap the window so rows committed late are still picked up
+                overlap = timedelta(seconds=self.refresh_interval * 2)
+                query = query.filter(TokenRevocation.created_at >= self._watermark - overlap)
+
+            refreshed_at = datetime.utcnow()
+            for revocation in query.all():
+                self._apply(revocation)
+
+            self._purge_expired()
+            self._watermark = refreshed_at
+            self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def is_revoked(self, jwt_payload):
+        """Check a decoded token against the denylist"""
+        self.refresh()
+
+        if jwt_payload.get('jti') in self._revoked_jtis:
+            return True
+
+        entry = self._min_versions.get(jwt_payload.get('sub'))
+        if entry and jwt_payload.get('pv', 0) < entry[0]:
+            return True
+
+        return False
+
+    def revoke_token(self, jwt_payload):
+        """Revoke a single token (caller commits)"""
+        revocation = TokenRevocation(
+            jti=jwt_payload['jti'],
+            user_id=jwt_payload.get('sub'),
+            expires_at=datetime.utcfromtimestamp(jwt_payload['exp'])
+        )
+        db.session.add(revocation)
+        with self._lock:
+            self._apply(revocation)
+        return revocation
+
+    def revoke_user_tokens(self, user):
+        """Revoke every token issued to a user so far (caller commits)"""
+        user.permissions_version = (user.permissions_version or 1) + 1
+
+        max_age = current_app.config.get('JWT_ACCESS_TOKEN_EXPIRES', 86400)
+        if isinstance(max_age, timedelta):
+            max_age = max_age.total_seconds()
+
+        revocation = TokenRevocation(
+            user_id=user.id,
+            permissions_version=user.permissions_version,
+            expires_at=datetime.utcnow() + timedelta(seconds=max_age)
+        )
+        db.session.add(revocation)
+        with self._lock:
+            self._apply(revocation)
+        return revocation
+
+token_denylist = TokenDenylist()
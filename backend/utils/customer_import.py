@@ -0,0 +1,344 @@
+"""
+Customer Import
+Bulk onboarding from CSV or NDJSON: the upload is spooled to disk, then
+validated and inserted in chunks by a background worker that records
+progress and a row-level error report on a customer_imports row
+"""
+
+from flask import current_app
+from sqlalchemy import select, func
+from models import db, Customer, Zone, CustomerImport
+from utils.limits import remaining_capacity, reserve_capacity
+from utils.zone_index import get_zone_index
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from decimal import Decimal, InvalidOperation
+import csv
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+SPOOL_BUFFER_SIZE = 1024 * 1024
+
+REQUIRED_FIELDS = ('email', 'first_name', 'last_name', 'phone', 'address', 'monthly_fee')
+PICKUP_FREQUENCIES = ('daily', 'weekly', 'biweekly', 'monthly')
+CUSTOMER_STATUSES = ('active', 'suspended', 'cancelled')
+
+# Imported customers can't sign in until a password is set; this never
+# matches a Werkzeug hash
+UNUSABLE_PASSWORD_HASH = '!'
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='customer-import')
+
+class RowError(ValueError):
+    """A field in an import row failed validation"""
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+
+def spool_upload(stream):
+    """Copy an upload stream to a temporary file without holding it in memory"""
+    handle = tempfile.NamedTemporaryFile(prefix='customer-import-', delete=False)
+    with handle:
+        shutil.copyfileobj(stream, handle, SPOOL_BUFFER_SIZE)
+    return handle.name
+
+def iter_records(path, file_format):
+    """(row number, record dict or None, parse error or None) for each data row"""
+    with open(path, newline='', encoding='utf-8-sig') as handle:
+        if file_format == 'csv':
+            for row_number, record in enumerate(csv.DictReader(handle), start=1):
+                yield row_number, {key.strip(): value for key, value in record.items() if key}, None
+            return
+
+        row_number = 0
+        for line in handle:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError:
+                yield row_number, None, 'Invalid JSON'
+                continue
+            if not isinstance(record, dict):
+                yield row_number, None, 'Each line must be a JSON object'
+                continue
+            yield row_number, record, None
+
+def count_records(path, file_format):
+    """Number of data rows, without validating them"""
+    return sum(1 for _ in iter_records(path, file_format))
+
+def _value(record, field):
+    value = record.get(field)
+    if isinstance(value, str):
+        value = value.strip()
+    return None if value in (None, '') else value
+
+def _decimal(record, field, minimum=None, maximum=None):
+    value = _value(record, field)
+    if value is None:
+        return None
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise RowError(field, f'{field} must be a number')
+    if (minimum is not None and number < minimum) or (maximum is not None and number > maximum):
+        raise RowError(field, f'{field} is out of range')
+    return number
+
+def _integer(record, field):
+    value = _value(record, field)
+    if value is None:
+        return None
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise RowError(field, f'{field} must be an integer')
+    if number < 0:
+        raise RowError(field, f'{field} must not be negative')
+    return number
+
+def _date(record, field):
+    value = _value(record, field)
+    if value is None:
+        return None
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise RowError(field, f'{field} must be YYYY-MM-DD')
+
+def _customer_row(record, organization_id, now):
+    """Validated customers row for an import record; raises RowError"""
+    for field in REQUIRED_FIELDS:
+        if _value(record, field) is None:
+            raise RowError(field, f'{field} is required')
+
+    email = str(_value(record, 'email')).lower()
+    if '@' not in email or len(email) > 255:
+        raise RowError('email', 'email is invalid')
+
+    pickup_frequency = _value(record, 'pickup_frequency') or 'weekly'
+    if pickup_frequency not in PICKUP_FREQUENCIES:
+        raise RowError('pickup_frequency', f"pickup_frequency must be one of: {', '.join(PICKUP_FREQUENCIES)}")
+    status = _value(record, 'status') or 'active'
+    if status not in CUSTOMER_STATUSES:
+        raise RowError('status', f"status must be one of: {', '.join(CUSTOMER_STATUSES)}")
+
+    latitude = _decimal(record, 'latitude', -90, 90)
+    longitude = _decimal(record, 'longitude', -180, 180)
+    if (latitude is None) != (longitude is None):
+        raise RowError('latitude' if latitude is None else 'longitude', 'latitude and longitude must be given together')
+
+    for field, limit in (('first_name', 100), ('last_name', 100), ('phone', 20), ('house_type', 50)):
+        if len(str(_value(record, field) or '')) > limit:
+            raise RowError(field, f'{field} is longer than {limit} characters')
+
+    monthly_fee = _decimal(record, 'monthly_fee', 0)
+    number_of_flats = _integer(record, 'number_of_flats')
+    number_of_occupants = _integer(record, 'number_of_occupants')
+
+    return {
+        'id': str(uuid.uuid4()),
+        'organization_id': organization_id,
+        'zone_id': _value(record, 'zone_id'),
+        'email': email,
+        'password_hash': UNUSABLE_PASSWORD_HASH,
+        'first_name': str(_value(record, 'first_name')),
+        'last_name': str(_value(record, 'last_name')),
+        'phone': str(_value(record, 'phone')),
+        'address': str(_value(record, 'address')),
+        'latitude': latitude,
+        'longitude': longitude,
+        'house_type': _value(record, 'house_type'),
+        'number_of_flats': 1 if number_of_flats is None else number_of_flats,
+        'number_of_occupants': 1 if number_of_occupants is None else number_of_occupants,
+        'monthly_fee': monthly_fee,
+        'pickup_frequency': pickup_frequency,
+        'service_start_date': _date(record, 'service_start_date'),
+        'service_end_date': _date(record, 'service_end_date'),
+        'status': status,
+        'created_at': now,
+        'updated_at': now
+    }
+
+class _ImportRun:
+    """State shared across the chunks of one import"""
+
+    def __init__(self, job):
+        self.job = job
+        self.organization_id = job.organization_id
+        self.zone_ids = set(db.session.scalars(select(Zone.id).where(Zone.organization_id == job.organization_id)))
+        self.zone_index = get_zone_index(job.organization_id)
+        self.seen_emails = set()
+        self.errors = []
+
+    def error(self, row_number, field, message):
+        self.job.failed_rows += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'field': field, 'error': message})
+
+    def _existing_emails(self, emails):
+        if not emails:
+            return set()
+        return set(db.session.scalars(
+            select(func.lower(Customer.email)).where(
+                Customer.organization_id == self.organization_id,
+                func.lower(Customer.email).in_(emails)
+            )
+        ))
+
+    def process(self, chunk):
+        """
+        Validate, place and insert one chunk; commits with the job's progress.
+        Returns False when the tier had no room for the chunk's customers.
+        """
+        now = datetime.utcnow()
+        rows = []
+        for row_number, record, parse_error in chunk:
+            if parse_error:
+                self.error(row_number, None, parse_error)
+                continue
+            try:
+                row = _customer_row(record, self.organization_id, now)
+            except RowError as e:
+                self.error(row_number, e.field, str(e))
+                continue
+            if row['email'] in self.seen_emails:
+                self.error(row_number, 'email', 'Duplicate email in file')
+                continue
+            if row['zone_id'] and row['zone_id'] not in self.zone_ids:
+                self.error(row_number, 'zone_id', 'Zone not found')
+                continue
+            self.seen_emails.add(row['email'])
+            rows.append((row_number, row))
+
+        existing = self._existing_emails([row['email'] for _, row in rows])
+        valid = []
+        for row_number, row in rows:
+            if row['email'] in existing:
+                self.error(row_number, 'email', 'A customer with this email already exists')
+                continue
+            if not row['zone_id'] and row['latitude'] is not None:
+                row['zone_id'] = self.zone_index.locate(row['latitude'], row['longitude'])
+            valid.append((row_number, row))
+
+        # Reserved per chunk in the insert's transaction: other imports and
+        # customers created meanwhile count against the same limit
+        reserved = not valid or reserve_capacity(self.organization_id, 'customers', len(valid))
+        if reserved and valid:
+            db.session.execute(Customer.__table__.insert(), [row for _, row in valid])
+        elif not reserved:
+            for row_number, _ in valid:
+                self.error(row_number, None, 'Customer limit reached')
+
+        self.job.processed_rows += len(chunk)
+        if reserved:
+            self.job.imported_rows += len(valid)
+        self.job.errors = list(self.errors)
+        db.session.commit()
+        return reserved
+
+def _chunks(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def run_import(import_id, path, chunk_size=IMPORT_CHUNK_SIZE):
+    """Process a spooled upload for an existing customer_imports row"""
+    job = db.session.get(CustomerImport, import_id)
+    try:
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        job.total_rows = count_records(path, job.file_format)
+        db.session.commit()
+
+        # One limit check for the whole file instead of a COUNT per row
+        capacity = remaining_capacity(job.organization_id, 'customers')
+        if capacity is not None and job.total_rows > capacity:
+            job.status = 'failed'
+            job.error_message = (
+                f'The file has {job.total_rows} customers but the subscription allows '
+                f'{capacity} more. Please upgrade your subscription.'
+            )
+        else:
+            run = _ImportRun(job)
+            status = 'completed'
+            for chunk in _chunks(iter_records(path, job.file_format), chunk_size):
+                if not run.process(chunk):
+                    status = 'failed'
+                    job.error_message = (
+                        f'Customer limit reached after {job.imported_rows} customers were imported. '
+                        f'Please upgrade your subscription.'
+                    )
+                    break
+            job.status = status
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+
+    except Exception as e:
+        logger.error(f"Customer import {import_id} failed: {e}")
+        db.session.rollback()
+        job = db.session.get(CustomerImport, import_id)
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+    finally:
+        os.unlink(path)
+
+def _run_in_background(app, import_id, path):
+    with app.app_context():
+        run_import(import_id, path)
+
+def start_import(organization_id, stream, file_format, created_by=None):
+    """Spool the upload, record the job and process it in the background"""
+    if file_format not in IMPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+
+    path = spool_upload(stream)
+    job = CustomerImport(
+        organization_id=organization_id,
+        created_by=created_by,
+        file_format=file_format,
+        status='pending'
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    _executor.submit(_run_in_background, current_app._get_current_object(), job.id, path)
+    return job
+
+def serialize_import(job, include_errors=True):
+    data = {
+        'id': job.id,
+        'status': job.status,
+        'format': job.file_format,
+        'total_rows': job.total_rows,
+        'processed_rows': job.processed_rows,
+        'imported_rows': job.imported_rows,
+        'failed_rows': job.failed_rows,
+        'error_message': job.error_message,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+    if include_errors:
+        data['errors'] = job.errors or []
+        data['errors_truncated'] = job.failed_rows > len(job.errors or [])
+    return data
@@ -3,11 +3,13 @@ Custom Decorators for Authentication and Authorization
 """
 
 from functools import wraps
-from flask import request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from models import User, AuditLog
+from flask import g, request, jsonify
+from flask_jwt_extended import jwt_required
+from utils.principal import get_current_principal
+from utils.audit_sink import audit_sink
 from datetime import datetime
 import json
+import uuid
 
 def audit_log(action, resource_type):
     """Decorator to log user actions"""
@@ -15,44 +17,42 @@ def audit_log(action, resource_type):
         @wraps(f)
         def decorated_function(*args, **kwargs):
             try:
-                # Execute the function first
+                # Execute the function first; flush-time history rows pick up this action
+                g._audit_action = (action, resource_type)
                 result = f(*args, **kwargs)
                 
-                # Log the action
-                user_id = get_jwt_identity()
-                if user_id:
-                    user = User.query.get(user_id)
-                    if user and user.organization_id:
-                        audit_entry = AuditLog(
-                            id=str(uuid.uuid4()),
-                            organization_id=user.organization_id,
-                            user_id=user_id,
-                            action=action,
-                            resource_type=resource_type,
-                            ip_address=request.remote_addr,
-                            user_agent=request.headers.get('User-Agent')
-                        )
-                        db.session.add(audit_entry)
-                        db.session.commit()
+                # Queue the action unless the handler's writes already recorded it
+                # for this resource type
+                principal = get_current_principal()
+                audited = g.get('_audited_resource_types', ())
+                if principal and principal.organization_id and resource_type not in audited:
+                    audit_sink.enqueue({
+                        'id': str(uuid.uuid4()),
+                        'organization_id': principal.organization_id,
+                        'user_id': principal.user_id,
+                        'action': action,
+                        'resource_type': resource_type,
+                        'ip_address': request.remote_addr,
+                        'user_agent': request.headers.get('User-Agent'),
+                        'created_at': datetime.utcnow()
+                    })
                 
                 return result
             except Exception as e:
                 # Log the error
-                if user_id:
-                    user = User.query.get(user_id)
-                    if user and user.organization_id:
-                        audit_entry = AuditLog(
-                            id=str(uuid.uuid4()),
-                            organization_id=user.organization_id,
-                            user_id=user_id,
-                            action=f"{action}_error",
-                            resource_type=resource_type,
-                            ip_address=request.remote_addr,
-                            user_agent=request.headers.get('User-Agent'),
-                            new_values={'error': str(e)}
-                        )
-                        db.session.add(audit_entry)
-                        db.session.commit()
+                principal = get_current_principal()
+                if principal and principal.organization_id:
+                    audit_sink.enqueue({
+                        'id': str(uuid.uuid4()),
+                        'organization_id': principal.organization_id,
+                        'user_id': principal.user_id,
+                        'action': f"{action}_error",
+                        'resource_type': resource_type,
+                        'ip_address': request.remote_addr,
+                        'user_agent': request.headers.get('User-Agent'),
+                        'new_values': {'error': str(e)},
+                        'created_at': datetime.utcnow()
+                    })
                 raise e
         return decorated_function
     return decorator
@@ -62,10 +62,9 @@ def org_required(f):
     @wraps(f)
     @jwt_required()
     def decorated_function(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or not user.organization_id:
+        if not principal or not principal.organization_id:
             return jsonify({'error': 'User must belong to an organization'}), 403
         
         return f(*args, **kwargs)
@@ -76,10 +75,9 @@ def super_admin_required(f):
     @wraps(f)
     @jwt_required()
     def decorated_function(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or user.role != 'super_admin':
+        if not principal or principal.role != 'super_admin':
             return jsonify({'error': 'Super admin access required'}), 403
         
         return f(*args, **kwargs)
@@ -90,10 +88,9 @@ def business_manager_required(f):
     @wraps(f)
     @jwt_required()
     def decorated_function(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or user.role not in ['super_admin', 'business_manager']:
+        if not principal or principal.role not in ['super_admin', 'business_manager']:
             return jsonify({'error': 'Business manager access required'}), 403
         
         return f(*args, **kwargs)
@@ -104,10 +101,9 @@ def regional_manager_required(f):
     @wraps(f)
     @jwt_required()
     def decorated_function(*args, **kwargs):
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        principal = get_current_principal()
         
-        if not user or user.role not in ['super_admin', 'business_manager', 'regional_manager']:
+        if not principal or principal.role not in ['super_admin', 'business_manager', 'regional_manager']:
             return jsonify({'error': 'Regional manager access required'}), 403
         
         return f(*args, **kwargs)
@@ -119,19 +115,17 @@ def check_permission(permission):
         @wraps(f)
         @jwt_required()
         def decorated_function(*args, **kwargs):
-            user_id = get_jwt_identity()
-            user = User.query.get(user_id)
+            principal = get_current_principal()
             
-            if not user:
+            if not principal:
                 return jsonify({'error': 'User not found'}), 404
             
             # Super admin has all permissions
-            if user.role == 'super_admin':
+            if principal.role == 'super_admin':
                 return f(*args, **kwargs)
             
             # Check user permissions
-            user_permissions = user.permissions or {}
-            if not user_permissions.get(permission, False):
+            if not principal.has_permission(permission):
                 return jsonify({'error': f'Permission {permission} required'}), 403
             
             return f(*args, **kwargs)
@@ -0,0 +1,95 @@
+"""
+Entitlements
+Resolves an organization's status, subscription and tier limits/features
+in one joined query and caches the result in process
+"""
+
+from flask import current_app
+from models import db, Organization, Subscription, SubscriptionTier
+from utils.cache import TTLCache
+
+DEFAULT_TTL_SECONDS = 60
+
+# Per-process cache; other workers pick up changes when their entries expire
+_cache = TTLCache(ttl=DEFAULT_TTL_SECONDS)
+
+class Entitlements:
+    """What an organization is currently allowed to do"""
+
+    def __init__(self, organization_id, organization_status, enabled_features,
+                 subscription_status=None, tier_id=None, limits=None, tier_features=None):
+        self.organization_id = organization_id
+        self.organization_status = organization_status
+        self.enabled_features = enabled_features or {}
+        self.subscription_status = subscription_status
+        self.tier_id = tier_id
+        self.limits = limits or {}
+        self.tier_features = tier_features or []
+
+    @property
+    def organization_active(self):
+        return self.organization_status in ('active', 'trial')
+
+    @property
+    def subscription_active(self):
+        return self.subscription_status in ('active', 'trial')
+
+    def limit_for(self, counter):
+        """Tier limit for a usage counter; None without a tier, -1 when unlimited"""
+        return self.limits.get(counter)
+
+    def feature_enabled(self, feature_name):
+        """Check an organization-level feature flag"""
+        return bool(self.enabled_features.get(feature_name, False))
+
+def _load(organization_id):
+    row = db.session.query(
+        Organization.status,
+        Organization.enabled_features,
+        Subscription.status,
+        SubscriptionTier.id,
+        SubscriptionTier.max_customers,
+        SubscriptionTier.max_managers,
+        SubscriptionTier.max_zones,
+        SubscriptionTier.features
+    ).outerjoin(
+        Subscription, Subscription.organization_id == Organization.id
+    ).outerjoin(
+        SubscriptionTier, SubscriptionTier.id == Subscription.tier_id
+    ).filter(
+        Organization.id == organization_id
+    ).order_by(Subscription.created_at.desc()).first()
+
+    if row is None:
+        return None
+
+    (organization_status, enabled_features, subscription_status, tier_id,
+     max_customers, max_managers, max_zones, tier_features) = row
+
+    limits = {}
+    if tier_id is not None:
+        limits = {'customers': max_customers, 'managers': max_managers, 'zones': max_zones}
+
+    return Entitlements(
+        organization_id,
+        organization_status,
+        enabled_features,
+        subscription_status,
+        tier_id,
+        limits,
+        tier_features
+    )
+
+def resolve_entitlements(organization_id):
+    """Entitlements for an organization (None if it doesn't exist), cached with a TTL"""
+    entitlements = _cache.get(organization_id)
+    if entitlements is None:
+        entitlements = _load(organization_id)
+        if entitlements is not None:
+            ttl = current_app.config.get('ENTITLEMENTS_CACHE_SECONDS', DEFAULT_TTL_SECONDS)
+            _cache.set(organization_id, entitlements, ttl=ttl)
+    return entitlements
+
+def invalidate_entitlements(organization_id):
+    """Drop cached entitlements; call after committing a status, tier or feature change"""
+    _cache.invalidate(organization_id)
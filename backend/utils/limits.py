@@ -3,165 +3,187 @@ Usage Limits and Enforcement
 Handles subscription tier limits and feature access
 """
 
-from models import db, Organization, User, Customer, Zone, Pickup, Payment
+from models import db, Organization, OrganizationUsage, User, Customer, Zone, Pickup, Payment
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, select, case, update
+from utils.usage_counters import get_usage_counts, increment_usage
+from utils.entitlements import resolve_entitlements
+
+def _limit_reached(organization_id, counter):
+    """
+    Compare a maintained usage counter against the organization's tier limit.
+    Errors propagate so callers refuse the operation instead of skipping the check.
+    """
+    entitlements = resolve_entitlements(organization_id)
+    tier_limit = entitlements.limit_for(counter) if entitlements else None
+    
+    # No subscription, or an unlimited tier
+    if tier_limit is None or tier_limit == -1:
+        return False
+    
+    return get_usage_counts(organization_id)[counter] >= tier_limit
+
+def remaining_capacity(organization_id, counter):
+    """How many more of counter the tier allows; None when unlimited or without a tier"""
+    entitlements = resolve_entitlements(organization_id)
+    tier_limit = entitlements.limit_for(counter) if entitlements else None
+    if tier_limit is None or tier_limit == -1:
+        return None
+    return max(tier_limit - get_usage_counts(organization_id)[counter], 0)
+
+def reserve_capacity(organization_id, counter, amount):
+    """
+    Count amount more of counter against the tier in the caller's transaction.
+    The limit check and increment are one conditional UPDATE, so concurrent
+    reservations queue on the usage row and can't overshoot. Returns False,
+    reserving nothing, when the tier doesn't have room for all of amount.
+    """
+    entitlements = resolve_entitlements(organization_id)
+    tier_limit = entitlements.limit_for(counter) if entitlements else None
+    connection = db.session.connection()
+    if tier_limit is None or tier_limit == -1:
+        increment_usage(connection, {(organization_id, counter): amount})
+        return True
+    
+    # Reconciles the counter row on first use
+    get_usage_counts(organization_id)
+    usage = OrganizationUsage.__table__
+    column = usage.c[counter]
+    return connection.execute(
+        update(usage).where(
+            usage.c.organization_id == organization_id,
+            column + amount <= tier_limit
+        ).values({column: column + amount})
+    ).rowcount == 1
 
 def check_customer_limit(organization_id):
     """Check if organization has hit customer limit"""
-    try:
-        org = Organization.query.get(organization_id)
-        if not org:
-            return False
-        
-        # Get current subscription
-        from models import Subscription, SubscriptionTier
-        subscription = Subscription.query.filter_by(organization_id=organization_id).first()
-        if not subscription:
-            return False
-        
-        tier = SubscriptionTier.query.get(subscription.tier_id)
-        if not tier:
-            return False
-        
-        # Check if tier has unlimited customers
-        if tier.max_customers == -1:
-            return False
-        
-        # Count current customers
-        customer_count = Customer.query.filter_by(organization_id=organization_id).count()
-        
-        return customer_count >= tier.max_customers
-        
-    except Exception:
-        return False
+    return _limit_reached(organization_id, 'customers')
 
 def check_manager_limit(organization_id):
     """Check if organization has hit manager limit"""
-    try:
-        org = Organization.query.get(organization_id)
-        if not org:
-            return False
-        
-        # Get current subscription
-        from models import Subscription, SubscriptionTier
-        subscription = Subscription.query.filter_by(organization_id=organization_id).first()
-        if not subscription:
-            return False
-        
-        tier = SubscriptionTier.query.get(subscription.tier_id)
-        if not tier:
-            return False
-        
-        # Check if tier has unlimited managers
-        if tier.max_managers == -1:
-            return False
-        
-        # Count current managers (regional managers)
-        manager_count = User.query.filter_by(
-            organization_id=organization_id,
-            role='regional_manager'
-        ).count()
-        
-        return manager_count >= tier.max_managers
-        
-    except Exception:
-        return False
+    return _limit_reached(organization_id, 'managers')
 
 def check_zone_limit(organization_id):
     """Check if organization has hit zone limit"""
-    try:
-        org = Organization.query.get(organization_id)
-        if not org:
-            return False
-        
-        # Get current subscription
-        from models import Subscription, SubscriptionTier
-        subscription = Subscription.query.filter_by(organization_id=organization_id).first()
-        if not subscription:
-            return False
-        
-        tier = SubscriptionTier.query.get(subscription.tier_id)
-        if not tier:
-            return False
-        
-        # Check if tier has unlimited zones
-        if tier.max_zones == -1:
-            return False
-        
-        # Count current zones
-        zone_count = Zone.query.filter_by(organization_id=organization_id).count()
-        
-        return zone_count >= tier.max_zones
-        
-    except Exception:
-        return False
+    return _limit_reached(organization_id, 'zones')
 
 def check_feature_enabled(organization_id, feature_name):
     """Check if a specific feature is enabled for the organization"""
     try:
-        org = Organization.query.get(organization_id)
-        if not org:
+        entitlements = resolve_entitlements(organization_id)
+        if not entitlements:
             return False
         
-        enabled_features = org.enabled_features or {}
-        return enabled_features.get(feature_name, False)
+        return entitlements.feature_enabled(feature_name)
         
     except Exception:
         return False
 
-def get_usage_stats(organization_id):
-    """Get comprehensive usage statistics for an organization"""
-    try:
-        # Customer count
-        customer_count = Customer.query.filter_by(organization_id=organization_id).count()
-        
-        # Manager count (regional managers)
-        manager_count = User.query.filter_by(
-            organization_id=organization_id,
-            role='regional_manager'
-        ).count()
-        
-        # Zone count
-        zone_count = Zone.query.filter_by(organization_id=organization_id).count()
-        
-        # Pickups this month
-        start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        pickups_this_month = Pickup.query.filter(
-            Pickup.organization_id == organization_id,
-            Pickup.created_at >= start_of_month
-        ).count()
-        
-        # Revenue this month
-        revenue_this_month = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.organization_id == organization_id,
-            Payment.status == 'completed',
-            Payment.created_at >= start_of_month
-        ).scalar() or 0
-        
-        return {
-            'customers': customer_count,
-            'managers': manager_count,
-            'zones': zone_count,
+def _empty_usage_stats():
+    return {
+        'customers': 0,
+        'managers': 0,
+        'zones': 0,
+        'pickups_this_month': 0,
+        'revenue_this_month': 0.0
+    }
+
+def _live_count(counter):
+    """Correlated COUNT for one counter of the outer query's Organization"""
+    if counter == 'customers':
+        return select(func.count(Customer.id)).where(
+            Customer.organization_id == Organization.id
+        ).scalar_subquery()
+    if counter == 'managers':
+        return select(func.count(User.id)).where(
+            User.organization_id == Organization.id,
+            User.role == 'regional_manager'
+        ).scalar_subquery()
+    return select(func.count(Zone.id)).where(
+        Zone.organization_id == Organization.id
+    ).scalar_subquery()
+
+def usage_count_column(counter):
+    """
+    An organization's current count for counter, for queries over
+    Organization outer-joined to OrganizationUsage. Counters that were never
+    reconciled may hold only deltas, so those organizations are counted live.
+    """
+    return case(
+        (OrganizationUsage.reconciled_at.isnot(None), getattr(OrganizationUsage, counter)),
+        else_=_live_count(counter)
+    )
+
+def get_usage_stats_batch(organization_ids):
+    """Usage statistics for many organizations in one statement, keyed by organization id"""
+    organization_ids = list(dict.fromkeys(organization_ids))
+    if not organization_ids:
+        return {}
+    
+    start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    
+    pickups = select(
+        Pickup.organization_id,
+        func.count(Pickup.id).label('count')
+    ).where(
+        Pickup.organization_id.in_(organization_ids),
+        Pickup.created_at >= start_of_month
+    ).group_by(Pickup.organization_id).cte('pickups_this_month')
+    
+    revenue = select(
+        Payment.organization_id,
+        func.sum(Payment.amount).label('amount')
+    ).where(
+        Payment.organization_id.in_(organization_ids),
+        Payment.status == 'completed',
+        Payment.created_at >= start_of_month
+    ).group_by(Payment.organization_id).cte('revenue_this_month')
+    
+    query = select(
+        Organization.id,
+        usage_count_column('customers'),
+        usage_count_column('managers'),
+        usage_count_column('zones'),
+        func.coalesce(pickups.c.count, 0),
+        func.coalesce(revenue.c.amount, 0)
+    ).select_from(Organization).outerjoin(
+        OrganizationUsage, OrganizationUsage.organization_id == Organization.id
+    ).outerjoin(
+        pickups, pickups.c.organization_id == Organization.id
+    ).outerjoin(
+        revenue, revenue.c.organization_id == Organization.id
+    ).where(Organization.id.in_(organization_ids))
+    
+    return {
+        organization_id: {
+            'customers': customers,
+            'managers': managers,
+            'zones': zones,
             'pickups_this_month': pickups_this_month,
             'revenue_this_month': float(revenue_this_month)
         }
+        for organization_id, customers, managers, zones, pickups_this_month, revenue_this_month
+        in db.session.execute(query)
+    }
+
+def get_usage_stats(organization_id):
+    """Get comprehensive usage statistics for an organization"""
+    try:
+        stats = get_usage_stats_batch([organization_id])
+        return stats.get(organization_id) or _empty_usage_stats()
         
     except Exception as e:
-        return {
-            'customers': 0,
-            'managers': 0,
-            'zones': 0,
-            'pickups_this_month': 0,
-            'revenue_this_month': 0.0
-        }
+        return _empty_usage_stats()
 
 def enforce_limits_middleware(organization_id, action, resource_type):
     """Middleware to enforce subscription limits before operations"""
     try:
+        # Organization status, subscription status and tier limits in one lookup
+        entitlements = resolve_entitlements(organization_id)
+        
         # Check if organization is active
-        org = Organization.query.get(organization_id)
-        if not org or org.status not in ['active', 'trial']:
+        if not entitlements or not entitlements.organization_active:
             return {
                 'allowed': False,
                 'error': 'Organization is not active',
@@ -169,9 +191,7 @@ def enforce_limits_middleware(organization_id, action, resource_type):
             }
         
         # Check subscription status
-        from models import Subscription
-        subscription = Subscription.query.filter_by(organization_id=organization_id).first()
-        if not subscription or subscription.status not in ['active', 'trial']:
+        if not entitlements.subscription_active:
             return {
                 'allowed': False,
                 'error': 'No active subscription',
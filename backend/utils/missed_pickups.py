@@ -0,0 +1,155 @@
+"""
+Missed Pickups
+Marks scheduled pickups whose time plus a grace window has passed as
+missed, in chunked UPDATE ... RETURNING statements, and notifies the
+affected customers and managers with multi-row inserts
+"""
+
+from sqlalchemy import select, update, and_, or_
+from models import db, Pickup, Zone, User, Notification
+from utils.pickup_changes import pickups_changed
+from collections import defaultdict
+from datetime import datetime, timedelta
+import uuid
+
+DEFAULT_GRACE = timedelta(hours=2)
+MISSED_CHUNK_SIZE = 5000
+
+def _overdue(cutoff):
+    """Scheduled pickups due before cutoff; shaped to use the open-schedule index"""
+    return and_(
+        Pickup.status == 'scheduled',
+        or_(
+            Pickup.scheduled_date < cutoff.date(),
+            and_(Pickup.scheduled_date == cutoff.date(), Pickup.scheduled_time < cutoff.time())
+        )
+    )
+
+def _mark_chunk(cutoff, now, chunk_size):
+    """Mark up to chunk_size overdue pickups missed; returns the rows changed"""
+    pickups = Pickup.__table__
+    # Rows locked by in-flight status updates are skipped and picked up next run
+    candidates = select(pickups.c.id).where(_overdue(cutoff)).limit(chunk_size).with_for_update(skip_locked=True)
+    statement = update(pickups).where(
+        pickups.c.id.in_(candidates.scalar_subquery()),
+        pickups.c.status == 'scheduled'
+    ).values(status='missed', updated_at=now).returning(
+        pickups.c.id,
+        pickups.c.organization_id,
+        pickups.c.customer_id,
+        pickups.c.zone_id,
+        pickups.c.scheduled_date,
+        pickups.c.scheduled_time
+    )
+    return db.session.execute(statement, execution_options={'synchronize_session': False}).all()
+
+def _notification(organization_id, title, message, now, user_id=None, customer_id=None, priority='normal'):
+    return {
+        'id': str(uuid.uuid4()),
+        'organization_id': organization_id,
+        'user_id': user_id,
+        'customer_id': customer_id,
+        'title': title,
+        'message': message,
+        'type': 'pickup_missed',
+        'priority': priority,
+        'is_read': False,
+        'created_at': now
+    }
+
+def _customer_notifications(rows, now):
+    return [
+        _notification(
+            row.organization_id,
+            'Pickup missed',
+            f"Your pickup scheduled for {row.scheduled_date.isoformat()} at "
+            f"{row.scheduled_time.strftime('%H:%M')} was missed. We will contact you to reschedule.",
+            now,
+            customer_id=row.customer_id
+        )
+        for row in rows
+    ]
+
+def _manager_recipients(missed_by_zone):
+    """{user_id: (organization_id, missed count)}: zone managers, else business managers"""
+    zone_ids = [zone_id for _, zone_id in missed_by_zone if zone_id]
+    zone_managers = dict(db.session.execute(
+        select(Zone.id, Zone.regional_manager_id).where(
+            Zone.id.in_(zone_ids),
+            Zone.regional_manager_id.isnot(None)
+        )
+    ).all()) if zone_ids else {}
+
+    business_managers = defaultdict(list)
+    organization_ids = {organization_id for organization_id, _ in missed_by_zone}
+    for user_id, organization_id in db.session.execute(
+        select(User.id, User.organization_id).where(
+            User.organization_id.in_(organization_ids),
+            User.role == 'business_manager',
+            User.is_active.is_(True)
+        )
+    ):
+        business_managers[organization_id].append(user_id)
+
+    recipients = {}
+    for (organization_id, zone_id), count in missed_by_zone.items():
+        managers = [zone_managers[zone_id]] if zone_id in zone_managers else business_managers[organization_id]
+        for user_id in managers:
+            _, total = recipients.get(user_id, (organization_id, 0))
+            recipients[user_id] = (organization_id, total + count)
+    return recipients
+
+def mark_missed_pickups(grace=DEFAULT_GRACE, now=None, chunk_size=MISSED_CHUNK_SIZE, notify=True):
+    """
+    Mark every scheduled pickup more than grace past its scheduled date and
+    time as missed. Each chunk's UPDATE and customer notifications commit
+    together; managers get one summary notification per run. Returns
+    {'missed', 'organizations', 'customer_notifications', 'manager_notifications'}.
+    """
+    now = now or datetime.utcnow()
+    cutoff = now - grace
+    notifications = Notification.__table__
+    missed_by_zone = defaultdict(int)
+    summary = {'missed': 0, 'organizations': 0, 'customer_notifications': 0, 'manager_notifications': 0}
+
+    while True:
+        rows = _mark_chunk(cutoff, now, chunk_size)
+        if not rows:
+            break
+
+        if notify:
+            customer_rows = _customer_notifications(rows, now)
+            db.session.execute(notifications.insert(), customer_rows)
+            summary['customer_notifications'] += len(customer_rows)
+        db.session.commit()
+
+        for organization_id in {row.organization_id for row in rows}:
+            pickups_changed(organization_id)
+        for row in rows:
+            missed_by_zone[(row.organization_id, row.zone_id)] += 1
+        summary['missed'] += len(rows)
+
+        if len(rows) < chunk_size:
+            break
+
+    summary['organizations'] = len({organization_id for organization_id, _ in missed_by_zone})
+
+    if notify and missed_by_zone:
+        manager_rows = [
+            _notification(
+                organization_id,
+                'Missed pickups',
+                f"{count} pickup{'s' if count != 1 else ''} passed their scheduled time without being completed "
+                f"and were marked as missed.",
+                now,
+                user_id=user_id,
+                priority='high'
+            )
+            for user_id, (organization_id, count) in sorted(_manager_recipients(missed_by_zone).items())
+        ]
+        if manager_rows:
+            db.session.execute(notifications.insert(), manager_rows)
+            db.session.commit()
+        summary['manager_notifications'] = len(manager_rows)
+
+    return summary
@@ -0,0 +1,146 @@
+"""
+Organization Lifecycle
+Bulk status changes (suspend/activate) applied with set-based UPDATEs in
+chunks, each chunk committed together with its audit rows
+"""
+
+from flask import request, has_request_context
+from sqlalchemy import select, update
+from models import db, Organization, Subscription
+from utils.audit_sink import insert_audit_rows
+from utils.entitlements import invalidate_entitlements
+from datetime import datetime
+import uuid
+
+BULK_CHUNK_SIZE = 500
+
+STATUS_ACTIONS = {
+    'suspended': 'organization_suspension',
+    'active': 'organization_activation'
+}
+
+# Values a filter may select on; anything else is rejected so a filter can
+# never silently widen to every organization
+FILTER_VALUES = {
+    'status': ('active', 'suspended', 'trial', 'expired'),
+    'subscription_status': ('trial', 'active', 'suspended', 'cancelled', 'expired')
+}
+
+def validate_target(organization_ids, filters):
+    """Error message for a bad organization_ids/filter selection, or None"""
+    if (organization_ids is None) == (filters is None):
+        return 'Provide either organization_ids or filter'
+    if organization_ids is not None:
+        if (not isinstance(organization_ids, list) or not organization_ids
+                or not all(isinstance(org_id, str) and org_id for org_id in organization_ids)):
+            return 'organization_ids must be a non-empty list of ids'
+        return None
+    if not isinstance(filters, dict) or not filters:
+        return 'filter must be a non-empty object'
+    for name, value in filters.items():
+        if name not in FILTER_VALUES:
+            return f"filter supports {' and '.join(FILTER_VALUES)}"
+        if value not in FILTER_VALUES[name]:
+            return f"filter {name} must be one of: {', '.join(FILTER_VALUES[name])}"
+    return None
+
+def _filtered_ids(filters, after_id, limit):
+    """Next chunk of organization ids matching filters, in id order"""
+    query = select(Organization.id)
+    if 'status' in filters:
+        query = query.where(Organization.status == filters['status'])
+    if 'subscription_status' in filters:
+        query = query.where(Organization.id.in_(
+            select(Subscription.organization_id).where(
+                Subscription.status == filters['subscription_status']
+            )
+        ))
+    if after_id is not None:
+        query = query.where(Organization.id > after_id)
+    return list(db.session.scalars(query.order_by(Organization.id).limit(limit)))
+
+def _id_chunks(organization_ids, filters, chunk_size):
+    if organization_ids is not None:
+        organization_ids = list(dict.fromkeys(organization_ids))
+        for offset in range(0, len(organization_ids), chunk_size):
+            yield organization_ids[offset:offset + chunk_size]
+        return
+
+    after_id = None
+    while True:
+        chunk = _filtered_ids(filters, after_id, chunk_size)
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1]
+
+def _audit_row(organization_id, actor_id, action, old_status, new_status, now):
+    row = {
+        'id': str(uuid.uuid4()),
+        'organization_id': organization_id,
+        'user_id': actor_id,
+        'action': action,
+        'resource_type': 'organization',
+        'resource_id': organization_id,
+        'old_values': {'status': old_status},
+        'new_values': {'status': new_status},
+        'ip_address': None,
+        'user_agent': None,
+        'created_at': now
+    }
+    if has_request_context():
+        row['ip_address'] = request.remote_addr
+        row['user_agent'] = request.headers.get('User-Agent')
+    return row
+
+def bulk_set_organization_status(status, organization_ids=None, filters=None, actor_id=None,
+                                 chunk_size=BULK_CHUNK_SIZE):
+    """
+    Set status on the given organizations, or on every organization matching
+    filters (status, subscription_status). Returns per-organization results:
+    [{'id', 'previous_status', 'status', 'result'}] where result is
+    'updated', 'unchanged' or 'not_found'.
+    """
+    if status not in STATUS_ACTIONS:
+        raise ValueError(f"status must be one of: {', '.join(STATUS_ACTIONS)}")
+    error = validate_target(organization_ids, filters)
+    if error:
+        raise ValueError(error)
+
+    action = STATUS_ACTIONS[status]
+    results = []
+
+    for chunk in _id_chunks(organization_ids, filters, chunk_size):
+        current = dict(db.session.execute(
+            select(Organization.id, Organization.status).where(Organization.id.in_(chunk))
+        ).all())
+        changed = [org_id for org_id in chunk if org_id in current and current[org_id] != status]
+
+        now = datetime.utcnow()
+        if changed:
+            db.session.execute(
+                update(Organization).where(
+                    Organization.id.in_(changed),
+                    Organization.status != status
+                ).values(status=status, updated_at=now),
+                execution_options={'synchronize_session': False}
+            )
+            insert_audit_rows(db.session.connection(), [
+                _audit_row(org_id, actor_id, action, current[org_id], status, now)
+                for org_id in changed
+            ])
+        db.session.commit()
+
+        for org_id in changed:
+            invalidate_entitlements(org_id)
+
+        changed_ids = set(changed)
+        for org_id in chunk:
+            if org_id not in current:
+                results.append({'id': org_id, 'previous_status': None, 'status': None, 'result': 'not_found'})
+            elif org_id in changed_ids:
+                results.append({'id': org_id, 'previous_status': current[org_id], 'status': status, 'result': 'updated'})
+            else:
+                results.append({'id': org_id, 'previous_status': status, 'status': status, 'result': 'unchanged'})
+
+    return results
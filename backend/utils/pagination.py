@@ -0,0 +1,91 @@
+"""
+Keyset Pagination
+Cursor-based paging over (sort value, id) so deep pages cost the same as
+the first one and no COUNT(*) is needed unless requested
+"""
+
+from flask import request
+from sqlalchemy import tuple_
+from datetime import datetime
+import base64
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor can't be decoded"""
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+def encode_cursor(sort_value, row_id):
+    """Opaque token for the position after (sort_value, row_id)"""
+    payload = json.dumps([_encode_value(sort_value), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    """Inverse of encode_cursor"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return _decode_value(sort_value), row_id
+    except Exception:
+        raise InvalidCursor('Invalid pagination cursor')
+
+def get_page_args(default_limit=DEFAULT_LIMIT):
+    """Read cursor, limit and include_total from the query string"""
+    limit = request.args.get('limit', default_limit, type=int)
+    include_total = request.args.get('include_total', 'false').lower() in ('1', 'true', 'yes')
+    return request.args.get('cursor'), min(max(limit, 1), MAX_LIMIT), include_total
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, limit=DEFAULT_LIMIT,
+                    include_total=False, descending=True, key=None):
+    """
+    One page of query ordered by (sort_column, id_column), newest/largest first
+    unless descending is False. sort_column may be any non-null expression;
+    key(item) must then return the item's (sort value, id) for the cursor.
+    Returns (items, pagination) where pagination carries next_cursor (None on
+    the last page) and, only when include_total is set, the filtered total.
+    """
+    total = query.order_by(None).count() if include_total else None
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        position = tuple_(sort_column, id_column)
+        after = tuple_(sort_value, row_id)
+        query = query.filter(position < after if descending else position > after)
+
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    # One extra row tells us whether another page exists without counting
+    items = query.limit(limit + 1).all()
+    has_more = len(items) > limit
+    items = items[:limit]
+
+    next_cursor = None
+    if has_more:
+        last = items[-1]
+        if key is None:
+            next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+        else:
+            next_cursor = encode_cursor(*key(last))
+
+    pagination = {
+        'limit': limit,
+        'next_cursor': next_cursor,
+        'has_more': has_more
+    }
+    if include_total:
+        pagination['total'] = total
+    return items, pagination
@@ -0,0 +1,82 @@
+"""
+Pickup Calendar
+Pickup counts per day, zone, status and type from one GROUP BY, cached
+briefly per organization and invalidated when its pickups are written
+"""
+
+from flask import current_app
+from sqlalchemy import select, func
+from models import db, Pickup
+from utils.cache import TTLCache
+from collections import defaultdict
+import threading
+
+DEFAULT_TTL_SECONDS = 30
+MAX_RANGE_DAYS = 92
+
+_cache = TTLCache(ttl=DEFAULT_TTL_SECONDS)
+
+# Bumping an organization's generation orphans every cached range for it
+_generations = defaultdict(int)
+_generations_lock = threading.Lock()
+
+def invalidate_pickup_calendar(organization_id):
+    """Drop an organization's cached calendars; call after committing pickup writes"""
+    with _generations_lock:
+        _generations[organization_id] += 1
+
+def _query_counts(organization_id, start, end, zone_id):
+    query = select(
+        Pickup.scheduled_date,
+        Pickup.zone_id,
+        Pickup.status,
+        Pickup.pickup_type,
+        func.count().label('count')
+    ).where(
+        Pickup.organization_id == organization_id,
+        Pickup.scheduled_date >= start,
+        Pickup.scheduled_date <= end
+    )
+    if zone_id:
+        query = query.where(Pickup.zone_id == zone_id)
+    query = query.group_by(
+        Pickup.scheduled_date, Pickup.zone_id, Pickup.status, Pickup.pickup_type
+    ).order_by(Pickup.scheduled_date, Pickup.zone_id, Pickup.status, Pickup.pickup_type)
+    return db.session.execute(query).all()
+
+def _build_calendar(rows):
+    days = {}
+    for scheduled_date, zone_id, status, pickup_type, count in rows:
+        day = days.setdefault(scheduled_date.isoformat(), {'total': 0, 'zones': {}})
+        zone = day['zones'].setdefault(zone_id or 'unassigned', {
+            'total': 0,
+            'by_status': defaultdict(int),
+            'by_type': defaultdict(int)
+        })
+        day['total'] += count
+        zone['total'] += count
+        zone['by_status'][status] += count
+        zone['by_type'][pickup_type] += count
+
+    for day in days.values():
+        for zone in day['zones'].values():
+            zone['by_status'] = dict(zone['by_status'])
+            zone['by_type'] = dict(zone['by_type'])
+    return days
+
+def get_pickup_calendar(organization_id, start, end, zone_id=None):
+    """
+    {'YYYY-MM-DD': {'total', 'zones': {zone_id: {'total', 'by_status',
+    'by_type'}}}} for pickups scheduled in [start, end]; days without
+    pickups are omitted and zoneless pickups are keyed 'unassigned'
+    """
+    with _generations_lock:
+        generation = _generations[organization_id]
+    key = (organization_id, generation, start, end, zone_id)
+
+    calendar = _cache.get(key)
+    if calendar is None:
+        calendar = _build_calendar(_query_counts(organization_id, start, end, zone_id))
+        ttl = current_app.config.get('PICKUP_CALENDAR_CACHE_SECONDS', DEFAULT_TTL_SECONDS)
+        _cache.set(key, calendar, ttl=ttl)
+    return calendar
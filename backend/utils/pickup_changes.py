@@ -0,0 +1,35 @@
+"""
+Pickup Changes
+Single place that drops pickup-derived caches when an organization's
+pickups are written, whether through the ORM or bulk Core statements
+"""
+
+from sqlalchemy import event
+from models import db, Pickup
+from utils.pickup_calendar import invalidate_pickup_calendar
+from utils.upcoming_pickups import upcoming_pickups_cache
+
+def pickups_changed(organization_id):
+    """Invalidate an organization's pickup caches; call after committing bulk writes"""
+    invalidate_pickup_calendar(organization_id)
+    upcoming_pickups_cache.invalidate(organization_id)
+
+def _after_flush(session, flush_context):
+    changed = session.info.setdefault('pickup_changes', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Pickup) and obj.organization_id:
+            changed.add(obj.organization_id)
+
+def _after_commit(session):
+    for organization_id in session.info.pop('pickup_changes', ()):
+        pickups_changed(organization_id)
+
+def _after_rollback(session):
+    session.info.pop('pickup_changes', None)
+
+def register_pickup_change_hooks():
+    """Invalidate pickup caches when ORM pickup writes are committed"""
+    for name, listener in (('after_flush', _after_flush), ('after_commit', _after_commit),
+                           ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
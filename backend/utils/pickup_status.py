@@ -0,0 +1,198 @@
+"""
+Pickup Status
+Batch status updates for a driver's run: one ownership query, one
+executemany UPDATE and one multi-row audit insert in a single transaction
+"""
+
+from flask import request, has_request_context
+from sqlalchemy import select, update, bindparam
+from models import db, Pickup, Zone
+from utils.audit_sink import insert_audit_rows
+from utils.audit_history import mark_audited
+from utils.pickup_changes import pickups_changed
+from utils.slot_capacity import reserve_slot, release_slots, SlotFullError
+from datetime import datetime, timezone
+import uuid
+
+PICKUP_STATUSES = ('scheduled', 'in_progress', 'completed', 'cancelled', 'missed')
+MAX_BATCH_ITEMS = 500
+AUDIT_ACTION = 'pickup_status_update'
+
+def _parse_timestamp(value):
+    """ISO 8601 timestamp as naive UTC, matching the stored columns"""
+    timestamp = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+def _validate(item, seen):
+    """(change, error) for one request item"""
+    if not isinstance(item, dict):
+        return None, 'item must be an object'
+    pickup_id = item.get('pickup_id')
+    if not pickup_id or not isinstance(pickup_id, str):
+        return None, 'pickup_id is required'
+    if pickup_id in seen:
+        return None, 'duplicate pickup_id'
+    seen.add(pickup_id)
+    if item.get('status') not in PICKUP_STATUSES:
+        return None, f"status must be one of: {', '.join(PICKUP_STATUSES)}"
+
+    timestamp = None
+    if item.get('timestamp'):
+        try:
+            timestamp = _parse_timestamp(item['timestamp'])
+        except (TypeError, ValueError, AttributeError):
+            return None, 'timestamp must be ISO 8601'
+
+    return {
+        'pickup_id': pickup_id,
+        'status': item['status'],
+        'timestamp': timestamp,
+        'notes': item.get('notes')
+    }, None
+
+def _audit_row(organization_id, actor_id, pickup_id, old_values, new_values, now):
+    row = {
+        'id': str(uuid.uuid4()),
+        'organization_id': organization_id,
+        'user_id': actor_id,
+        'action': AUDIT_ACTION,
+        'resource_type': 'pickup',
+        'resource_id': pickup_id,
+        'old_values': old_values,
+        'new_values': new_values,
+        'ip_address': None,
+        'user_agent': None,
+        'created_at': now
+    }
+    if has_request_context():
+        row['ip_address'] = request.remote_addr
+        row['user_agent'] = request.headers.get('User-Agent')
+    return row
+
+def _serialize(values):
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in values.items()}
+
+def _result(change):
+    result = {'pickup_id': change['pickup_id'], 'result': change['result']}
+    if change['result'] in ('invalid', 'slot_full'):
+        result['error'] = change['error']
+    elif change['result'] != 'not_found':
+        result['status'] = change['status']
+        actual_pickup_time = change['actual_pickup_time']
+        result['actual_pickup_time'] = actual_pickup_time.isoformat() if actual_pickup_time else None
+    return result
+
+def apply_pickup_status_updates(organization_id, items, actor_id=None):
+    """
+    Apply [{'pickup_id', 'status', 'timestamp'?, 'notes'?}] to the
+    organization's pickups. A completed item records timestamp (or now) as
+    actual_pickup_time. Commits once and returns per-item results in request
+    order: {'pickup_id', 'result', ...} where result is 'updated',
+    'unchanged', 'not_found', 'invalid' or 'slot_full' (with 'error'), the
+    last when a cancelled pickup's zone slot was taken in the meantime.
+    """
+    results = []
+    changes = []
+    seen = set()
+    for item in items:
+        change, error = _validate(item, seen)
+        if error:
+            pickup_id = item.get('pickup_id') if isinstance(item, dict) else None
+            results.append({'pickup_id': pickup_id, 'result': 'invalid', 'error': error})
+        else:
+            results.append(change)
+            changes.append(change)
+
+    current, zones = {}, {}
+    if changes:
+        rows = db.session.execute(
+            select(
+                Pickup.id, Pickup.status, Pickup.actual_pickup_time, Pickup.notes,
+                Pickup.zone_id, Pickup.scheduled_date, Pickup.scheduled_time, Pickup.slot_reserved
+            ).where(
+                Pickup.organization_id == organization_id,
+                Pickup.id.in_([change['pickup_id'] for change in changes])
+            )
+        ).all()
+        current = {row.id: row for row in rows}
+        zone_ids = {row.zone_id for row in rows if row.zone_id}
+        if zone_ids:
+            zones = {zone.id: zone for zone in Zone.query.filter(Zone.id.in_(zone_ids))}
+
+    now = datetime.utcnow()
+    updates, audit_rows, released = [], [], []
+    for change in changes:
+        row = current.get(change['pickup_id'])
+        if row is None:
+            change['result'] = 'not_found'
+            continue
+
+        new_values = {'status': change['status'], 'actual_pickup_time': row.actual_pickup_time, 'notes': row.notes}
+        if change['status'] == 'completed':
+            new_values['actual_pickup_time'] = change['timestamp'] or row.actual_pickup_time or now
+        if change['notes'] is not None:
+            new_values['notes'] = change['notes']
+
+        old_values = {key: getattr(row, key) for key in new_values}
+        changed = {key for key in new_values if new_values[key] != old_values[key]}
+        change['actual_pickup_time'] = new_values['actual_pickup_time']
+        if not changed:
+            change['result'] = 'unchanged'
+            continue
+
+        # Cancelling gives the zone slot back; leaving cancelled takes it again
+        slot_reserved = row.slot_reserved
+        zone = zones.get(row.zone_id)
+        if change['status'] == 'cancelled' and slot_reserved and zone:
+            released.append(row)
+            slot_reserved = False
+        elif (row.status == 'cancelled' and change['status'] != 'cancelled' and not slot_reserved
+                and zone and zone.slot_capacity is not None):
+            try:
+                reserve_slot(zone, row.scheduled_date, row.scheduled_time)
+            except (SlotFullError, ValueError) as e:
+                change['result'] = 'slot_full'
+                change['error'] = str(e)
+                continue
+            slot_reserved = True
+
+        change['result'] = 'updated'
+        updates.append({
+            'b_id': row.id,
+            'b_updated_at': now,
+            'b_slot_reserved': slot_reserved,
+            **{f'b_{key}': value for key, value in new_values.items()}
+        })
+        audit_rows.append(_audit_row(
+            organization_id, actor_id, row.id,
+            _serialize({key: old_values[key] for key in changed}),
+            _serialize({key: new_values[key] for key in changed}),
+            now
+        ))
+
+    if updates:
+        pickups = Pickup.__table__
+        db.session.execute(
+            update(pickups).where(
+                pickups.c.id == bindparam('b_id'),
+                pickups.c.organization_id == organization_id
+            ).values(
+                status=bindparam('b_status'),
+                actual_pickup_time=bindparam('b_actual_pickup_time'),
+                notes=bindparam('b_notes'),
+                slot_reserved=bindparam('b_slot_reserved'),
+                updated_at=bindparam('b_updated_at')
+            ),
+            updates
+        )
+        insert_audit_rows(db.session.connection(), audit_rows)
+        if released:
+            release_slots([(zones[row.zone_id], row.scheduled_date, row.scheduled_time) for row in released])
+        mark_audited({'pickup'})
+    db.session.commit()
+    if updates:
+        pickups_changed(organization_id)
+
+    return [_result(result) for result in results]
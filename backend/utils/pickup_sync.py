@@ -0,0 +1,87 @@
+"""
+Pickup Sync
+Delta feed of pickups changed since a client's (updated_at, id) cursor, for
+driver apps that keep a local copy of their zone's schedule
+"""
+
+from sqlalchemy import select, tuple_
+from models import db, Pickup
+from utils.pagination import encode_cursor, decode_cursor
+from datetime import date, datetime, timedelta, timezone
+
+DEFAULT_SYNC_LIMIT = 500
+MAX_SYNC_LIMIT = 2000
+
+# Rows updated this recently may still have slower transactions committing
+# behind them, so the cursor never moves past now - SYNC_SAFETY_LAG. Rows in
+# that window are sent again on the next poll; clients upsert by id.
+SYNC_SAFETY_LAG = timedelta(seconds=10)
+
+# Pickups scheduled further back than this are no longer synced
+SYNC_LOOKBACK_DAYS = 7
+
+SYNC_COLUMNS = (
+    'id', 'customer_id', 'zone_id', 'scheduled_date', 'scheduled_time', 'pickup_type',
+    'status', 'actual_pickup_time', 'notes', 'updated_at'
+)
+
+def _compact(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def _naive_utc(value):
+    """Timestamps as naive UTC; timestamptz columns come back aware on PostgreSQL"""
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def next_sync_position(position, last_row, has_more, now):
+    """
+    Cursor position after a page: the last row sent, held back to
+    now - SYNC_SAFETY_LAG once the client has caught up
+    """
+    next_position = position
+    if last_row is not None:
+        next_position = (_naive_utc(last_row.updated_at), last_row.id)
+    if not has_more:
+        horizon = (now - SYNC_SAFETY_LAG, '')
+        if next_position is None or next_position > horizon:
+            next_position = max(position, horizon) if position else horizon
+    return next_position
+
+def sync_pickups(organization_id, zone_ids=None, cursor=None, limit=DEFAULT_SYNC_LIMIT):
+    """
+    Pickups changed after cursor (oldest first), restricted to zone_ids when
+    given. Returns {'columns', 'rows', 'next_cursor', 'has_more'}; rows are
+    value arrays in column order. Raises InvalidCursor for a bad cursor.
+    """
+    now = datetime.utcnow()
+    query = select(*[Pickup.__table__.c[name] for name in SYNC_COLUMNS]).where(
+        Pickup.organization_id == organization_id,
+        Pickup.updated_at.isnot(None),
+        Pickup.scheduled_date >= date.today() - timedelta(days=SYNC_LOOKBACK_DAYS)
+    )
+    if zone_ids is not None:
+        query = query.where(Pickup.zone_id.in_(zone_ids))
+
+    position = None
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        position = (_naive_utc(sort_value), row_id)
+        query = query.where(tuple_(Pickup.updated_at, Pickup.id) > tuple_(*position))
+
+    rows = db.session.execute(
+        query.order_by(Pickup.updated_at.asc(), Pickup.id.asc()).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_position = next_sync_position(position, rows[-1] if rows else None, has_more, now)
+
+    return {
+        'columns': list(SYNC_COLUMNS),
+        'rows': [[_compact(value) for value in row] for row in rows],
+        'next_cursor': encode_cursor(*next_position),
+        'has_more': has_more
+    }
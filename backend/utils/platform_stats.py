@@ -0,0 +1,102 @@
+"""
+Platform Stats
+Platform-wide organization, user and subscription totals for the admin
+dashboard, computed with GROUP BY queries, stored as a daily snapshot and
+served from memory
+"""
+
+from models import db, Organization, User, Subscription, PlatformStatsDaily
+from utils.cache import TTLCache
+from utils.upserts import upsert_replace
+from datetime import datetime, timedelta
+
+CACHE_TTL_SECONDS = 60
+
+# Recompute on read if the stored snapshot is older than this
+MAX_SNAPSHOT_AGE = timedelta(minutes=15)
+
+_cache = TTLCache(ttl=CACHE_TTL_SECONDS, max_entries=1)
+
+_SNAPSHOT_KEY = 'snapshot'
+
+STAT_COLUMNS = (
+    'organizations_total', 'organizations_active', 'organizations_trial', 'organizations_suspended',
+    'users_total', 'users_business_managers', 'users_regional_managers', 'users_customers',
+    'subscriptions_total', 'subscriptions_active', 'subscriptions_trial'
+)
+
+def _counts_by(column):
+    """({value: count}, total) for one column"""
+    counts = dict(
+        db.session.query(column, db.func.count()).group_by(column).all()
+    )
+    return counts, sum(counts.values())
+
+def compute_platform_stats():
+    """Count organizations, users and subscriptions with one GROUP BY each"""
+    organizations, total_organizations = _counts_by(Organization.status)
+    users, total_users = _counts_by(User.role)
+    subscriptions, total_subscriptions = _counts_by(Subscription.status)
+
+    return {
+        'organizations_total': total_organizations,
+        'organizations_active': organizations.get('active', 0),
+        'organizations_trial': organizations.get('trial', 0),
+        'organizations_suspended': organizations.get('suspended', 0),
+        'users_total': total_users,
+        'users_business_managers': users.get('business_manager', 0),
+        'users_regional_managers': users.get('regional_manager', 0),
+        'users_customers': users.get('customer', 0),
+        'subscriptions_total': total_subscriptions,
+        'subscriptions_active': subscriptions.get('active', 0),
+        'subscriptions_trial': subscriptions.get('trial', 0)
+    }
+
+def _to_snapshot(row):
+    return {
+        'stats': {name: getattr(row, name) for name in STAT_COLUMNS},
+        'stat_date': row.stat_date,
+        'computed_at': row.computed_at
+    }
+
+def refresh_platform_stats():
+    """Recompute the stats, store them as today's daily row and cache them"""
+    now = datetime.utcnow()
+    stats = compute_platform_stats()
+    # Workers refreshing at the same moment both write; the last one wins
+    upsert_replace(
+        db.session.connection(), PlatformStatsDaily.__table__, ('stat_date',),
+        [{'stat_date': now.date(), 'computed_at': now, **stats}],
+        ('computed_at',) + STAT_COLUMNS
+    )
+    db.session.commit()
+
+    snapshot = {'stats': stats, 'stat_date': now.date(), 'computed_at': now}
+    _cache.set(_SNAPSHOT_KEY, snapshot)
+    return snapshot
+
+def get_platform_stats():
+    """
+    Latest stats snapshot as {'stats', 'stat_date', 'computed_at'}.
+    Served from memory, then from the newest daily row; recomputed only when
+    that row is missing or older than MAX_SNAPSHOT_AGE.
+    """
+    snapshot = _cache.get(_SNAPSHOT_KEY)
+    if snapshot is not None:
+        return snapshot
+
+    row = PlatformStatsDaily.query.order_by(PlatformStatsDaily.stat_date.desc()).first()
+    if row is None or datetime.utcnow() - row.computed_at > MAX_SNAPSHOT_AGE:
+        return refresh_platform_stats()
+
+    snapshot = _to_snapshot(row)
+    _cache.set(_SNAPSHOT_KEY, snapshot)
+    return snapshot
+
+def get_platform_stats_history(days=30):
+    """Daily stats rows for the last `days` days, oldest first"""
+    start_date = datetime.utcnow().date() - timedelta(days=days - 1)
+    rows = PlatformStatsDaily.query.filter(
+        PlatformStatsDaily.stat_date >= start_date
+    ).order_by(PlatformStatsDaily.stat_date).all()
+    return [_to_snapshot(row) for row in rows]
@@ -0,0 +1,97 @@
+"""
+Request Principal
+Resolves the authenticated user once per request and shares it across
+decorators and route handlers
+"""
+
+from flask import g, has_request_context
+from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from models import User
+
+class Principal:
+    """Authenticated user context for the current request"""
+
+    def __init__(self, user_id, role, organization_id, permissions=None, permissions_version=None, user=None):
+        self.user_id = user_id
+        self.role = role
+        self.organization_id = organization_id
+        self.permissions = permissions or {}
+        self.permissions_version = permissions_version
+        self._user = user
+
+    @classmethod
+    def from_user(cls, user):
+        """Build a principal from a loaded User"""
+        return cls(
+            user.id,
+            user.role,
+            user.organization_id,
+            user.permissions,
+            user.permissions_version,
+            user=user
+        )
+
+    @classmethod
+    def from_claims(cls, claims):
+        """Build a principal from signed token claims without touching the database"""
+        return cls(
+            claims['sub'],
+            claims['role'],
+            claims.get('org'),
+            claims.get('perms'),
+            claims.get('pv')
+        )
+
+    @property
+    def user(self):
+        """The User model, loaded on first access"""
+        if self._user is None:
+            self._user = User.query.get(self.user_id)
+        return self._user
+
+    def has_role(self, *roles):
+        """Check if the principal has one of the given roles"""
+        return self.role in roles
+
+    def has_permission(self, permission):
+        """Check a specific permission (super admins have all permissions)"""
+        if self.role == 'super_admin':
+            return True
+        return bool(self.permissions.get(permission, False))
+
+def get_current_principal():
+    """Get the principal for the current request, resolving it at most once"""
+    if '_principal' in g:
+        return g._principal
+
+    try:
+        claims = get_jwt()
+    except RuntimeError:
+        # Not behind @jwt_required(); verify here so public routes still work
+        verify_jwt_in_request(optional=True)
+        claims = get_jwt()
+    user_id = claims.get('sub')
+
+    principal = None
+    if user_id:
+        if 'role' in claims:
+            principal = Principal.from_claims(claims)
+        else:
+            # Tokens issued before role claims were added
+            user = User.query.get(user_id)
+            if user:
+                principal = Principal.from_user(user)
+
+    g._principal = principal
+    return principal
+
+def get_current_user():
+    """Get the User model for the current request"""
+    principal = get_current_principal()
+    return principal.user if principal else None
+
+def peek_current_principal():
+    """Get the principal only if it was already resolved for this request"""
+    if not has_request_context():
+        return None
+    return g.get('_principal')
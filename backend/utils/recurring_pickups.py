@@ -0,0 +1,208 @@
+"""
+Recurring Pickups
+Materializes upcoming pickups for active customers from their
+pickup_frequency, in bulk and idempotently (re-runs never duplicate)
+"""
+
+from sqlalchemy import select
+from models import db, Organization, Customer, Pickup, Zone
+from utils.upserts import insert_ignore_conflicts
+from utils.pickup_changes import pickups_changed
+from utils.slot_capacity import reserve_slots, release_slots
+from datetime import date, datetime, time, timedelta
+import calendar
+import uuid
+
+DEFAULT_HORIZON_DAYS = 28
+MAX_HORIZON_DAYS = 90
+DEFAULT_PICKUP_TIME = time(8, 0)
+CUSTOMER_CHUNK_SIZE = 1000
+
+# Days between pickups; monthly pickups keep the anchor's day of month
+FREQUENCY_INTERVALS = {
+    'daily': 1,
+    'weekly': 7,
+    'biweekly': 14
+}
+MONTHLY = 'monthly'
+
+def _monthly_dates(anchor, start, end):
+    year, month = start.year, start.month
+    while True:
+        day = min(anchor.day, calendar.monthrange(year, month)[1])
+        current = date(year, month, day)
+        if current > end:
+            return
+        if current >= start:
+            yield current
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+def pickup_dates(frequency, anchor, start, end):
+    """
+    Dates in [start, end] for a schedule anchored at anchor. The series is
+    derived from the anchor, not from start, so overlapping runs agree.
+    """
+    start = max(start, anchor)
+    if start > end:
+        return []
+
+    if frequency == MONTHLY:
+        return list(_monthly_dates(anchor, start, end))
+
+    interval = FREQUENCY_INTERVALS.get(frequency)
+    if interval is None:
+        return []
+
+    # First occurrence on or after start
+    offset = (start - anchor).days % interval
+    current = start + timedelta(days=(interval - offset) % interval)
+    dates = []
+    while current <= end:
+        dates.append(current)
+        current += timedelta(days=interval)
+    return dates
+
+def _customer_chunks(organization_id, zone_id, chunk_size):
+    after_id = None
+    while True:
+        query = select(
+            Customer.id,
+            Customer.zone_id,
+            Customer.pickup_frequency,
+            Customer.service_start_date,
+            Customer.service_end_date,
+            Customer.created_at
+        ).where(
+            Customer.organization_id == organization_id,
+            Customer.status == 'active'
+        )
+        if zone_id:
+            query = query.where(Customer.zone_id == zone_id)
+        if after_id is not None:
+            query = query.where(Customer.id > after_id)
+
+        chunk = db.session.execute(query.order_by(Customer.id).limit(chunk_size)).all()
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1].id
+
+def _existing_pickup_days(customer_ids, start, end):
+    """(customer_id, date) pairs that already have a regular pickup in the window"""
+    rows = db.session.execute(
+        select(Pickup.customer_id, Pickup.scheduled_date).where(
+            Pickup.customer_id.in_(customer_ids),
+            Pickup.scheduled_date >= start,
+            Pickup.scheduled_date <= end,
+            Pickup.pickup_type == 'regular',
+            Pickup.status != 'cancelled'
+        )
+    ).all()
+    return set(map(tuple, rows))
+
+def materialize_pickups(organization_id, zone_id=None, horizon_days=DEFAULT_HORIZON_DAYS,
+                        pickup_time=DEFAULT_PICKUP_TIME, start=None, created_by=None,
+                        chunk_size=CUSTOMER_CHUNK_SIZE):
+    """
+    Create the recurring pickups due in the next horizon_days for an
+    organization's active customers (optionally one zone), leaving out
+    occurrences whose date and pickup_time have already passed. Days that
+    already have a regular pickup for the customer are skipped, and so are
+    pickups whose zone slot is full or outside the zone's service hours.
+    Commits per customer chunk and returns {'customers', 'created',
+    'skipped', 'slot_full'}.
+    """
+    current = datetime.utcnow()
+    start = start or current.date()
+    end = start + timedelta(days=min(horizon_days, MAX_HORIZON_DAYS) - 1)
+    # Occurrences already past their time would be marked missed on the next
+    # missed-pickup run, which compares against the same UTC clock
+    start = max(start, current.date())
+    if start == current.date() and pickup_time <= current.time():
+        start += timedelta(days=1)
+    pickups = Pickup.__table__
+    summary = {'customers': 0, 'created': 0, 'skipped': 0, 'slot_full': 0}
+    zones = {
+        zone.id: zone
+        for zone in Zone.query.filter(Zone.organization_id == organization_id, Zone.slot_capacity.isnot(None))
+    }
+
+    for chunk in _customer_chunks(organization_id, zone_id, chunk_size):
+        existing = _existing_pickup_days([customer.id for customer in chunk], start, end)
+        now = datetime.utcnow()
+
+        rows = []
+        for customer in chunk:
+            anchor = customer.service_start_date or (customer.created_at or now).date()
+            last_day = min(end, customer.service_end_date) if customer.service_end_date else end
+            for pickup_date in pickup_dates(customer.pickup_frequency, anchor, start, last_day):
+                if (customer.id, pickup_date) in existing:
+                    summary['skipped'] += 1
+                    continue
+                rows.append({
+                    'id': str(uuid.uuid4()),
+                    'organization_id': organization_id,
+                    'customer_id': customer.id,
+                    'zone_id': customer.zone_id,
+                    'scheduled_date': pickup_date,
+                    'scheduled_time': pickup_time,
+                    'pickup_type': 'regular',
+                    'is_recurring': True,
+                    'status': 'scheduled',
+                    'slot_reserved': False,
+                    'created_by': created_by,
+                    'created_at': now,
+                    'updated_at': now
+                })
+
+        # Generated pickups hold zone slots like booked ones; rows that don't
+        # get one are left out
+        slotted = [row for row in rows if row['zone_id'] in zones]
+        granted = reserve_slots([
+            (zones[row['zone_id']], row['scheduled_date'], row['scheduled_time']) for row in slotted
+        ])
+        for row, reserved in zip(slotted, granted):
+            row['slot_reserved'] = reserved
+        unslotted = len(slotted) - sum(granted)
+        rows = [row for row in rows if row['slot_reserved'] or row['zone_id'] not in zones]
+
+        # The partial unique index absorbs concurrent runs racing on the same days
+        created = insert_ignore_conflicts(
+            db.session.connection(), pickups, rows,
+            ('customer_id', 'scheduled_date'), index_where=pickups.c.is_recurring
+        )
+        if created < len(rows):
+            # Give back the slots of rows a concurrent run had already created
+            inserted = set(db.session.scalars(
+                select(Pickup.id).where(Pickup.id.in_([row['id'] for row in rows]))
+            ))
+            release_slots([
+                (zones[row['zone_id']], row['scheduled_date'], row['scheduled_time'])
+                for row in rows if row['slot_reserved'] and row['id'] not in inserted
+            ])
+        db.session.commit()
+        if created:
+            pickups_changed(organization_id)
+
+        summary['customers'] += len(chunk)
+        summary['created'] += created
+        summary['skipped'] += len(rows) - created
+        summary['slot_full'] += unslotted
+
+    return summary
+
+def materialize_all_organizations(horizon_days=DEFAULT_HORIZON_DAYS):
+    """Materialize pickups for every active or trial organization"""
+    organization_ids = db.session.scalars(
+        select(Organization.id).where(Organization.status.in_(['active', 'trial']))
+    ).all()
+
+    totals = {'organizations': 0, 'customers': 0, 'created': 0, 'skipped': 0, 'slot_full': 0}
+    for organization_id in organization_ids:
+        summary = materialize_pickups(organization_id, horizon_days=horizon_days)
+        totals['organizations'] += 1
+        for key in ('customers', 'created', 'skipped', 'slot_full'):
+            totals[key] += summary[key]
+    return totals
@@ -0,0 +1,218 @@
+"""
+Route Planner
+Orders a day's stops for one truck: nearest-neighbour construction followed
+by time-budgeted 2-opt over precomputed distances, on a local planar
+projection of the coordinates (accurate at zone scale)
+"""
+
+from collections import deque
+import math
+import time
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Full distance matrix up to this many nodes; above it, distances to each
+# node's nearest candidates are precomputed instead (n^2 gets too large)
+FULL_MATRIX_MAX_NODES = 400
+CANDIDATE_NEIGHBOURS = 10
+DEFAULT_TIME_BUDGET = 0.3
+
+def project(points, origin):
+    """Equirectangular projection of (lat, lng) points to km around origin"""
+    lat0, lng0 = origin
+    scale_x = EARTH_RADIUS_KM * math.cos(math.radians(lat0))
+    return [
+        (math.radians(lng - lng0) * scale_x, math.radians(lat - lat0) * EARTH_RADIUS_KM)
+        for lat, lng in points
+    ]
+
+class _Grid:
+    """Uniform bucket grid for nearest-point queries over planar points"""
+
+    def __init__(self, xy):
+        self.xy = xy
+        xs = [x for x, _ in xy]
+        ys = [y for _, y in xy]
+        self.min_x, self.min_y = min(xs), min(ys)
+        span = max(max(xs) - self.min_x, max(ys) - self.min_y, 1e-9)
+        # About two points per cell
+        self.cells_per_side = max(1, int(math.sqrt(len(xy) / 2)))
+        self.cell_size = span / self.cells_per_side + 1e-12
+        self.cells = {}
+        for index, point in enumerate(xy):
+            self.cells.setdefault(self._cell(point), []).append(index)
+
+    def _cell(self, point):
+        return (int((point[0] - self.min_x) / self.cell_size),
+                int((point[1] - self.min_y) / self.cell_size))
+
+    def remove(self, index):
+        self.cells[self._cell(self.xy[index])].remove(index)
+
+    def _ring(self, cx, cy, radius):
+        if radius == 0:
+            yield cx, cy
+            return
+        for dx in range(-radius, radius + 1):
+            yield cx + dx, cy - radius
+            yield cx + dx, cy + radius
+        for dy in range(-radius + 1, radius):
+            yield cx - radius, cy + dy
+            yield cx + radius, cy + dy
+
+    def nearest(self, point, k=1, exclude=None):
+        """Up to k nearest (distance, index) pairs to point, closest first"""
+        px, py = point
+        cx, cy = self._cell(point)
+        found = []
+        max_radius = self.cells_per_side + 1
+        radius = 0
+        while radius <= max_radius:
+            for cell in self._ring(cx, cy, radius):
+                for index in self.cells.get(cell, ()):
+                    if index != exclude:
+                        x, y = self.xy[index]
+                        found.append((math.hypot(x - px, y - py), index))
+            # Anything in further rings is at least radius * cell_size away
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= radius * self.cell_size:
+                    return found[:k]
+            radius += 1
+        found.sort()
+        return found[:k]
+
+def _nearest_neighbour_tour(xy, start):
+    grid = _Grid(xy)
+    grid.remove(start)
+    tour = [start]
+    current = start
+    for _ in range(len(xy) - 1):
+        _, current = grid.nearest(xy[current])[0]
+        grid.remove(current)
+        tour.append(current)
+    return tour
+
+def _distance_function(xy):
+    n = len(xy)
+    if n <= FULL_MATRIX_MAX_NODES:
+        matrix = [
+            [math.hypot(ax - bx, ay - by) for bx, by in xy]
+            for ax, ay in xy
+        ]
+        return lambda a, b: matrix[a][b]
+
+    def distance(a, b):
+        ax, ay = xy[a]
+        bx, by = xy[b]
+        return math.hypot(ax - bx, ay - by)
+    return distance
+
+def _candidates(xy):
+    """Each node's nearest neighbours with their distances, closest first"""
+    grid = _Grid(xy)
+    k = min(CANDIDATE_NEIGHBOURS, len(xy) - 1)
+    return [grid.nearest(point, k=k, exclude=index) for index, point in enumerate(xy)]
+
+def _tour_length(tour, distance):
+    return sum(distance(tour[i - 1], tour[i]) for i in range(len(tour)))
+
+def _two_opt(tour, distance, candidates, deadline):
+    """Neighbour-list 2-opt with don't-look bits on a closed tour, in place"""
+    n = len(tour)
+    position = [0] * n
+    for index, node in enumerate(tour):
+        position[node] = index
+
+    def reverse(i, j):
+        # Reverse the cyclic segment from position i forward to position j
+        length = (j - i) % n + 1
+        for _ in range(length // 2):
+            a, b = tour[i], tour[j]
+            tour[i], tour[j] = b, a
+            position[b], position[a] = i, j
+            i = (i + 1) % n
+            j = (j - 1) % n
+
+    def apply(a, b, c, d):
+        # Replace edges (a,b),(c,d) with (a,c),(b,d); b follows a and d follows c
+        inner = (position[c] - position[b]) % n
+        if inner <= n // 2:
+            reverse(position[b], position[c])
+        else:
+            reverse(position[d], position[a])
+
+    queue = deque(tour)
+    queued = [True] * n
+    checks = 0
+
+    while queue:
+        checks += 1
+        if checks % 64 == 0 and time.perf_counter() > deadline:
+            break
+        a = queue.popleft()
+        queued[a] = False
+        improved = False
+
+        for direction in (1, -1):
+            b = tour[(position[a] + direction) % n]
+            ab = distance(a, b)
+            for ac, c in candidates[a]:
+                if ac >= ab:
+                    break
+                d = tour[(position[c] + direction) % n]
+                if c == b or d == a:
+                    continue
+                delta = ac + distance(b, d) - ab - distance(c, d)
+                if delta < -1e-9:
+                    if direction == 1:
+                        apply(a, b, c, d)
+                    else:
+                        apply(b, a, d, c)
+                    for node in (a, b, c, d):
+                        if not queued[node]:
+                            queue.append(node)
+                            queued[node] = True
+                    improved = True
+                    break
+            if improved:
+                break
+
+    return tour
+
+def plan_route(stops, depot=None, time_budget=DEFAULT_TIME_BUDGET):
+    """
+    Order stops [(id, lat, lng)] into a closed route starting and ending at
+    depot (lat, lng), or at the stops' centroid when no depot is given.
+    Returns {'order': [ids], 'distance_km', 'initial_distance_km', 'solve_ms'};
+    distances include the legs to and from the depot.
+    """
+    started = time.perf_counter()
+    if not stops:
+        return {'order': [], 'distance_km': 0.0, 'initial_distance_km': 0.0, 'solve_ms': 0}
+
+    points = [(float(lat), float(lng)) for _, lat, lng in stops]
+    if depot is None:
+        depot = (sum(lat for lat, _ in points) / len(points), sum(lng for _, lng in points) / len(points))
+    depot = (float(depot[0]), float(depot[1]))
+
+    # Node 0 is the depot; node i is stops[i - 1]
+    xy = project([depot] + points, depot)
+    distance = _distance_function(xy)
+
+    tour = _nearest_neighbour_tour(xy, 0)
+    initial_length = _tour_length(tour, distance)
+
+    if len(tour) > 3:
+        deadline = started + time_budget
+        _two_opt(tour, distance, _candidates(xy), deadline)
+
+    depot_index = tour.index(0)
+    tour = tour[depot_index:] + tour[:depot_index]
+
+    return {
+        'order': [stops[node - 1][0] for node in tour[1:]],
+        'distance_km': round(_tour_length(tour, distance), 3),
+        'initial_distance_km': round(initial_length, 3),
+        'solve_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
@@ -0,0 +1,370 @@
+"""
+Slot Capacity
+Per-zone booking slots. zone_slot_reservations counters are the authority:
+a reservation is one conditional UPDATE, so concurrent bookings can't
+overbook. Free-slot searches read a cached, read-only occupancy index per
+(zone, day) that is dropped when a transaction changing that day commits
+and rebuilt from the counters on the next search
+"""
+
+from sqlalchemy import select, update, delete, case, event, bindparam
+from models import db, Pickup, ZoneSlotReservation
+from utils.cache import TTLCache
+from utils.upserts import insert_ignore_conflicts, upsert_replace
+from datetime import datetime, timedelta
+
+# Loaded days are reused briefly; the database counter is always the
+# authority, so a stale day can only suggest a slot that then fails to reserve
+OCCUPANCY_TTL_SECONDS = 30
+_days = TTLCache(ttl=OCCUPANCY_TTL_SECONDS, max_entries=5000)
+
+DEFAULT_SEARCH_DAYS = 14
+REBUILD_CHUNK_SIZE = 500
+
+class SlotFullError(Exception):
+    """Raised when a slot has no capacity left"""
+
+class FenwickTree:
+    """Static prefix sums over n counters with O(log n) prefix and order-statistic queries"""
+
+    def __init__(self, values):
+        self.size = len(values)
+        self.tree = [0] * (self.size + 1)
+        for index, value in enumerate(values, start=1):
+            self.tree[index] += value
+            parent = index + (index & -index)
+            if parent <= self.size:
+                self.tree[parent] += self.tree[index]
+
+    def prefix(self, count):
+        """Sum of the first count values"""
+        total = 0
+        while count > 0:
+            total += self.tree[count]
+            count -= count & -count
+        return total
+
+    def find(self, k):
+        """Smallest index whose inclusive prefix sum reaches k (k >= 1), or None"""
+        position = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            following = position + step
+            if following <= self.size and self.tree[following] < k:
+                position = following
+                k -= self.tree[following]
+            step >>= 1
+        return position if position < self.size else None
+
+class SlotLayout:
+    """How a zone's service day divides into slots"""
+
+    def __init__(self, zone):
+        self.zone_id = zone.id
+        self.capacity = zone.slot_capacity
+        self.minutes = zone.slot_minutes or 60
+        self.start = zone.service_start_time
+        self.end = zone.service_end_time
+        day_minutes = (self.end.hour * 60 + self.end.minute) - (self.start.hour * 60 + self.start.minute)
+        self.count = max(day_minutes // self.minutes, 0)
+
+    @property
+    def key(self):
+        return (self.zone_id, self.capacity, self.minutes, self.start, self.end)
+
+    def index_for(self, slot_time):
+        """Slot containing slot_time, or None outside service hours"""
+        offset = (slot_time.hour * 60 + slot_time.minute) - (self.start.hour * 60 + self.start.minute)
+        if offset < 0:
+            return None
+        index = offset // self.minutes
+        return index if index < self.count else None
+
+    def time_for(self, index):
+        return (datetime.combine(datetime.min, self.start) + timedelta(minutes=index * self.minutes)).time()
+
+class DayOccupancy:
+    """Reserved counts for one zone day with a tree over slots that still have room"""
+
+    def __init__(self, layout, reserved):
+        self.layout = layout
+        self.reserved = [reserved.get(layout.time_for(index), 0) for index in range(layout.count)]
+        self.free = FenwickTree([1 if count < layout.capacity else 0 for count in self.reserved])
+
+    def next_free(self, from_index, count):
+        """Up to count slot indexes with room, starting at from_index"""
+        found = []
+        rank = self.free.prefix(from_index) + 1
+        while len(found) < count:
+            index = self.free.find(rank)
+            if index is None:
+                break
+            found.append(index)
+            rank += 1
+        return found
+
+def _day(layout, slot_date):
+    key = layout.key + (slot_date,)
+    occupancy = _days.get(key)
+    if occupancy is None:
+        rows = db.session.execute(
+            select(ZoneSlotReservation.slot_time, ZoneSlotReservation.reserved).where(
+                ZoneSlotReservation.zone_id == layout.zone_id,
+                ZoneSlotReservation.slot_date == slot_date
+            )
+        ).all()
+        occupancy = DayOccupancy(layout, dict(rows))
+        _days.set(key, occupancy)
+    return occupancy
+
+def _forget_day(layout, slot_date):
+    _days.invalidate(layout.key + (slot_date,))
+
+def _forget_day_on_commit(layout, slot_date):
+    """Drop the cached day once the caller's transaction commits; a rollback leaves it as it was"""
+    db.session.info.setdefault('slot_days', set()).add(layout.key + (slot_date,))
+
+def _after_commit(session):
+    for key in session.info.pop('slot_days', ()):
+        _days.invalidate(key)
+
+def _after_rollback(session):
+    session.info.pop('slot_days', None)
+
+def register_slot_capacity_hooks():
+    """Refresh cached occupancy only after reservation changes are committed"""
+    for name, listener in (('after_commit', _after_commit), ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
+
+def find_free_slots(zone, start_date, start_time=None, count=5, search_days=DEFAULT_SEARCH_DAYS):
+    """
+    The next count slots with room in the zone from start_date/start_time, as
+    [{'date', 'time', 'available'}]; 'available' is None for zones without a
+    capacity limit. Days are loaded lazily as the search reaches them.
+    """
+    layout = SlotLayout(zone)
+    slots = []
+    for offset in range(search_days):
+        slot_date = start_date + timedelta(days=offset)
+        from_index = 0
+        if offset == 0 and start_time is not None:
+            offset_minutes = (start_time.hour * 60 + start_time.minute) - (layout.start.hour * 60 + layout.start.minute)
+            from_index = max(-(-offset_minutes // layout.minutes), 0)
+        if from_index >= layout.count:
+            continue
+
+        if layout.capacity is None:
+            indexes = list(range(from_index, min(from_index + count - len(slots), layout.count)))
+            slots.extend({'date': slot_date, 'time': layout.time_for(index), 'available': None} for index in indexes)
+        else:
+            occupancy = _day(layout, slot_date)
+            for index in occupancy.next_free(from_index, count - len(slots)):
+                slots.append({
+                    'date': slot_date,
+                    'time': layout.time_for(index),
+                    'available': layout.capacity - occupancy.reserved[index]
+                })
+        if len(slots) >= count:
+            break
+    return slots
+
+def reserve_slot(zone, slot_date, slot_time):
+    """
+    Take one unit of capacity in the slot containing slot_time, in the
+    caller's transaction. Returns the slot's start time, or None when the
+    zone has no capacity limit. Raises SlotFullError when the slot is full
+    and ValueError outside service hours.
+    """
+    layout = SlotLayout(zone)
+    if layout.capacity is None:
+        return None
+    index = layout.index_for(slot_time)
+    if index is None:
+        raise ValueError('Pickup time is outside the zone service hours')
+    slot_start = layout.time_for(index)
+
+    reservations = ZoneSlotReservation.__table__
+    connection = db.session.connection()
+    insert_ignore_conflicts(connection, reservations, [{
+        'zone_id': zone.id, 'slot_date': slot_date, 'slot_time': slot_start, 'reserved': 0
+    }], ('zone_id', 'slot_date', 'slot_time'))
+
+    # The capacity check and increment are one statement: concurrent writers
+    # queue on the row lock and re-evaluate the condition
+    taken = connection.execute(
+        update(reservations).where(
+            reservations.c.zone_id == zone.id,
+            reservations.c.slot_date == slot_date,
+            reservations.c.slot_time == slot_start,
+            reservations.c.reserved < layout.capacity
+        ).values(reserved=reservations.c.reserved + 1)
+    ).rowcount
+
+    if not taken:
+        _forget_day(layout, slot_date)
+        raise SlotFullError(f"The {slot_start.strftime('%H:%M')} slot on {slot_date.isoformat()} is full")
+
+    _forget_day_on_commit(layout, slot_date)
+    return slot_start
+
+def reserve_slots(zone_slots):
+    """
+    Take capacity for many pickups at once, in the caller's transaction.
+    zone_slots is [(zone, slot_date, slot_time)], one entry per pickup;
+    returns a matching list of booleans saying which got a unit. A slot fills
+    in list order, and entries outside service hours never get one. Zones
+    without a capacity limit always succeed.
+    """
+    granted = [False] * len(zone_slots)
+    wanted, layouts = {}, {}
+    for position, (zone, slot_date, slot_time) in enumerate(zone_slots):
+        layout = SlotLayout(zone)
+        if layout.capacity is None:
+            granted[position] = True
+            continue
+        index = layout.index_for(slot_time)
+        if index is None:
+            continue
+        key = (zone.id, slot_date, layout.time_for(index))
+        wanted.setdefault(key, []).append(position)
+        layouts[key] = layout
+    if not wanted:
+        return granted
+
+    reservations = ZoneSlotReservation.__table__
+    connection = db.session.connection()
+    insert_ignore_conflicts(connection, reservations, [
+        {'zone_id': zone_id, 'slot_date': slot_date, 'slot_time': slot_start, 'reserved': 0}
+        for zone_id, slot_date, slot_start in sorted(wanted)
+    ], ('zone_id', 'slot_date', 'slot_time'))
+
+    # Lock the counters in key order so concurrent writers wait rather than
+    # both seeing the same room
+    reserved = {
+        (row.zone_id, row.slot_date, row.slot_time): row.reserved
+        for row in connection.execute(
+            select(reservations).where(
+                reservations.c.zone_id.in_({key[0] for key in wanted}),
+                reservations.c.slot_date.in_({key[1] for key in wanted})
+            ).order_by(reservations.c.zone_id, reservations.c.slot_date, reservations.c.slot_time)
+            .with_for_update()
+        )
+    }
+
+    updates = []
+    for key, positions in sorted(wanted.items()):
+        zone_id, slot_date, slot_start = key
+        room = max(layouts[key].capacity - reserved.get(key, 0), 0)
+        for position in positions[:room]:
+            granted[position] = True
+        if room:
+            updates.append({
+                'b_zone_id': zone_id, 'b_slot_date': slot_date, 'b_slot_time': slot_start,
+                'taken': min(room, len(positions))
+            })
+            _forget_day_on_commit(layouts[key], slot_date)
+
+    if updates:
+        connection.execute(
+            update(reservations).where(
+                reservations.c.zone_id == bindparam('b_zone_id'),
+                reservations.c.slot_date == bindparam('b_slot_date'),
+                reservations.c.slot_time == bindparam('b_slot_time')
+            ).values(reserved=reservations.c.reserved + bindparam('taken')),
+            updates
+        )
+    return granted
+
+def release_slots(zone_slots):
+    """
+    Give back capacity for cancelled pickups, in the caller's transaction.
+    zone_slots is [(zone, slot_date, slot_time)], one entry per pickup.
+    """
+    counts = {}
+    for zone, slot_date, slot_time in zone_slots:
+        layout = SlotLayout(zone)
+        index = layout.index_for(slot_time) if layout.count else None
+        if index is None:
+            continue
+        key = (zone.id, slot_date, layout.time_for(index))
+        counts[key] = counts.get(key, 0) + 1
+        _forget_day_on_commit(layout, slot_date)
+
+    reservations = ZoneSlotReservation.__table__
+    for (zone_id, slot_date, slot_start), count in sorted(counts.items()):
+        # Clamped at zero so a counter that drifted low still gives back what it has
+        db.session.connection().execute(
+            update(reservations).where(
+                reservations.c.zone_id == zone_id,
+                reservations.c.slot_date == slot_date,
+                reservations.c.slot_time == slot_start
+            ).values(reserved=case(
+                (reservations.c.reserved > count, reservations.c.reserved - count),
+                else_=0
+            ))
+        )
+
+def rebuild_zone_reservations(zone, from_date):
+    """
+    Recount a zone's slot counters from its pickups on or after from_date
+    that aren't cancelled, and mark which of them hold a slot, in the
+    caller's transaction. Needed when capacity is switched on or the slot
+    layout changes: pickups booked meanwhile hold no slot, or hold one under
+    the old slot boundaries.
+    """
+    layout = SlotLayout(zone)
+    reservations = ZoneSlotReservation.__table__
+    pickups = Pickup.__table__
+    connection = db.session.connection()
+
+    counts, holding = {}, []
+    if layout.capacity is not None and layout.count:
+        rows = connection.execute(
+            select(pickups.c.id, pickups.c.scheduled_date, pickups.c.scheduled_time).where(
+                pickups.c.zone_id == zone.id,
+                pickups.c.scheduled_date >= from_date,
+                pickups.c.status != 'cancelled'
+            )
+        )
+        for pickup_id, slot_date, slot_time in rows:
+            index = layout.index_for(slot_time)
+            if index is None:
+                continue
+            key = (slot_date, layout.time_for(index))
+            counts[key] = counts.get(key, 0) + 1
+            holding.append(pickup_id)
+
+    stale_days = set(connection.scalars(
+        select(reservations.c.slot_date).where(
+            reservations.c.zone_id == zone.id,
+            reservations.c.slot_date >= from_date
+        ).distinct()
+    ))
+    connection.execute(
+        delete(reservations).where(
+            reservations.c.zone_id == zone.id,
+            reservations.c.slot_date >= from_date
+        )
+    )
+    # Overwrites a counter a concurrent booking created after the delete
+    upsert_replace(connection, reservations, ('zone_id', 'slot_date', 'slot_time'), [
+        {'zone_id': zone.id, 'slot_date': slot_date, 'slot_time': slot_start, 'reserved': count}
+        for (slot_date, slot_start), count in sorted(counts.items())
+    ], ('reserved',))
+
+    open_pickups = (
+        pickups.c.zone_id == zone.id,
+        pickups.c.scheduled_date >= from_date,
+        pickups.c.status != 'cancelled'
+    )
+    connection.execute(update(pickups).where(*open_pickups).values(slot_reserved=False))
+    for offset in range(0, len(holding), REBUILD_CHUNK_SIZE):
+        connection.execute(
+            update(pickups).where(
+                pickups.c.id.in_(holding[offset:offset + REBUILD_CHUNK_SIZE])
+            ).values(slot_reserved=True)
+        )
+
+    for slot_date in stale_days | {slot_date for slot_date, _ in counts}:
+        _forget_day_on_commit(layout, slot_date)
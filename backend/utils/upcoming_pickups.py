@@ -0,0 +1,198 @@
+"""
+Upcoming Pickups Cache
+Each organization's upcoming-pickup list, cached in process (or in Redis
+when REDIS_URL is set, shared by all workers), invalidated on pickup writes
+and reloaded in the background before it expires
+"""
+
+from sqlalchemy import select
+from models import db, Pickup
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from datetime import date
+import json
+import logging
+import threading
+import time
+
+try:
+    import redis
+except ImportError:  # pragma: no cover - optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+UPCOMING_LIMIT = 10
+DEFAULT_TTL_SECONDS = 60
+
+# Entries older than this fraction of the TTL are reloaded in the background
+# while readers keep getting the cached list
+REFRESH_AHEAD_FRACTION = 0.75
+
+def load_upcoming_pickups(organization_id):
+    """Next scheduled or in-progress pickups for an organization, serialized"""
+    rows = db.session.execute(
+        select(
+            Pickup.id, Pickup.customer_id, Pickup.zone_id, Pickup.scheduled_date,
+            Pickup.scheduled_time, Pickup.pickup_type, Pickup.status, Pickup.notes
+        ).where(
+            Pickup.organization_id == organization_id,
+            Pickup.scheduled_date >= date.today(),
+            Pickup.status.in_(['scheduled', 'in_progress'])
+        ).order_by(Pickup.scheduled_date.asc(), Pickup.scheduled_time.asc()).limit(UPCOMING_LIMIT)
+    ).all()
+    return [
+        {
+            'id': row.id,
+            'customer_id': row.customer_id,
+            'zone_id': row.zone_id,
+            'scheduled_date': row.scheduled_date.isoformat(),
+            'scheduled_time': row.scheduled_time.isoformat(),
+            'pickup_type': row.pickup_type,
+            'status': row.status,
+            'notes': row.notes
+        }
+        for row in rows
+    ]
+
+class _LocalBackend:
+    """Entries and invalidation generations in this process"""
+
+    def __init__(self):
+        self._entries = {}
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def read(self, organization_id):
+        with self._lock:
+            return self._entries.get(organization_id), self._generations[organization_id]
+
+    def write(self, organization_id, entry, ttl):
+        with self._lock:
+            if entry['generation'] == self._generations[organization_id]:
+                self._entries[organization_id] = entry
+
+    def invalidate(self, organization_id):
+        with self._lock:
+            self._generations[organization_id] += 1
+            self._entries.pop(organization_id, None)
+
+class _RedisBackend:
+    """Entries shared by every worker; a generation counter per organization
+    makes entries loaded before an invalidation unreadable"""
+
+    PREFIX = 'upcoming_pickups'
+
+    def __init__(self, url):
+        self._client = redis.Redis.from_url(url)
+
+    def _keys(self, organization_id):
+        return f'{self.PREFIX}:{organization_id}', f'{self.PREFIX}:{organization_id}:generation'
+
+    def read(self, organization_id):
+        raw_entry, raw_generation = self._client.mget(self._keys(organization_id))
+        entry = json.loads(raw_entry) if raw_entry else None
+        return entry, int(raw_generation or 0)
+
+    def write(self, organization_id, entry, ttl):
+        self._client.set(self._keys(organization_id)[0], json.dumps(entry), ex=max(int(ttl * 2), 1))
+
+    def invalidate(self, organization_id):
+        entry_key, generation_key = self._keys(organization_id)
+        pipeline = self._client.pipeline()
+        pipeline.incr(generation_key)
+        pipeline.delete(entry_key)
+        pipeline.execute()
+
+class UpcomingPickupsCache:
+    """Refresh-ahead cache of load_upcoming_pickups per organization"""
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS):
+        self.ttl = ttl
+        self.app = None
+        self._backend = _LocalBackend()
+        self._load_locks = defaultdict(threading.Lock)
+        self._refreshing = set()
+        self._refreshing_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='upcoming-pickups')
+
+    def init_app(self, app):
+        """Configure the TTL and, when REDIS_URL is set, the shared backend"""
+        self.app = app
+        self.ttl = app.config.get('UPCOMING_PICKUPS_CACHE_SECONDS', self.ttl)
+        redis_url = app.config.get('REDIS_URL')
+        if redis_url:
+            if redis is None:
+                logger.warning('REDIS_URL is set but redis is not installed; caching upcoming pickups in process')
+            else:
+                self._backend = _RedisBackend(redis_url)
+
+    def _fresh(self, entry, generation):
+        return (
+            entry is not None
+            and entry['generation'] == generation
+            and entry['day'] == date.today().isoformat()
+            and time.time() - entry['loaded_at'] < self.ttl
+        )
+
+    def _load(self, organization_id, generation):
+        entry = {
+            'data': load_upcoming_pickups(organization_id),
+            'loaded_at': time.time(),
+            'day': date.today().isoformat(),
+            'generation': generation
+        }
+        self._backend.write(organization_id, entry, self.ttl)
+        return entry
+
+    def get(self, organization_id):
+        """The organization's upcoming pickups, loading them at most once per miss"""
+        try:
+            entry, generation = self._backend.read(organization_id)
+        except Exception as e:
+            logger.warning(f"Upcoming pickups cache unavailable: {e}")
+            return load_upcoming_pickups(organization_id)
+
+        if self._fresh(entry, generation):
+            if time.time() - entry['loaded_at'] > self.ttl * REFRESH_AHEAD_FRACTION:
+                self.refresh_async(organization_id)
+            return entry['data']
+
+        # Concurrent misses in this process wait for one load instead of stampeding
+        with self._load_locks[organization_id]:
+            entry, generation = self._backend.read(organization_id)
+            if self._fresh(entry, generation):
+                return entry['data']
+            return self._load(organization_id, generation)['data']
+
+    def _refresh(self, organization_id):
+        try:
+            with self.app.app_context():
+                with self._load_locks[organization_id]:
+                    _, generation = self._backend.read(organization_id)
+                    self._load(organization_id, generation)
+        except Exception as e:
+            logger.warning(f"Background refresh of upcoming pickups failed for {organization_id}: {e}")
+        finally:
+            with self._refreshing_lock:
+                self._refreshing.discard(organization_id)
+
+    def refresh_async(self, organization_id):
+        """Reload an organization's entry in the background (once at a time)"""
+        if self.app is None:
+            return
+        with self._refreshing_lock:
+            if organization_id in self._refreshing:
+                return
+            self._refreshing.add(organization_id)
+        self._executor.submit(self._refresh, organization_id)
+
+    def invalidate(self, organization_id):
+        """Drop the entry after a committed pickup write and start reloading it"""
+        try:
+            self._backend.invalidate(organization_id)
+        except Exception as e:
+            logger.warning(f"Could not invalidate upcoming pickups for {organization_id}: {e}")
+        self.refresh_async(organization_id)
+
+upcoming_pickups_cache = UpcomingPickupsCache()
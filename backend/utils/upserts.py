@@ -0,0 +1,85 @@
+"""
+Upserts
+Atomic "insert or add to" and "insert or overwrite" writes for tables keyed
+by a primary key, and bulk inserts that skip rows colliding with a unique index
+"""
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+def upsert_increment(connection, table, key_columns, values, counter_columns):
+    """
+    Insert each row of values, or add its counter columns to the existing row
+    with the same key. Rows should be sorted by key so concurrent writers lock
+    them in the same order.
+    """
+    if not values:
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(table).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[name] for name in key_columns],
+            set_={name: table.c[name] + statement.excluded[name] for name in counter_columns}
+        )
+        connection.execute(statement)
+        return
+
+    for value in values:
+        result = connection.execute(
+            table.update().where(
+                *[table.c[name] == value[name] for name in key_columns]
+            ).values(**{name: table.c[name] + value[name] for name in counter_columns})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**value))
+
+def upsert_replace(connection, table, key_columns, values, update_columns):
+    """
+    Insert each row of values, or overwrite update_columns on the existing
+    row with the same key, so concurrent writers never collide on the key.
+    """
+    if not values:
+        return
+
+    dialect = connection.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        statement = insert(table).values(values)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[name] for name in key_columns],
+            set_={name: statement.excluded[name] for name in update_columns}
+        )
+        connection.execute(statement)
+        return
+
+    for value in values:
+        result = connection.execute(
+            table.update().where(
+                *[table.c[name] == value[name] for name in key_columns]
+            ).values(**{name: value[name] for name in update_columns})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**value))
+
+def insert_ignore_conflicts(connection, table, rows, index_elements, index_where=None, batch_size=500):
+    """
+    Multi-row INSERT that skips rows already present under the unique index on
+    index_elements (partial when index_where is given). Returns rows inserted.
+    """
+    dialect = connection.dialect.name
+    inserted = 0
+    for offset in range(0, len(rows), batch_size):
+        batch = rows[offset:offset + batch_size]
+        if dialect in ('postgresql', 'sqlite'):
+            insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+            statement = insert(table).values(batch).on_conflict_do_nothing(
+                index_elements=[table.c[name] for name in index_elements],
+                index_where=index_where
+            )
+        else:
+            # Callers pre-filter existing rows; no portable conflict clause here
+            statement = table.insert().values(batch)
+        inserted += connection.execute(statement).rowcount
+    return inserted
@@ -0,0 +1,202 @@
+"""
+Usage Counters
+Keeps organization_usage in step with customers, regional managers and
+zones on every flush so limit checks read one row instead of counting
+"""
+
+from sqlalchemy import event, inspect, func, select, update, bindparam
+from models import db, Organization, OrganizationUsage, User, Customer, Zone
+from utils.upserts import upsert_increment, insert_ignore_conflicts
+from collections import defaultdict
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('customers', 'managers', 'zones')
+
+def _counter_key(obj, values):
+    """(organization_id, counter) an object with these column values counts towards"""
+    organization_id = values.get('organization_id')
+    if not organization_id:
+        return None
+    if isinstance(obj, Customer):
+        return organization_id, 'customers'
+    if isinstance(obj, Zone):
+        return organization_id, 'zones'
+    if isinstance(obj, User) and values.get('role') == 'regional_manager':
+        return organization_id, 'managers'
+    return None
+
+def _values(obj, previous=False):
+    state = inspect(obj)
+    values = {}
+    for key in ('organization_id', 'role'):
+        if key not in state.attrs:
+            continue
+        history = state.attrs[key].history
+        if previous and history.deleted:
+            values[key] = history.deleted[0]
+        else:
+            values[key] = getattr(obj, key)
+    return values
+
+def collect_usage_deltas(session):
+    """Counter changes implied by the pending flush, as {(organization_id, counter): delta}"""
+    deltas = defaultdict(int)
+
+    for obj in session.new:
+        key = _counter_key(obj, _values(obj))
+        if key:
+            deltas[key] += 1
+
+    for obj in session.deleted:
+        key = _counter_key(obj, _values(obj, previous=True))
+        if key:
+            deltas[key] -= 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, (User, Customer, Zone)):
+            continue
+        # Moving between organizations or in/out of the manager role
+        old_key = _counter_key(obj, _values(obj, previous=True))
+        new_key = _counter_key(obj, _values(obj))
+        if old_key != new_key:
+            if old_key:
+                deltas[old_key] -= 1
+            if new_key:
+                deltas[new_key] += 1
+
+    return {key: delta for key, delta in deltas.items() if delta}
+
+def increment_usage(connection, deltas):
+    """Apply counter deltas on the given connection/transaction"""
+    by_organization = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for (organization_id, counter), delta in deltas.items():
+        by_organization[organization_id][counter] += delta
+
+    values = [
+        {'organization_id': organization_id, **counts}
+        for organization_id, counts in sorted(by_organization.items())
+    ]
+    upsert_increment(connection, OrganizationUsage.__table__, ('organization_id',), values, COUNTERS)
+
+def _after_flush(session, flush_context):
+    deltas = collect_usage_deltas(session)
+    if deltas:
+        increment_usage(session.connection(), deltas)
+
+def _keep_previous(target, value, oldvalue, initiator):
+    return value
+
+# Attributes whose previous value decides which counter an update moves
+TRACKED_ATTRIBUTES = (User.organization_id, User.role, Customer.organization_id, Zone.organization_id)
+
+def register_usage_counters():
+    """Attach the flush-time usage counter listener to the application session"""
+    for attribute in TRACKED_ATTRIBUTES:
+        # Load the old value on assignment even when the attribute was expired
+        if not event.contains(attribute, 'set', _keep_previous):
+            event.listen(attribute, 'set', _keep_previous, active_history=True, retval=True)
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+def _actual_counts(connection, organization_ids):
+    """Recount usage from the source tables, as {organization_id: {counter: count}}"""
+    counts = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    sources = (
+        ('customers', select(Customer.organization_id, func.count(Customer.id))),
+        ('zones', select(Zone.organization_id, func.count(Zone.id))),
+        ('managers', select(User.organization_id, func.count(User.id)).where(
+            User.role == 'regional_manager'
+        ))
+    )
+    for counter, query in sources:
+        organization_column = query.selected_columns[0]
+        query = query.where(organization_column.in_(organization_ids)).group_by(organization_column)
+        for organization_id, count in connection.execute(query):
+            if organization_id:
+                counts[organization_id][counter] = count
+
+    return counts
+
+RECONCILE_CHUNK_SIZE = 500
+
+def _reconcile(connection, organization_ids, now, only_unreconciled=False):
+    """
+    Overwrite the counters of organization_ids with a recount, on the given
+    connection. The counter rows are created if missing and locked first, so
+    flushes that would bump them wait and increments already in flight have
+    committed before the recount reads the source tables.
+    """
+    usage = OrganizationUsage.__table__
+    organization_ids = sorted(set(organization_ids))
+    insert_ignore_conflicts(connection, usage, [
+        {'organization_id': organization_id, **dict.fromkeys(COUNTERS, 0)}
+        for organization_id in organization_ids
+    ], ('organization_id',))
+
+    locked = {
+        row.organization_id: row
+        for row in connection.execute(
+            select(usage).where(usage.c.organization_id.in_(organization_ids))
+            .order_by(usage.c.organization_id).with_for_update()
+        )
+    }
+    if only_unreconciled:
+        # Another transaction may have reconciled while we waited for the lock
+        organization_ids = [org_id for org_id in organization_ids if locked[org_id].reconciled_at is None]
+    if not organization_ids:
+        return 0
+
+    actual = _actual_counts(connection, organization_ids)
+    drifted = 0
+    updates = []
+    for organization_id in organization_ids:
+        counts = actual[organization_id]
+        row = locked[organization_id]
+        if row.reconciled_at is not None and any(getattr(row, counter) != counts[counter] for counter in COUNTERS):
+            drifted += 1
+            logger.warning(f"Usage counters drifted for organization {organization_id}; repairing")
+        updates.append({'b_organization_id': organization_id, **counts, 'reconciled_at': now})
+
+    connection.execute(
+        update(usage).where(usage.c.organization_id == bindparam('b_organization_id')),
+        updates
+    )
+    return drifted
+
+def reconcile_usage_counters(organization_ids=None):
+    """
+    Recount usage from the source tables and overwrite organization_usage,
+    one transaction per chunk. Returns the number of organizations whose
+    counters had drifted.
+    """
+    if organization_ids is None:
+        with db.engine.connect() as connection:
+            organization_ids = list(connection.scalars(select(Organization.id)))
+    organization_ids = list(organization_ids)
+
+    now = datetime.utcnow()
+    drifted = 0
+    for offset in range(0, len(organization_ids), RECONCILE_CHUNK_SIZE):
+        with db.engine.begin() as connection:
+            drifted += _reconcile(connection, organization_ids[offset:offset + RECONCILE_CHUNK_SIZE], now)
+    return drifted
+
+def get_usage_counts(organization_id):
+    """
+    Current customers/managers/zones counts for an organization. The first
+    read reconciles the counters in the caller's transaction, which can
+    already hold this organization's counter row from its own flushes.
+    """
+    usage = OrganizationUsage.__table__
+    connection = db.session.connection()
+    query = select(usage).where(usage.c.organization_id == organization_id)
+    row = connection.execute(query).first()
+    if row is None or row.reconciled_at is None:
+        # Counters that were never reconciled may only hold deltas since creation
+        _reconcile(connection, [organization_id], datetime.utcnow(), only_unreconciled=True)
+        row = connection.execute(query).first()
+    return {counter: getattr(row, counter) for counter in COUNTERS}
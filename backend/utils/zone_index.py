@@ -0,0 +1,294 @@
+"""
+Zone Index
+Point-in-polygon lookup over an organization's active zone polygons, used to
+assign customers to zones on creation and in bulk re-assignment runs
+"""
+
+from sqlalchemy import event, inspect, select, update, bindparam
+from models import db, Zone, Customer
+from utils.cache import TTLCache
+from datetime import datetime
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+# Zones are edited rarely; commits invalidate this process's entry, other
+# workers rebuild when theirs expires
+INDEX_TTL_SECONDS = 300
+_indexes = TTLCache(ttl=INDEX_TTL_SECONDS, max_entries=1000)
+
+# Grid resolution: about this many cells across a typical zone, and never
+# more than MAX_GRID_CELLS_PER_SIDE across the whole organization
+CELLS_PER_ZONE = 16
+MAX_GRID_CELLS_PER_SIDE = 1024
+
+ASSIGN_CHUNK_SIZE = 5000
+
+def _ring(points):
+    ring = []
+    for point in points:
+        if isinstance(point, dict):
+            ring.append((float(point['lng']), float(point['lat'])))
+        else:
+            ring.append((float(point[0]), float(point[1])))
+    if len(ring) >= 2 and ring[0] == ring[-1]:
+        ring.pop()
+    return ring if len(ring) >= 3 else None
+
+def parse_polygon(area_polygon):
+    """
+    Rings of (lng, lat) points for a zone's area_polygon: a GeoJSON Polygon,
+    MultiPolygon or Feature, or a bare list of [lng, lat] / {'lat', 'lng'}
+    points. Returns None when there is no usable polygon.
+    """
+    if not area_polygon:
+        return None
+    if isinstance(area_polygon, dict):
+        if area_polygon.get('type') == 'Feature':
+            return parse_polygon(area_polygon.get('geometry'))
+        coordinates = area_polygon.get('coordinates') or []
+        if area_polygon.get('type') == 'Polygon':
+            rings = [_ring(ring) for ring in coordinates]
+        elif area_polygon.get('type') == 'MultiPolygon':
+            rings = [_ring(ring) for polygon in coordinates for ring in polygon]
+        else:
+            return None
+    else:
+        rings = [_ring(area_polygon)]
+    rings = [ring for ring in rings if ring]
+    return rings or None
+
+def _edges(rings):
+    for ring in rings:
+        for index in range(len(ring)):
+            yield ring[index - 1], ring[index]
+
+def point_in_rings(x, y, rings):
+    """Even-odd test, so holes and multi-part zones need no special casing"""
+    inside = False
+    for ring in rings:
+        x0, y0 = ring[-1]
+        for x1, y1 in ring:
+            if (y1 > y) != (y0 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+                inside = not inside
+            x0, y0 = x1, y1
+    return inside
+
+class ZoneIndex:
+    """
+    Uniform grid over zone polygons. Each cell lists, in zone priority order,
+    the zones whose boundary crosses it (needing an exact test) and stops at
+    the first zone that covers it entirely, so most lookups are one dict hit.
+    """
+
+    def __init__(self, zones):
+        # zones: [(zone_id, rings)] in priority order; overlaps go to the first
+        self.zone_ids = [zone_id for zone_id, _ in zones]
+        self.rings = [rings for _, rings in zones]
+        self.cells = {}
+        if not zones:
+            return
+
+        boxes = []
+        for rings in self.rings:
+            xs = [x for ring in rings for x, _ in ring]
+            ys = [y for ring in rings for _, y in ring]
+            boxes.append((min(xs), min(ys), max(xs), max(ys)))
+
+        self.origin_x = min(box[0] for box in boxes)
+        self.origin_y = min(box[1] for box in boxes)
+        extent = max(max(box[2] for box in boxes) - self.origin_x,
+                     max(box[3] for box in boxes) - self.origin_y)
+        typical = sorted(max(box[2] - box[0], box[3] - box[1]) for box in boxes)[len(boxes) // 2]
+        self.cell_size = max(typical / CELLS_PER_ZONE, extent / MAX_GRID_CELLS_PER_SIDE, 1e-9)
+
+        entries = {}
+        for position, rings in enumerate(self.rings):
+            boundary = self._boundary_cells(rings)
+            for cell in boundary:
+                entries.setdefault(cell, []).append((position, False))
+            for cell in self._interior_cells(rings, boxes[position], boundary):
+                entries.setdefault(cell, []).append((position, True))
+
+        for cell, cell_entries in entries.items():
+            cell_entries.sort()
+            for cut, (_, interior) in enumerate(cell_entries):
+                if interior:
+                    cell_entries = cell_entries[:cut + 1]
+                    break
+            self.cells[cell] = tuple(cell_entries)
+
+    def _column(self, x):
+        return math.floor((x - self.origin_x) / self.cell_size)
+
+    def _row(self, y):
+        return math.floor((y - self.origin_y) / self.cell_size)
+
+    def _boundary_cells(self, rings):
+        """Every cell an edge passes through, walking the edge column by column"""
+        cells = set()
+        size = self.cell_size
+        for (x0, y0), (x1, y1) in _edges(rings):
+            if x0 > x1:
+                x0, y0, x1, y1 = x1, y1, x0, y0
+            slope = (y1 - y0) / (x1 - x0) if x1 != x0 else None
+            for column in range(self._column(x0), self._column(x1) + 1):
+                if slope is None:
+                    ya, yb = y0, y1
+                else:
+                    xa = max(x0, self.origin_x + column * size)
+                    xb = min(x1, self.origin_x + (column + 1) * size)
+                    ya, yb = y0 + (xa - x0) * slope, y0 + (xb - x0) * slope
+                for row in range(self._row(min(ya, yb)), self._row(max(ya, yb)) + 1):
+                    cells.add((column, row))
+        return cells
+
+    def _interior_cells(self, rings, box, boundary):
+        """Cells no edge touches whose centre is inside, found by scanning rows"""
+        size = self.cell_size
+        edges = list(_edges(rings))
+        for row in range(self._row(box[1]), self._row(box[3]) + 1):
+            y = self.origin_y + (row + 0.5) * size
+            crossings = sorted(
+                x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+                for (x0, y0), (x1, y1) in edges
+                if (y1 > y) != (y0 > y)
+            )
+            for start, end in zip(crossings[::2], crossings[1::2]):
+                first = math.ceil((start - self.origin_x) / size - 0.5)
+                last = math.floor((end - self.origin_x) / size - 0.5)
+                for column in range(first, last + 1):
+                    if (column, row) not in boundary:
+                        yield column, row
+
+    def locate(self, lat, lng):
+        """Id of the zone containing the point, or None"""
+        if not self.cells or lat is None or lng is None:
+            return None
+        x, y = float(lng), float(lat)
+        for position, interior in self.cells.get((self._column(x), self._row(y)), ()):
+            if interior or point_in_rings(x, y, self.rings[position]):
+                return self.zone_ids[position]
+        return None
+
+def _build_index(organization_id, connection):
+    rows = connection.execute(
+        select(Zone.id, Zone.area_polygon).where(
+            Zone.organization_id == organization_id,
+            Zone.is_active.is_(True),
+            Zone.area_polygon.isnot(None)
+        ).order_by(Zone.created_at, Zone.id)
+    ).all()
+
+    zones = []
+    for zone_id, area_polygon in rows:
+        try:
+            rings = parse_polygon(area_polygon)
+        except (TypeError, ValueError, KeyError, IndexError):
+            logger.warning(f"Zone {zone_id} has an unreadable area_polygon; skipping")
+            continue
+        if rings:
+            zones.append((zone_id, rings))
+    return ZoneIndex(zones)
+
+def get_zone_index(organization_id, connection=None):
+    """The organization's cached ZoneIndex, built on first use"""
+    index = _indexes.get(organization_id)
+    if index is None:
+        index = _build_index(organization_id, connection or db.session.connection())
+        _indexes.set(organization_id, index)
+    return index
+
+def invalidate_zone_index(organization_id):
+    """Drop an organization's cached index after its zones change"""
+    _indexes.invalidate(organization_id)
+
+def assign_customer_zones(organization_id, only_unassigned=True, chunk_size=ASSIGN_CHUNK_SIZE):
+    """
+    Set zone_id from coordinates for an organization's customers (only those
+    without a zone unless only_unassigned is False), in id-ordered chunks
+    committed one at a time. Customers outside every zone keep their zone.
+    Returns {'customers', 'assigned', 'unchanged', 'unmatched'}.
+    """
+    index = get_zone_index(organization_id)
+    customers = Customer.__table__
+    assign = update(customers).where(customers.c.id == bindparam('customer_id')).values(
+        zone_id=bindparam('new_zone_id'),
+        updated_at=bindparam('now')
+    )
+    summary = {'customers': 0, 'assigned': 0, 'unchanged': 0, 'unmatched': 0}
+
+    after_id = None
+    while True:
+        query = select(Customer.id, Customer.zone_id, Customer.latitude, Customer.longitude).where(
+            Customer.organization_id == organization_id,
+            Customer.latitude.isnot(None),
+            Customer.longitude.isnot(None)
+        )
+        if only_unassigned:
+            query = query.where(Customer.zone_id.is_(None))
+        if after_id is not None:
+            query = query.where(Customer.id > after_id)
+        chunk = db.session.execute(query.order_by(Customer.id).limit(chunk_size)).all()
+        if not chunk:
+            return summary
+
+        now = datetime.utcnow()
+        changes = []
+        for customer_id, zone_id, latitude, longitude in chunk:
+            new_zone_id = index.locate(latitude, longitude)
+            if new_zone_id is None:
+                summary['unmatched'] += 1
+            elif new_zone_id == zone_id:
+                summary['unchanged'] += 1
+            else:
+                changes.append({'customer_id': customer_id, 'new_zone_id': new_zone_id, 'now': now})
+
+        if changes:
+            db.session.execute(assign, changes)
+        db.session.commit()
+
+        summary['customers'] += len(chunk)
+        summary['assigned'] += len(changes)
+        after_id = chunk[-1].id
+
+def _coordinates_changed(state):
+    return any(state.attrs[key].history.has_changes() for key in ('latitude', 'longitude'))
+
+def _before_flush(session, flush_context, instances):
+    # New customers without a zone, and customers who moved without an explicit zone change
+    pending = [obj for obj in session.new if isinstance(obj, Customer) and not obj.zone_id]
+    for obj in session.dirty:
+        if isinstance(obj, Customer):
+            state = inspect(obj)
+            if _coordinates_changed(state) and not state.attrs.zone_id.history.has_changes():
+                pending.append(obj)
+
+    for customer in pending:
+        if customer.organization_id and customer.latitude is not None and customer.longitude is not None:
+            zone_id = get_zone_index(customer.organization_id, session.connection()).locate(
+                customer.latitude, customer.longitude
+            )
+            if zone_id:
+                customer.zone_id = zone_id
+
+def _after_flush(session, flush_context):
+    changed = session.info.setdefault('zone_index_changes', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Zone) and obj.organization_id:
+            changed.add(obj.organization_id)
+
+def _after_commit(session):
+    for organization_id in session.info.pop('zone_index_changes', ()):
+        invalidate_zone_index(organization_id)
+
+def _after_rollback(session):
+    session.info.pop('zone_index_changes', None)
+
+def register_zone_assignment():
+    """Assign zones to customers on flush and drop indexes when zones are committed"""
+    for name, listener in (('before_flush', _before_flush), ('after_flush', _after_flush),
+                           ('after_commit', _after_commit), ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)